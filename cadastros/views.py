@@ -4,6 +4,8 @@ from django.db.models import Q
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
+from velzon.paginacao import PaginadorEstimado
+
 from .models import Empresa, Parceiro
 from .forms import EmpresaForm, ParceiroForm
 
@@ -12,6 +14,7 @@ class EmpresaListView(LoginRequiredMixin, ListView):
     model = Empresa
     template_name = "cadastros/empresas/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -66,6 +69,7 @@ class ParceiroListView(LoginRequiredMixin, ListView):
     model = Parceiro
     template_name = "cadastros/parceiros/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -9,6 +9,9 @@ from .models import (
     Moeda,
     HistoricoPadrao,
     Periodo,
+    ModeloRateio,
+    ModeloRateioCentroCusto,
+    ModeloRateioProjeto,
 )
 
 
@@ -89,3 +92,24 @@ class PeriodoAdmin(admin.ModelAdmin):
     search_fields = ("codigo",)
     ordering = ("codigo",)
 
+
+
+class ModeloRateioCentroCustoInline(admin.TabularInline):
+    model = ModeloRateioCentroCusto
+    extra = 1
+    autocomplete_fields = ("centro_custo",)
+
+
+class ModeloRateioProjetoInline(admin.TabularInline):
+    model = ModeloRateioProjeto
+    extra = 1
+    autocomplete_fields = ("projeto",)
+
+
+@admin.register(ModeloRateio)
+class ModeloRateioAdmin(admin.ModelAdmin):
+    list_display = ("descricao", "conta_contabil", "historico", "status")
+    list_filter = ("status",)
+    search_fields = ("descricao", "conta_contabil__codigo", "historico__descricao")
+    autocomplete_fields = ("conta_contabil", "historico")
+    inlines = (ModeloRateioCentroCustoInline, ModeloRateioProjetoInline)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ContabillConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "contabill"
+
+    def ready(self):
+        from .services.escolhas import conectar_sinais
+
+        conectar_sinais()
@@ -4,6 +4,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.forms import inlineformset_factory, BaseInlineFormSet
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 from ..models import (
     LancamentoContabil,
@@ -11,6 +12,7 @@ from ..models import (
     RateioLancamentoItemCentroCusto,
     RateioLancamentoItemProjeto,
 )
+from .widgets import AutocompleteWidget, EscolhasEmCache, carregar_rotulos
 
 TOL = Decimal("0.00")
 
@@ -69,19 +71,28 @@ class LancamentoItemForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.initial.setdefault("moeda", 1)
         self.initial.setdefault("tipo_dc", "D")
+        # lista de moedas do cache; conta e histórico são buscados sob demanda
+        self.fields["moeda"].widget.choices = EscolhasEmCache("moeda", self.fields["moeda"].empty_label)
 
     class Meta:
         model = LancamentoItem
         fields = ["conta_contabil", "moeda", "valor", "tipo_dc", "historico"]
         widgets = {
-            "conta_contabil": forms.Select(attrs={"class": "form-select"}),
+            "conta_contabil": AutocompleteWidget("conta_contabil", attrs={"class": "form-control"}),
             "moeda": forms.Select(attrs={"class": "form-select"}),
             "tipo_dc": forms.Select(attrs={"class": "form-select"}),
-            "historico": forms.Select(attrs={"class": "form-select"}),
+            "historico": AutocompleteWidget("historico", attrs={"class": "form-control"}),
         }
 
 
 class LancamentoItemBaseFormSet(BaseInlineFormSet):
+    @cached_property
+    def forms(self):
+        forms = super().forms
+        # rótulos de conta e histórico de todas as linhas em uma consulta por campo
+        carregar_rotulos(forms)
+        return forms
+
     def clean(self):
         super().clean()
         total_d = Decimal("0.00")
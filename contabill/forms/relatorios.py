@@ -0,0 +1,127 @@
+from django import forms
+
+from cadastros.models import Empresa
+from ..models import CentroCusto, ContaContabil, Filial, Periodo, Projeto
+
+NIVEL_CHOICES = [(n, str(n)) for n in range(1, 6)]
+
+
+class BalanceteForm(forms.Form):
+    empresa = forms.ModelChoiceField(
+        queryset=Empresa.objects.all(),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    filial = forms.ModelChoiceField(
+        queryset=Filial.objects.filter(status=True).order_by("codigo"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    periodo_inicial = forms.ModelChoiceField(
+        queryset=Periodo.objects.order_by("-data_inicio"),
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    periodo_final = forms.ModelChoiceField(
+        queryset=Periodo.objects.order_by("-data_inicio"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    nivel = forms.TypedChoiceField(
+        choices=NIVEL_CHOICES,
+        coerce=int,
+        initial=5,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    ocultar_zeradas = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        empresa = cleaned.get("empresa")
+        filial = cleaned.get("filial")
+        inicial = cleaned.get("periodo_inicial")
+        final = cleaned.get("periodo_final") or inicial
+        if not empresa and not filial:
+            raise forms.ValidationError("Informe a empresa ou a filial.")
+        if empresa and filial and filial.empresa_id != empresa.id:
+            self.add_error("filial", "A filial não pertence à empresa.")
+        if inicial and final:
+            if final.empresa_id != inicial.empresa_id:
+                self.add_error("periodo_final", "Os períodos devem ser da mesma empresa.")
+            elif final.data_inicio < inicial.data_inicio:
+                self.add_error("periodo_final", "O período final é anterior ao inicial.")
+        return cleaned
+
+
+class RazaoForm(forms.Form):
+    conta = forms.ModelChoiceField(
+        queryset=ContaContabil.objects.filter(status=True).order_by("codigo"),
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    empresa = forms.ModelChoiceField(
+        queryset=Empresa.objects.all(),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    filial = forms.ModelChoiceField(
+        queryset=Filial.objects.filter(status=True).order_by("codigo"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    data_inicio = forms.DateField(widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}))
+    data_fim = forms.DateField(widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}))
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get("empresa") and not cleaned.get("filial"):
+            raise forms.ValidationError("Informe a empresa ou a filial.")
+        inicio, fim = cleaned.get("data_inicio"), cleaned.get("data_fim")
+        if inicio and fim and fim < inicio:
+            self.add_error("data_fim", "A data final é anterior à inicial.")
+        return cleaned
+
+
+class DREForm(forms.Form):
+    POR_CHOICES = [("cc", "Centro de custo"), ("projeto", "Projeto")]
+
+    por = forms.ChoiceField(
+        choices=POR_CHOICES,
+        initial="cc",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    centro_custo = forms.ModelChoiceField(
+        queryset=CentroCusto.objects.filter(status=True).order_by("codigo"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    projetos = forms.ModelMultipleChoiceField(
+        queryset=Projeto.objects.filter(status=True).order_by("codigo"),
+        required=False,
+        widget=forms.SelectMultiple(attrs={"class": "form-select"}),
+    )
+    empresa = forms.ModelChoiceField(
+        queryset=Empresa.objects.all(),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    filial = forms.ModelChoiceField(
+        queryset=Filial.objects.filter(status=True).order_by("codigo"),
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    periodos = forms.ModelMultipleChoiceField(
+        queryset=Periodo.objects.order_by("-data_inicio"),
+        widget=forms.SelectMultiple(attrs={"class": "form-select"}),
+    )
+
+    def clean_periodos(self):
+        return sorted(self.cleaned_data["periodos"], key=lambda p: p.data_inicio)
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get("empresa") and not cleaned.get("filial"):
+            raise forms.ValidationError("Informe a empresa ou a filial.")
+        return cleaned
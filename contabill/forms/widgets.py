@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django import forms
+from django.urls import reverse
+from django.utils.html import format_html
+
+from ..services.escolhas import escolhas, rotulo, rotulos
+
+
+class EscolhasEmCache:
+    """Opções de ``services.escolhas`` para ``Select.choices``, lidas só ao renderizar."""
+
+    def __init__(self, fonte, vazio="---------"):
+        self.fonte = fonte
+        self.vazio = vazio
+
+    def __iter__(self):
+        if self.vazio is not None:
+            yield ("", self.vazio)
+        yield from escolhas(self.fonte)
+
+
+class AutocompleteWidget(forms.Widget):
+    """Busca enquanto se digita no lugar de um ``<select>`` com todas as opções.
+
+    Renderiza só o valor escolhido: o id num campo oculto (o que é enviado) e
+    o rótulo no campo de busca, que consulta ``contabill:lancamentos_escolhas``
+    (ver ``static/contabill/js/autocomplete.js``). Em formsets, os rótulos vêm
+    de ``carregar_rotulos``; sem eles, cada widget busca o seu.
+    """
+
+    def __init__(self, fonte, attrs=None):
+        super().__init__(attrs)
+        self.fonte = fonte
+        self.rotulos = None
+
+    def rotulo(self, valor):
+        if not valor:
+            return ""
+        if self.rotulos is not None:
+            return self.rotulos.get(valor, "")
+        return rotulo(self.fonte, valor)
+
+    def render(self, name, value, attrs=None, renderer=None):
+        valor = self.format_value(value) or ""
+        attrs = self.build_attrs(self.attrs, attrs)
+        return format_html(
+            '<div class="position-relative" data-autocomplete="{}">'
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="search" class="{}" value="{}" placeholder="Digite para buscar..."'
+            ' autocomplete="off" data-autocomplete-busca>'
+            '<div class="list-group position-absolute w-100 shadow-sm" style="z-index: 1050"'
+            ' data-autocomplete-opcoes></div>'
+            "</div>",
+            reverse("contabill:lancamentos_escolhas", args=[self.fonte]),
+            name,
+            attrs.get("id", ""),
+            valor,
+            attrs.get("class", "form-control"),
+            self.rotulo(valor),
+        )
+
+
+def carregar_rotulos(forms):
+    """Busca, numa consulta por fonte, os rótulos dos ``AutocompleteWidget`` dos forms."""
+    por_fonte = defaultdict(list)
+    for form in forms:
+        for nome, campo in form.fields.items():
+            if isinstance(campo.widget, AutocompleteWidget):
+                por_fonte[campo.widget.fonte].append((campo.widget, form[nome].value()))
+    for fonte, widgets in por_fonte.items():
+        mapa = {str(pk): texto for pk, texto in rotulos(fonte, [valor for _, valor in widgets]).items()}
+        for widget, _ in widgets:
+            widget.rotulos = mapa
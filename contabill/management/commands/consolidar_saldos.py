@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from contabill.services.consolidacao import atualizar_consolidacao, consolidar
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza SaldoConsolidado (empresa e grupo empresarial) a partir dos "
+        "saldos das filiais. Por padrão só as empresas com saldos alterados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--todas", action="store_true", help="Reconsolida todas as empresas e grupos"
+        )
+
+    def handle(self, *args, **options):
+        resultado = consolidar() if options["todas"] else atualizar_consolidacao()
+        if resultado is None:
+            self.stdout.write("Nada a consolidar.")
+            return
+        self.stdout.write(
+            "{empresa} linha(s) de empresa, {grupo} de grupo, {removidos} removida(s).".format(
+                **resultado
+            )
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contabill.services.consolidacao import atualizar_consolidacao
+from contabill.services.recalculo import processar_fila
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker da fila de recálculo de saldos: consome as tarefas pendentes "
+        "(TarefaRecalculoSaldo) e aguarda novas. A cada ciclo atualiza a "
+        "consolidação (SaldoConsolidado) das empresas cujos saldos mudaram."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--uma-vez", action="store_true", help="Esvazia a fila e encerra"
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos entre consultas quando a fila está vazia (padrão: 2)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for tarefa in processar_fila():
+                rotulo = f"Tarefa {tarefa.pk} filial {tarefa.filial_id} / período {tarefa.periodo_id}"
+                if tarefa.status == "F":
+                    self.stderr.write(f"{rotulo}: FALHA em {tarefa.duracao:.2f}s\n{tarefa.erro}")
+                else:
+                    self.stdout.write(
+                        f"{rotulo}: {tarefa.duracao:.2f}s ({tarefa.solicitacoes} pedido(s))"
+                    )
+            consolidacao = atualizar_consolidacao()
+            if consolidacao:
+                self.stdout.write(
+                    "Consolidação: {empresa} linha(s) de empresa, {grupo} de grupo, "
+                    "{removidos} removida(s)".format(**consolidacao)
+                )
+            if options["uma_vez"]:
+                break
+            try:
+                time.sleep(options["intervalo"])
+            except KeyboardInterrupt:
+                break
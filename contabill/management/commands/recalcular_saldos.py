@@ -0,0 +1,87 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cadastros.models import Empresa
+from contabill.models import Filial, Periodo
+from contabill.services.recalculo import periodos_da_empresa, recalcular_em_paralelo
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os saldos de todas as filiais x períodos de uma empresa "
+        "em paralelo (um processo e uma conexão por worker)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("empresa", type=int, help="ID da empresa")
+        parser.add_argument("--inicio", help="Código do primeiro período")
+        parser.add_argument("--fim", help="Código do último período")
+        parser.add_argument(
+            "--abertos", action="store_true", help="Apenas períodos com status Aberto"
+        )
+        parser.add_argument(
+            "--filial", type=int, action="append", dest="filiais", help="Restringe à filial (repetível)"
+        )
+        parser.add_argument(
+            "--processos",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Número de processos (padrão: núcleos da máquina)",
+        )
+
+    def handle(self, *args, **options):
+        empresa_id = options["empresa"]
+        if not Empresa.objects.filter(id=empresa_id).exists():
+            raise CommandError(f"Empresa {empresa_id} não encontrada.")
+        try:
+            periodos = periodos_da_empresa(
+                empresa_id,
+                inicio=options["inicio"],
+                fim=options["fim"],
+                somente_abertos=options["abertos"],
+            )
+        except Periodo.DoesNotExist:
+            raise CommandError("Período inicial/final não encontrado para a empresa.")
+        if not periodos:
+            raise CommandError("Nenhum período selecionado.")
+
+        filiais = dict(Filial.objects.filter(empresa_id=empresa_id).values_list("id", "codigo"))
+        codigos = {p.id: p.codigo for p in periodos}
+
+        def progresso(concluidas, total, r):
+            rotulo = f"[{concluidas}/{total}] filial {filiais.get(r['filial_id'])} / {codigos[r['periodo_id']]}"
+            if r.get("reexecutada"):
+                rotulo += " (refeita em série após queda do pool)"
+            if r["erro"]:
+                self.stderr.write(f"{rotulo}: FALHA em {r['duracao']:.2f}s")
+            else:
+                self.stdout.write(f"{rotulo}: {r['duracao']:.2f}s")
+
+        inicio = time.monotonic()
+        resultado = recalcular_em_paralelo(
+            empresa_id,
+            periodos,
+            filiais=options["filiais"],
+            processos=options["processos"],
+            progresso=progresso,
+        )
+        encadeamento = resultado["encadeamento"]
+        self.stdout.write(f"Encadeamento e sintéticas: {encadeamento['duracao']:.2f}s")
+
+        falhas = [r for r in resultado["unidades"] if r["erro"]]
+        for r in falhas:
+            self.stderr.write(
+                f"Filial {filiais.get(r['filial_id'])} / {codigos[r['periodo_id']]}:\n{r['erro']}"
+            )
+        if encadeamento["erro"]:
+            self.stderr.write(encadeamento["erro"])
+
+        total = len(resultado["unidades"])
+        self.stdout.write(
+            f"{total - len(falhas)}/{total} unidades recalculadas em {time.monotonic() - inicio:.2f}s."
+        )
+        if falhas or encadeamento["erro"]:
+            raise CommandError(f"{len(falhas)} unidade(s) com falha.")
+        self.stdout.write(self.style.SUCCESS("Saldos recalculados."))
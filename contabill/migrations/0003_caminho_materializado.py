@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+def preencher_caminhos(apps, schema_editor):
+    for nome, campo_pai in (("ContaContabil", "conta_pai_id"), ("CentroCusto", "centro_custo_pai_id")):
+        modelo = apps.get_model("contabill", nome)
+        pais = dict(modelo.objects.values_list("id", campo_pai))
+        caminhos = {}
+
+        def caminho(no_id):
+            if no_id not in caminhos:
+                visitados = []
+                atual = no_id
+                while atual is not None and atual not in caminhos and atual not in visitados:
+                    visitados.append(atual)
+                    atual = pais.get(atual)
+                prefixo = caminhos.get(atual, "/")
+                for vid in reversed(visitados):
+                    prefixo = f"{prefixo}{vid}/"
+                    caminhos[vid] = prefixo
+            return caminhos[no_id]
+
+        objs = []
+        for obj in modelo.objects.only("id"):
+            obj.caminho = caminho(obj.id)
+            objs.append(obj)
+        modelo.objects.bulk_update(objs, ["caminho"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0002_lancamentocontabil_lancamentoitem_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="centrocusto",
+            name="caminho",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name="contacontabil",
+            name="caminho",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(preencher_caminhos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contabill", "0003_caminho_materializado"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TarefaRecalculoSaldo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("P", "Pendente"),
+                            ("E", "Em execução"),
+                            ("C", "Concluída"),
+                            ("F", "Falhou"),
+                        ],
+                        default="P",
+                        max_length=1,
+                    ),
+                ),
+                ("solicitacoes", models.PositiveIntegerField(default=1)),
+                ("resultado", models.JSONField(blank=True, null=True)),
+                ("erro", models.TextField(blank=True)),
+                ("iniciado_em", models.DateTimeField(blank=True, null=True)),
+                ("concluido_em", models.DateTimeField(blank=True, null=True)),
+                ("duracao", models.FloatField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "filial",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contabill.filial",
+                    ),
+                ),
+                (
+                    "periodo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="contabill.periodo",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="contabill_t_status_dd2dbe_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="tarefarecalculosaldo",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "P")),
+                fields=("filial", "periodo"),
+                name="uniq_recalculo_pendente",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0004_tarefarecalculosaldo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="filial",
+            name="versao_saldos",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
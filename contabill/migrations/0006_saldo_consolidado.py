@@ -0,0 +1,49 @@
+# Generated by Django 4.2.23 on 2026-10-18 04:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cadastros", "0002_empresa_grupo_empresarial_and_more"),
+        ("contabill", "0005_versao_saldos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="filial",
+            name="versao_consolidada",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="SaldoConsolidado",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("nivel", models.CharField(choices=[("E", "Empresa"), ("G", "Grupo empresarial")], max_length=1)),
+                ("data_inicio", models.DateField()),
+                ("data_fim", models.DateField()),
+                ("saldo_inicial", models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ("debito", models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ("credito", models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ("saldo_final", models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                ("conta_contabil", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="contabill.contacontabil")),
+                ("empresa", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to="cadastros.empresa")),
+                ("grupo", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to="contabill.grupoempresarial")),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="saldoconsolidado",
+            constraint=models.UniqueConstraint(condition=models.Q(("nivel", "E")), fields=("empresa", "conta_contabil", "data_inicio"), name="uniq_consolidado_empresa"),
+        ),
+        migrations.AddConstraint(
+            model_name="saldoconsolidado",
+            constraint=models.UniqueConstraint(condition=models.Q(("nivel", "G")), fields=("grupo", "conta_contabil", "data_inicio"), name="uniq_consolidado_grupo"),
+        ),
+        migrations.AddConstraint(
+            model_name="saldoconsolidado",
+            constraint=models.CheckConstraint(check=models.Q(models.Q(("empresa__isnull", False), ("grupo__isnull", True), ("nivel", "E")), models.Q(("empresa__isnull", True), ("grupo__isnull", False), ("nivel", "G")), _connector="OR"), name="consolidado_nivel_entidade"),
+        ),
+    ]
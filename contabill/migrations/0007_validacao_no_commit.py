@@ -0,0 +1,162 @@
+# Generated by Django 4.2.23 on 2026-10-18 06:10
+
+from django.db import migrations
+
+# Conferência no banco, no commit, das mesmas regras de services.validacao:
+# débito = crédito e rateios de CC (obrigatório em contas R/D/C) e de
+# projeto fechando com o valor de cada item ativo. Os triggers só enfileiram
+# eventos quando "contabill.validar_lancamentos" = 'on' na transação (ver
+# services.validacao.validacao_no_banco) e cada lançamento tocado é
+# conferido uma única vez.
+SQL_INSTALAR = """
+CREATE OR REPLACE FUNCTION contabill_checar_lancamento(p_lancamento bigint) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_debito numeric;
+    v_credito numeric;
+    v_item record;
+BEGIN
+    IF p_lancamento IS NULL THEN
+        RETURN;
+    END IF;
+    IF to_regclass('pg_temp.contabill_lancamentos_checados') IS NULL THEN
+        CREATE TEMP TABLE contabill_lancamentos_checados (id bigint PRIMARY KEY) ON COMMIT DELETE ROWS;
+    END IF;
+    INSERT INTO contabill_lancamentos_checados VALUES (p_lancamento) ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(SUM(valor) FILTER (WHERE tipo_dc = 'D'), 0),
+           COALESCE(SUM(valor) FILTER (WHERE tipo_dc = 'C'), 0)
+      INTO v_debito, v_credito
+      FROM {item}
+     WHERE lancamento_id = p_lancamento AND status;
+    IF v_debito <> v_credito THEN
+        RAISE EXCEPTION 'Lançamento %: débitos e créditos não estão balanceados (débito %, crédito %)',
+            p_lancamento, v_debito, v_credito
+            USING ERRCODE = 'check_violation';
+    END IF;
+
+    SELECT i.id, i.valor, c.classificacao, cc.total AS total_cc, pj.total AS total_projeto
+      INTO v_item
+      FROM {item} i
+      JOIN {conta} c ON c.id = i.conta_contabil_id
+      LEFT JOIN LATERAL (
+          SELECT SUM(r.valor) AS total FROM {rateio_cc} r WHERE r.lancamento_item_id = i.id
+      ) cc ON TRUE
+      LEFT JOIN LATERAL (
+          SELECT SUM(r.valor) AS total FROM {rateio_projeto} r WHERE r.lancamento_item_id = i.id
+      ) pj ON TRUE
+     WHERE i.lancamento_id = p_lancamento
+       AND i.status
+       AND ((cc.total IS NULL AND c.classificacao IN ('R', 'D', 'C'))
+            OR cc.total <> i.valor
+            OR pj.total <> i.valor)
+     ORDER BY i.id
+     LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Lançamento %, item %: %', p_lancamento, v_item.id,
+            CASE
+                WHEN v_item.total_cc IS NULL AND v_item.classificacao IN ('R', 'D', 'C')
+                    THEN 'rateio de centro de custo obrigatório'
+                WHEN v_item.total_cc <> v_item.valor
+                    THEN 'rateios de centro de custo não fecham com o valor do item'
+                ELSE 'rateios de projeto não fecham com o valor do item'
+            END
+            USING ERRCODE = 'check_violation';
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION contabill_item_checar_lancamento() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM contabill_checar_lancamento(OLD.lancamento_id);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM contabill_checar_lancamento(NEW.lancamento_id);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION contabill_rateio_checar_lancamento() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM contabill_checar_lancamento(
+            (SELECT lancamento_id FROM {item} WHERE id = OLD.lancamento_item_id)
+        );
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM contabill_checar_lancamento(
+            (SELECT lancamento_id FROM {item} WHERE id = NEW.lancamento_item_id)
+        );
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE CONSTRAINT TRIGGER contabill_checar_lancamento
+    AFTER INSERT OR UPDATE OR DELETE ON {item}
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (current_setting('contabill.validar_lancamentos', true) = 'on')
+    EXECUTE FUNCTION contabill_item_checar_lancamento();
+
+CREATE CONSTRAINT TRIGGER contabill_checar_lancamento
+    AFTER INSERT OR UPDATE OR DELETE ON {rateio_cc}
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (current_setting('contabill.validar_lancamentos', true) = 'on')
+    EXECUTE FUNCTION contabill_rateio_checar_lancamento();
+
+CREATE CONSTRAINT TRIGGER contabill_checar_lancamento
+    AFTER INSERT OR UPDATE OR DELETE ON {rateio_projeto}
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (current_setting('contabill.validar_lancamentos', true) = 'on')
+    EXECUTE FUNCTION contabill_rateio_checar_lancamento();
+"""
+
+SQL_REMOVER = """
+DROP TRIGGER IF EXISTS contabill_checar_lancamento ON {item};
+DROP TRIGGER IF EXISTS contabill_checar_lancamento ON {rateio_cc};
+DROP TRIGGER IF EXISTS contabill_checar_lancamento ON {rateio_projeto};
+DROP FUNCTION IF EXISTS contabill_item_checar_lancamento();
+DROP FUNCTION IF EXISTS contabill_rateio_checar_lancamento();
+DROP FUNCTION IF EXISTS contabill_checar_lancamento(bigint);
+"""
+
+
+def _executar(sql, apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    tabelas = {
+        "item": apps.get_model("contabill", "LancamentoItem")._meta.db_table,
+        "conta": apps.get_model("contabill", "ContaContabil")._meta.db_table,
+        "rateio_cc": apps.get_model("contabill", "RateioLancamentoItemCentroCusto")._meta.db_table,
+        "rateio_projeto": apps.get_model("contabill", "RateioLancamentoItemProjeto")._meta.db_table,
+    }
+    schema_editor.execute(sql.format(**tabelas), params=None)
+
+
+def instalar(apps, schema_editor):
+    _executar(SQL_INSTALAR, apps, schema_editor)
+
+
+def remover(apps, schema_editor):
+    _executar(SQL_REMOVER, apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0006_saldo_consolidado"),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, remover),
+    ]
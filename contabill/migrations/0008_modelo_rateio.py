@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-18 04:21
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0007_validacao_no_commit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModeloRateio",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("status", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("descricao", models.CharField(max_length=100)),
+                ("conta_contabil", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name="modelos_rateio", to="contabill.contacontabil")),
+                ("historico", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name="modelos_rateio", to="contabill.historicopadrao")),
+            ],
+            options={
+                "ordering": ["descricao"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ModeloRateioProjeto",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("percentual", models.DecimalField(decimal_places=4, max_digits=7, validators=[django.core.validators.MinValueValidator(Decimal("0.0001")), django.core.validators.MaxValueValidator(Decimal("100"))])),
+                ("modelo", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="projetos", to="contabill.modelorateio")),
+                ("projeto", models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to="contabill.projeto")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ModeloRateioCentroCusto",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("percentual", models.DecimalField(decimal_places=4, max_digits=7, validators=[django.core.validators.MinValueValidator(Decimal("0.0001")), django.core.validators.MaxValueValidator(Decimal("100"))])),
+                ("centro_custo", models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to="contabill.centrocusto")),
+                ("modelo", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="centros_custo", to="contabill.modelorateio")),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="modelorateioprojeto",
+            constraint=models.UniqueConstraint(fields=("modelo", "projeto"), name="uniq_modelo_rateio_projeto"),
+        ),
+        migrations.AddConstraint(
+            model_name="modelorateiocentrocusto",
+            constraint=models.UniqueConstraint(fields=("modelo", "centro_custo"), name="uniq_modelo_rateio_cc"),
+        ),
+        migrations.AddConstraint(
+            model_name="modelorateio",
+            constraint=models.CheckConstraint(check=models.Q(("conta_contabil__isnull", False), ("historico__isnull", False), _connector="OR"), name="modelo_rateio_conta_ou_historico"),
+        ),
+    ]
@@ -0,0 +1,118 @@
+from django.db import migrations
+
+# contabill_checar_lancamento (0007) marcava o lançamento como conferido até
+# o fim da transação: depois de um SET CONSTRAINTS ALL IMMEDIATE, alterações
+# seguintes no mesmo lançamento não eram conferidas de novo no commit. A
+# marca agora vale só para o disparo corrente, identificado pelo
+# statement_timestamp() do comando que dispara os eventos (COMMIT, SET
+# CONSTRAINTS ou o próprio comando, quando a constraint é imediata).
+FUNCAO = """
+CREATE OR REPLACE FUNCTION contabill_checar_lancamento(p_lancamento bigint) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_debito numeric;
+    v_credito numeric;
+    v_item record;
+BEGIN
+    IF p_lancamento IS NULL THEN
+        RETURN;
+    END IF;
+{marcar}
+    SELECT COALESCE(SUM(valor) FILTER (WHERE tipo_dc = 'D'), 0),
+           COALESCE(SUM(valor) FILTER (WHERE tipo_dc = 'C'), 0)
+      INTO v_debito, v_credito
+      FROM {item}
+     WHERE lancamento_id = p_lancamento AND status;
+    IF v_debito <> v_credito THEN
+        RAISE EXCEPTION 'Lançamento %: débitos e créditos não estão balanceados (débito %, crédito %)',
+            p_lancamento, v_debito, v_credito
+            USING ERRCODE = 'check_violation';
+    END IF;
+
+    SELECT i.id, i.valor, c.classificacao, cc.total AS total_cc, pj.total AS total_projeto
+      INTO v_item
+      FROM {item} i
+      JOIN {conta} c ON c.id = i.conta_contabil_id
+      LEFT JOIN LATERAL (
+          SELECT SUM(r.valor) AS total FROM {rateio_cc} r WHERE r.lancamento_item_id = i.id
+      ) cc ON TRUE
+      LEFT JOIN LATERAL (
+          SELECT SUM(r.valor) AS total FROM {rateio_projeto} r WHERE r.lancamento_item_id = i.id
+      ) pj ON TRUE
+     WHERE i.lancamento_id = p_lancamento
+       AND i.status
+       AND ((cc.total IS NULL AND c.classificacao IN ('R', 'D', 'C'))
+            OR cc.total <> i.valor
+            OR pj.total <> i.valor)
+     ORDER BY i.id
+     LIMIT 1;
+    IF FOUND THEN
+        RAISE EXCEPTION 'Lançamento %, item %: %', p_lancamento, v_item.id,
+            CASE
+                WHEN v_item.total_cc IS NULL AND v_item.classificacao IN ('R', 'D', 'C')
+                    THEN 'rateio de centro de custo obrigatório'
+                WHEN v_item.total_cc <> v_item.valor
+                    THEN 'rateios de centro de custo não fecham com o valor do item'
+                ELSE 'rateios de projeto não fecham com o valor do item'
+            END
+            USING ERRCODE = 'check_violation';
+    END IF;
+END
+$$;
+"""
+
+MARCAR_POR_DISPARO = """
+    IF to_regclass('pg_temp.contabill_lancamentos_conferidos') IS NULL THEN
+        CREATE TEMP TABLE contabill_lancamentos_conferidos (
+            id bigint,
+            disparo timestamptz,
+            PRIMARY KEY (id, disparo)
+        ) ON COMMIT DELETE ROWS;
+    END IF;
+    INSERT INTO contabill_lancamentos_conferidos VALUES (p_lancamento, statement_timestamp())
+        ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+"""
+
+MARCAR_POR_TRANSACAO = """
+    IF to_regclass('pg_temp.contabill_lancamentos_checados') IS NULL THEN
+        CREATE TEMP TABLE contabill_lancamentos_checados (id bigint PRIMARY KEY) ON COMMIT DELETE ROWS;
+    END IF;
+    INSERT INTO contabill_lancamentos_checados VALUES (p_lancamento) ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+"""
+
+
+def _instalar(marcar, apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    tabelas = {
+        "item": apps.get_model("contabill", "LancamentoItem")._meta.db_table,
+        "conta": apps.get_model("contabill", "ContaContabil")._meta.db_table,
+        "rateio_cc": apps.get_model("contabill", "RateioLancamentoItemCentroCusto")._meta.db_table,
+        "rateio_projeto": apps.get_model("contabill", "RateioLancamentoItemProjeto")._meta.db_table,
+    }
+    schema_editor.execute(FUNCAO.format(marcar=marcar, **tabelas), params=None)
+
+
+def conferir_por_disparo(apps, schema_editor):
+    _instalar(MARCAR_POR_DISPARO, apps, schema_editor)
+
+
+def conferir_por_transacao(apps, schema_editor):
+    _instalar(MARCAR_POR_TRANSACAO, apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0008_modelo_rateio"),
+    ]
+
+    operations = [
+        migrations.RunPython(conferir_por_disparo, conferir_por_transacao),
+    ]
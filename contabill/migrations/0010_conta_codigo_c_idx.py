@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 04:45
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0009_validacao_por_disparo"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="contacontabil",
+            index=models.Index(django.db.models.functions.comparison.Collate("codigo", "C"), name="conta_codigo_c_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 04:53
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0010_conta_codigo_c_idx"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="modelorateio",
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce("conta_contabil", 0), django.db.models.functions.comparison.Coalesce("historico", 0), condition=models.Q(("status", True)), name="uniq_modelo_rateio_ativo", violation_error_message="Já existe um modelo ativo para essa conta e histórico."),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contabill", "0011_modelo_rateio_ativo_unico"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="filial",
+            name="consolidar_desde",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Collate, Concat, Substr
 from django.core.exceptions import ValidationError
 import re
 
@@ -12,6 +14,64 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class ArvoreModel(BaseModel):
+    """Hierarquia com caminho materializado (``/id_raiz/.../id_proprio/``).
+
+    O caminho é mantido no ``save`` e, quando o nó muda de pai, todos os
+    descendentes são reescritos num único UPDATE. Subárvore, ancestrais e
+    detecção de ciclo viram uma consulta indexada, qualquer que seja a
+    profundidade.
+    """
+
+    CAMPO_PAI = None
+    NIVEL_PELO_CAMINHO = False
+
+    caminho = models.CharField(
+        max_length=255, blank=True, default="", editable=False, db_index=True
+    )
+
+    class Meta:
+        abstract = True
+
+    @property
+    def ids_caminho(self):
+        return [int(i) for i in self.caminho.strip("/").split("/") if i]
+
+    def descendentes(self, incluir_proprio=False):
+        qs = type(self).objects.filter(caminho__startswith=self.caminho)
+        return qs if incluir_proprio else qs.exclude(pk=self.pk)
+
+    def ancestrais(self):
+        return type(self).objects.filter(pk__in=self.ids_caminho[:-1])
+
+    def eh_ancestral_de(self, outro):
+        return bool(self.pk) and f"/{self.pk}/" in (outro.caminho or "")
+
+    def save(self, *args, **kwargs):
+        modelo = type(self)
+        pai_id = getattr(self, f"{self.CAMPO_PAI}_id")
+        with transaction.atomic():
+            prefixo = "/"
+            if pai_id:
+                prefixo = modelo.objects.values_list("caminho", flat=True).get(pk=pai_id) or "/"
+            antigo = ""
+            if self.pk:
+                antigo = modelo.objects.filter(pk=self.pk).values_list("caminho", flat=True).first() or ""
+            if self.NIVEL_PELO_CAMINHO:
+                self.nivel = prefixo.count("/")
+            super().save(*args, **kwargs)
+
+            novo = f"{prefixo}{self.pk}/"
+            if novo != antigo:
+                modelo.objects.filter(pk=self.pk).update(caminho=novo)
+                if antigo:
+                    campos = {"caminho": Concat(Value(novo), Substr("caminho", len(antigo) + 1))}
+                    if self.NIVEL_PELO_CAMINHO:
+                        campos["nivel"] = F("nivel") + (novo.count("/") - antigo.count("/"))
+                    modelo.objects.filter(caminho__startswith=antigo).exclude(pk=self.pk).update(**campos)
+            self.caminho = novo
+
+
 class GrupoEmpresarial(BaseModel):
     nome = models.CharField(max_length=100, unique=True)
     descricao = models.CharField(max_length=255, blank=True)
@@ -23,7 +83,7 @@ class GrupoEmpresarial(BaseModel):
         return self.nome
 
 
-class ContaContabil(BaseModel):
+class ContaContabil(ArvoreModel):
     TIPO_CHOICES = [("A", "Analítica"), ("S", "Sintética")]
     NATUREZA_CHOICES = [("D", "Devedora"), ("C", "Credora")]
     CLASSIFICACAO_CHOICES = [
@@ -49,11 +109,15 @@ class ContaContabil(BaseModel):
         max_length=1, choices=CLASSIFICACAO_CHOICES, blank=True
     )
 
+    CAMPO_PAI = "conta_pai"
+
     class Meta:
         ordering = ["codigo"]
         indexes = [
             models.Index(fields=["codigo"]),
             models.Index(fields=["conta_pai"]),
+            # ordem byte a byte usada na paginação do balancete
+            models.Index(Collate("codigo", "C"), name="conta_codigo_c_idx"),
         ]
 
     def __str__(self):
@@ -115,7 +179,7 @@ class ContaContabil(BaseModel):
                 self.classificacao = "O"
 
 
-class CentroCusto(BaseModel):
+class CentroCusto(ArvoreModel):
     TIPO_CHOICES = [
         ("O", "Operacional"),
         ("A", "Administrativo"),
@@ -131,6 +195,9 @@ class CentroCusto(BaseModel):
     )
     nivel = models.IntegerField(default=1)
 
+    CAMPO_PAI = "centro_custo_pai"
+    NIVEL_PELO_CAMINHO = True
+
     class Meta:
         ordering = ["codigo"]
         indexes = [
@@ -144,13 +211,8 @@ class CentroCusto(BaseModel):
     def clean(self):
         super().clean()
         if self.centro_custo_pai:
-            if self.centro_custo_pai == self:
+            if self.centro_custo_pai == self or self.eh_ancestral_de(self.centro_custo_pai):
                 raise ValidationError({"centro_custo_pai": "Ciclo inválido."})
-            ancestor = self.centro_custo_pai
-            while ancestor:
-                if ancestor == self:
-                    raise ValidationError({"centro_custo_pai": "Ciclo inválido."})
-                ancestor = ancestor.centro_custo_pai
             self.nivel = self.centro_custo_pai.nivel + 1
         else:
             self.nivel = 1
@@ -162,6 +224,14 @@ class Filial(BaseModel):
     )
     codigo = models.CharField(max_length=20)
     descricao = models.CharField(max_length=100)
+    # Incrementada sempre que os saldos da filial mudam; compõe a chave do
+    # cache dos relatórios (ver services.dre).
+    versao_saldos = models.PositiveBigIntegerField(default=0, editable=False)
+    # Valor de ``versao_saldos`` já refletido em ``SaldoConsolidado``.
+    versao_consolidada = models.PositiveBigIntegerField(default=0, editable=False)
+    # Início do primeiro período alterado desde a última consolidação; nulo
+    # com a versão pendente reconsolida todos os períodos.
+    consolidar_desde = models.DateField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = (("empresa", "codigo"),)
@@ -277,4 +347,6 @@ from .lancamentos import (
     SaldoCentroCustoPeriodo,
     SaldoProjetoPeriodo,
 )
-
+from .recalculo import TarefaRecalculoSaldo
+from .consolidacao import SaldoConsolidado
+from .modelo_rateio import ModeloRateio, ModeloRateioCentroCusto, ModeloRateioProjeto
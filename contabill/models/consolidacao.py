@@ -0,0 +1,54 @@
+from django.db import models
+from django.db.models import CASCADE, Q
+
+from . import ContaContabil, GrupoEmpresarial
+
+
+class SaldoConsolidado(models.Model):
+    """Saldo por conta e competência somado por empresa ou por grupo empresarial.
+
+    Mantido por ``services.consolidacao`` a partir de ``SaldoContaPeriodo``
+    das filiais. Como cada empresa tem seus próprios períodos, a competência é
+    identificada pela data de início do período.
+    """
+
+    NIVEL_CHOICES = [("E", "Empresa"), ("G", "Grupo empresarial")]
+
+    nivel = models.CharField(max_length=1, choices=NIVEL_CHOICES)
+    empresa = models.ForeignKey(
+        "cadastros.Empresa", null=True, blank=True, on_delete=CASCADE
+    )
+    grupo = models.ForeignKey(GrupoEmpresarial, null=True, blank=True, on_delete=CASCADE)
+    conta_contabil = models.ForeignKey(ContaContabil, on_delete=CASCADE)
+    data_inicio = models.DateField()
+    data_fim = models.DateField()
+    saldo_inicial = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    debito = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credito = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    saldo_final = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["empresa", "conta_contabil", "data_inicio"],
+                condition=Q(nivel="E"),
+                name="uniq_consolidado_empresa",
+            ),
+            models.UniqueConstraint(
+                fields=["grupo", "conta_contabil", "data_inicio"],
+                condition=Q(nivel="G"),
+                name="uniq_consolidado_grupo",
+            ),
+            models.CheckConstraint(
+                check=(
+                    Q(nivel="E", empresa__isnull=False, grupo__isnull=True)
+                    | Q(nivel="G", grupo__isnull=False, empresa__isnull=True)
+                ),
+                name="consolidado_nivel_entidade",
+            ),
+        ]
+
+    def __str__(self):
+        entidade = self.empresa_id if self.nivel == "E" else self.grupo_id
+        return f"Consolidado {self.nivel}{entidade} {self.conta_contabil_id}/{self.data_inicio}"
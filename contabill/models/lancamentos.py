@@ -48,18 +48,38 @@ class LancamentoContabil(models.Model):
     def __str__(self):
         return f"{self.id} - {self.data_lancamento}"
 
+    # Campos do cabeçalho que mudam onde o movimento dos itens cai nos saldos
+    CAMPOS_SALDO = ("data_competencia", "filial_id", "status")
+
+    def _altera_saldos(self):
+        if not self.pk:
+            return False
+        anterior = type(self).objects.filter(pk=self.pk).values(*self.CAMPOS_SALDO).first()
+        if anterior is None:
+            return False
+        return any(anterior[campo] != getattr(self, campo) for campo in self.CAMPOS_SALDO)
+
+    def save(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
+
+        if self._altera_saldos():
+            with manter_saldos(lancamento=self):
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
+
+        with manter_saldos(lancamento=self):
+            return super().delete(*args, **kwargs)
+
     def validar(self):
-        total_d = Decimal("0.00")
-        total_c = Decimal("0.00")
-        itens = self.itens.filter(status=True)
-        for item in itens:
-            if item.tipo_dc == "D":
-                total_d += item.valor
-            else:
-                total_c += item.valor
-            item.validar_rateios()
-        if total_d.quantize(Decimal("0.01")) != total_c.quantize(Decimal("0.01")):
-            raise ValidationError("Débitos e créditos não estão balanceados")
+        """Valida balanceamento e rateios dos itens ativos (ver ``services.validacao``)."""
+        from ..services.validacao import validar_lote
+
+        erros = validar_lote([self.pk])[self.pk]
+        if erros:
+            raise ValidationError(erros)
 
 
 class LancamentoItem(models.Model):
@@ -89,25 +109,30 @@ class LancamentoItem(models.Model):
     def __str__(self):
         return f"Item {self.id} do lançamento {self.lancamento_id}"
 
-    def validar_rateios(self):
-        from django.core.exceptions import ValidationError
+    def save(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
 
-        valor_item = self.valor.quantize(Decimal("0.01"))
-        rateios_cc = list(self.rateios_cc.all())
-        rateios_proj = list(self.rateios_projeto.all())
+        with manter_saldos(item=self):
+            return super().save(*args, **kwargs)
 
-        if self.conta_contabil.classificacao in {"R", "D", "C"}:
-            if not rateios_cc:
-                raise ValidationError("Rateio de centro de custo obrigatório")
-        total_cc = sum((r.valor for r in rateios_cc), Decimal("0.00"))
-        total_proj = sum((r.valor for r in rateios_proj), Decimal("0.00"))
+    def delete(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
 
-        if rateios_cc:
-            if total_cc.quantize(Decimal("0.01")) != valor_item:
-                raise ValidationError("Rateios de centro de custo não fecham com o valor do item")
-        if rateios_proj:
-            if total_proj.quantize(Decimal("0.01")) != valor_item:
-                raise ValidationError("Rateios de projeto não fecham com o valor do item")
+        with manter_saldos(item=self):
+            return super().delete(*args, **kwargs)
+
+    def validar_rateios(self):
+        """Confere os rateios gravados contra o valor e a conta do item em memória."""
+        from ..services.validacao import mensagens_rateio, totais_rateio
+
+        total_cc, total_projeto = totais_rateio(self.pk) if self.pk else (None, None)
+        for mensagem in mensagens_rateio(
+            self.valor.quantize(Decimal("0.01")),
+            self.conta_contabil.classificacao,
+            total_cc,
+            total_projeto,
+        ):
+            raise ValidationError(mensagem)
 
 
 class RateioLancamentoItemCentroCusto(models.Model):
@@ -130,6 +155,18 @@ class RateioLancamentoItemCentroCusto(models.Model):
     def __str__(self):
         return f"CC {self.centro_custo_id} - Item {self.lancamento_item_id}"
 
+    def save(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
+
+        with manter_saldos(item=self.lancamento_item):
+            return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
+
+        with manter_saldos(item=self.lancamento_item):
+            return super().delete(*args, **kwargs)
+
 
 class RateioLancamentoItemProjeto(models.Model):
     lancamento_item = models.ForeignKey(
@@ -151,6 +188,18 @@ class RateioLancamentoItemProjeto(models.Model):
     def __str__(self):
         return f"Projeto {self.projeto_id} - Item {self.lancamento_item_id}"
 
+    def save(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
+
+        with manter_saldos(item=self.lancamento_item):
+            return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from ..services.saldo import manter_saldos
+
+        with manter_saldos(item=self.lancamento_item):
+            return super().delete(*args, **kwargs)
+
 
 class SaldoContaPeriodo(models.Model):
     conta_contabil = models.ForeignKey(ContaContabil, on_delete=CASCADE)
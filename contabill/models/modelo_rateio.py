@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+from django.db.models import CASCADE, PROTECT, Q
+from django.db.models.functions import Coalesce
+
+from . import BaseModel, CentroCusto, ContaContabil, HistoricoPadrao, Projeto
+
+PERCENTUAL_VALIDADORES = [MinValueValidator(Decimal("0.0001")), MaxValueValidator(Decimal("100"))]
+
+
+class ModeloRateio(BaseModel):
+    """Distribuição percentual reutilizável entre centros de custo e projetos.
+
+    Vale para os itens da conta, do histórico ou da combinação dos dois; em
+    cada tipo de rateio prevalece o modelo mais específico (ver
+    ``services.rateio``). Os percentuais valem como pesos: não precisam
+    somar 100 (três partes de 33,3333% repartem o valor em terços).
+    Só pode haver um modelo ativo por conta e histórico.
+    """
+
+    descricao = models.CharField(max_length=100)
+    conta_contabil = models.ForeignKey(
+        ContaContabil, null=True, blank=True, on_delete=PROTECT, related_name="modelos_rateio"
+    )
+    historico = models.ForeignKey(
+        HistoricoPadrao, null=True, blank=True, on_delete=PROTECT, related_name="modelos_rateio"
+    )
+
+    class Meta:
+        ordering = ["descricao"]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(conta_contabil__isnull=False) | Q(historico__isnull=False),
+                name="modelo_rateio_conta_ou_historico",
+            ),
+            # Coalesce: conta ou histórico nulos também contam como repetidos
+            models.UniqueConstraint(
+                Coalesce("conta_contabil", 0),
+                Coalesce("historico", 0),
+                condition=Q(status=True),
+                name="uniq_modelo_rateio_ativo",
+                violation_error_message="Já existe um modelo ativo para essa conta e histórico.",
+            ),
+        ]
+
+    def __str__(self):
+        return self.descricao
+
+    def clean(self):
+        super().clean()
+        if not self.conta_contabil_id and not self.historico_id:
+            raise ValidationError("Informe a conta, o histórico ou ambos.")
+        if self.conta_contabil_id and self.conta_contabil.tipo != "A":
+            raise ValidationError({"conta_contabil": "A conta do modelo deve ser analítica."})
+
+
+class ModeloRateioCentroCusto(models.Model):
+    modelo = models.ForeignKey(ModeloRateio, on_delete=CASCADE, related_name="centros_custo")
+    centro_custo = models.ForeignKey(CentroCusto, on_delete=PROTECT)
+    percentual = models.DecimalField(max_digits=7, decimal_places=4, validators=PERCENTUAL_VALIDADORES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["modelo", "centro_custo"], name="uniq_modelo_rateio_cc")
+        ]
+
+    def __str__(self):
+        return f"{self.centro_custo_id}: {self.percentual}%"
+
+
+class ModeloRateioProjeto(models.Model):
+    modelo = models.ForeignKey(ModeloRateio, on_delete=CASCADE, related_name="projetos")
+    projeto = models.ForeignKey(Projeto, on_delete=PROTECT)
+    percentual = models.DecimalField(max_digits=7, decimal_places=4, validators=PERCENTUAL_VALIDADORES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["modelo", "projeto"], name="uniq_modelo_rateio_projeto")
+        ]
+
+    def __str__(self):
+        return f"{self.projeto_id}: {self.percentual}%"
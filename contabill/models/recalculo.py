@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import CASCADE, SET_NULL, Q
+
+from . import Filial, Periodo
+
+
+class TarefaRecalculoSaldo(models.Model):
+    """Pedido de recálculo de saldos de uma filial/período (fila no banco).
+
+    Pedidos repetidos para o mesmo par enquanto a tarefa ainda está pendente
+    são mesclados (``solicitacoes`` é incrementado). O worker
+    ``manage.py processar_recalculos`` consome a fila.
+    """
+
+    STATUS_CHOICES = [
+        ("P", "Pendente"),
+        ("E", "Em execução"),
+        ("C", "Concluída"),
+        ("F", "Falhou"),
+    ]
+
+    filial = models.ForeignKey(Filial, on_delete=CASCADE)
+    periodo = models.ForeignKey(Periodo, on_delete=CASCADE)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default="P")
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=SET_NULL
+    )
+    solicitacoes = models.PositiveIntegerField(default=1)
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    duracao = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["filial", "periodo"],
+                condition=Q(status="P"),
+                name="uniq_recalculo_pendente",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Recálculo {self.filial_id}/{self.periodo_id} ({self.get_status_display()})"
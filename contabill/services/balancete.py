@@ -0,0 +1,148 @@
+"""Balancete de verificação a partir de ``SaldoContaPeriodo``.
+
+As sintéticas já estão materializadas na tabela de saldos, então o relatório
+é uma única consulta agregada: saldo inicial do primeiro período do
+intervalo, débitos e créditos somados e saldo final calculado, por conta até
+o nível pedido. A paginação é por chave (código da conta): as contas da
+página são escolhidas pelo índice de código antes da agregação, o que mantém
+o custo de cada página constante mesmo em planos grandes. Com
+``ocultar_zeradas``, some a conta sem nenhum saldo não zerado no intervalo.
+"""
+from django.db import connection
+
+from ..models import ContaContabil, Filial, Periodo, SaldoContaPeriodo
+
+TAMANHO_PAGINA = 200
+
+COLUNAS = (
+    "id",
+    "codigo",
+    "descricao",
+    "nivel",
+    "tipo",
+    "natureza",
+    "saldo_inicial",
+    "debito",
+    "credito",
+    "saldo_final",
+)
+
+# ``pagina`` escolhe primeiro as contas da página, percorrendo o índice de
+# ``codigo COLLATE "C"`` a partir do cursor; só elas são agregadas depois.
+# ``por_filial`` toma o saldo inicial do primeiro período em que a conta
+# aparece no intervalo; a soma por conta junta as filiais da empresa.
+_SQL_BALANCETE = """
+    WITH pagina AS (
+        SELECT c.id
+          FROM {conta} c
+         WHERE c.codigo COLLATE "C" > %(apos)s
+           AND c.nivel <= %(nivel)s
+           AND EXISTS (
+               SELECT 1
+                 FROM {saldo} s
+                 {join_filial}
+                WHERE s.conta_contabil_id = c.id
+                  AND s.periodo_id = ANY(%(periodos)s)
+                  AND {filtro_filial}
+                  {filtro_zeradas}
+           )
+         ORDER BY c.codigo COLLATE "C"
+         LIMIT %(limite)s
+    ),
+    por_filial AS (
+        SELECT s.conta_contabil_id,
+               (ARRAY_AGG(s.saldo_inicial ORDER BY p.data_inicio))[1] AS saldo_inicial,
+               SUM(s.debito) AS debito,
+               SUM(s.credito) AS credito
+          FROM {saldo} s
+          JOIN {periodo} p ON p.id = s.periodo_id
+          {join_filial}
+         WHERE s.conta_contabil_id IN (SELECT id FROM pagina)
+           AND s.periodo_id = ANY(%(periodos)s)
+           AND {filtro_filial}
+         GROUP BY s.conta_contabil_id, s.filial_id
+    )
+    SELECT c.id, c.codigo, c.descricao, c.nivel, c.tipo, c.natureza,
+           SUM(b.saldo_inicial), SUM(b.debito), SUM(b.credito),
+           SUM(b.saldo_inicial + b.debito - b.credito)
+      FROM por_filial b
+      JOIN {conta} c ON c.id = b.conta_contabil_id
+     GROUP BY c.id
+     ORDER BY c.codigo COLLATE "C"
+"""
+
+
+def periodos_do_intervalo(periodo_inicial, periodo_final=None):
+    """Períodos da empresa de ``periodo_inicial`` até ``periodo_final`` (inclusive)."""
+    periodo_final = periodo_final or periodo_inicial
+    if periodo_final.data_inicio < periodo_inicial.data_inicio:
+        raise ValueError("O período final é anterior ao inicial.")
+    return list(
+        Periodo.objects.filter(
+            empresa_id=periodo_inicial.empresa_id,
+            data_inicio__gte=periodo_inicial.data_inicio,
+            data_inicio__lte=periodo_final.data_inicio,
+        ).order_by("data_inicio")
+    )
+
+
+def balancete(
+    periodos,
+    empresa_id=None,
+    filial_id=None,
+    nivel=5,
+    apos="",
+    limite=TAMANHO_PAGINA,
+    ocultar_zeradas=True,
+):
+    """Página do balancete: lista de dicts com ``COLUNAS``, ordenada por código.
+
+    ``periodos`` é a lista (ou ids) do intervalo; informe ``filial_id`` ou
+    ``empresa_id`` (todas as filiais). ``apos`` é o código da última conta da
+    página anterior.
+    """
+    if not filial_id and not empresa_id:
+        raise ValueError("Informe a empresa ou a filial.")
+    periodo_ids = [getattr(p, "pk", p) for p in periodos]
+    if not periodo_ids:
+        return []
+    t = {
+        "saldo": SaldoContaPeriodo._meta.db_table,
+        "periodo": Periodo._meta.db_table,
+        "conta": ContaContabil._meta.db_table,
+    }
+    if filial_id:
+        join_filial, filtro_filial = "", "s.filial_id = %(filial)s"
+    else:
+        join_filial = f"JOIN {Filial._meta.db_table} f ON f.id = s.filial_id"
+        filtro_filial = "f.empresa_id = %(empresa)s"
+    filtro_zeradas = ""
+    if ocultar_zeradas:
+        filtro_zeradas = "AND (s.saldo_inicial <> 0 OR s.debito <> 0 OR s.credito <> 0)"
+    sql = _SQL_BALANCETE.format(
+        join_filial=join_filial, filtro_filial=filtro_filial, filtro_zeradas=filtro_zeradas, **t
+    )
+    params = {
+        "periodos": periodo_ids,
+        "filial": filial_id,
+        "empresa": empresa_id,
+        "nivel": nivel,
+        "apos": apos or "",
+        "limite": limite,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [dict(zip(COLUNAS, linha)) for linha in cursor.fetchall()]
+
+
+def linhas_balancete(periodos, tamanho_pagina=2000, **filtros):
+    """Todas as linhas do balancete, buscadas página a página (para exportação)."""
+    filtros.pop("apos", None)
+    filtros.pop("limite", None)
+    apos = ""
+    while True:
+        pagina = balancete(periodos, apos=apos, limite=tamanho_pagina, **filtros)
+        yield from pagina
+        if len(pagina) < tamanho_pagina:
+            return
+        apos = pagina[-1]["codigo"]
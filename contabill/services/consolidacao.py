@@ -0,0 +1,195 @@
+"""Consolidação dos saldos das filiais por empresa e por grupo empresarial.
+
+Um único comando agrega ``SaldoContaPeriodo`` das filiais com ``GROUPING
+SETS`` (empresa e grupo) e grava o resultado em ``SaldoConsolidado`` com
+upsert, removendo as linhas que deixaram de existir. A atualização é
+incremental: só são refeitas as empresas com alguma filial cujo
+``versao_saldos`` ainda não foi consolidado (``versao_consolidada``), junto
+com as demais empresas dos seus grupos, e só nos períodos a partir do
+primeiro alterado (``Filial.consolidar_desde``).
+"""
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from cadastros.models import Empresa
+
+from ..models import Filial, GrupoEmpresarial, Periodo, SaldoConsolidado, SaldoContaPeriodo
+
+_SQL_CONSOLIDAR = """
+    WITH corte_empresa AS (
+        SELECT * FROM unnest(%(empresas)s::bigint[], %(desde_empresas)s::date[]) AS c(id, desde)
+    ),
+    corte_grupo AS (
+        SELECT * FROM unnest(%(grupos)s::bigint[], %(desde_grupos)s::date[]) AS c(id, desde)
+    ),
+    fonte AS (
+        SELECT e.id AS empresa_id, e.grupo_empresarial_id AS grupo_id,
+               s.conta_contabil_id AS conta, p.data_inicio, p.data_fim,
+               s.saldo_inicial, s.debito, s.credito, s.saldo_final
+          FROM {saldo} s
+          JOIN {filial} f ON f.id = s.filial_id
+          JOIN {empresa} e ON e.id = f.empresa_id
+          JOIN {periodo} p ON p.id = s.periodo_id
+          JOIN corte_empresa c ON c.id = f.empresa_id
+         WHERE p.data_inicio >= c.desde
+    ),
+    agregado AS (
+        SELECT CASE WHEN GROUPING(empresa_id) = 0 THEN 'E' ELSE 'G' END AS nivel,
+               empresa_id, grupo_id, conta, data_inicio, MAX(data_fim) AS data_fim,
+               SUM(saldo_inicial) AS saldo_inicial, SUM(debito) AS debito,
+               SUM(credito) AS credito, SUM(saldo_final) AS saldo_final
+          FROM fonte
+         GROUP BY GROUPING SETS ((empresa_id, conta, data_inicio), (grupo_id, conta, data_inicio))
+    ),
+    empresas AS (
+        INSERT INTO {consolidado} AS d
+               (nivel, empresa_id, grupo_id, conta_contabil_id, data_inicio, data_fim,
+                saldo_inicial, debito, credito, saldo_final, atualizado_em)
+        SELECT 'E', empresa_id, NULL, conta, data_inicio, data_fim,
+               saldo_inicial, debito, credito, saldo_final, NOW()
+          FROM agregado
+         WHERE nivel = 'E'
+        ON CONFLICT (empresa_id, conta_contabil_id, data_inicio) WHERE nivel = 'E' DO UPDATE
+           SET {atualizar}
+         WHERE {mudou}
+        RETURNING 1
+    ),
+    grupos AS (
+        INSERT INTO {consolidado} AS d
+               (nivel, empresa_id, grupo_id, conta_contabil_id, data_inicio, data_fim,
+                saldo_inicial, debito, credito, saldo_final, atualizado_em)
+        SELECT 'G', NULL, grupo_id, conta, data_inicio, data_fim,
+               saldo_inicial, debito, credito, saldo_final, NOW()
+          FROM agregado
+         WHERE nivel = 'G' AND grupo_id IS NOT NULL
+        ON CONFLICT (grupo_id, conta_contabil_id, data_inicio) WHERE nivel = 'G' DO UPDATE
+           SET {atualizar}
+         WHERE {mudou}
+        RETURNING 1
+    ),
+    removidos AS (
+        DELETE FROM {consolidado} d
+         WHERE ((d.nivel = 'E' AND EXISTS (
+                    SELECT 1 FROM corte_empresa c
+                     WHERE c.id = d.empresa_id AND d.data_inicio >= c.desde))
+                OR (d.nivel = 'G' AND EXISTS (
+                    SELECT 1 FROM corte_grupo c
+                     WHERE c.id = d.grupo_id AND d.data_inicio >= c.desde)))
+           AND NOT EXISTS (
+               SELECT 1 FROM agregado a
+                WHERE a.nivel = d.nivel
+                  AND a.conta = d.conta_contabil_id
+                  AND a.data_inicio = d.data_inicio
+                  AND (a.empresa_id = d.empresa_id OR a.grupo_id = d.grupo_id)
+           )
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM empresas),
+           (SELECT COUNT(*) FROM grupos),
+           (SELECT COUNT(*) FROM removidos)
+"""
+
+_ATUALIZAR = """data_fim = EXCLUDED.data_fim,
+               saldo_inicial = EXCLUDED.saldo_inicial,
+               debito = EXCLUDED.debito,
+               credito = EXCLUDED.credito,
+               saldo_final = EXCLUDED.saldo_final,
+               atualizado_em = EXCLUDED.atualizado_em"""
+
+_MUDOU = """(d.data_fim, d.saldo_inicial, d.debito, d.credito, d.saldo_final)
+               IS DISTINCT FROM
+               (EXCLUDED.data_fim, EXCLUDED.saldo_inicial, EXCLUDED.debito,
+                EXCLUDED.credito, EXCLUDED.saldo_final)"""
+
+
+def cortes_pendentes():
+    """Empresas com saldos de filial não consolidados -> primeiro período alterado.
+
+    ``None`` quando alguma filial da empresa precisa de todos os períodos.
+    """
+    cortes = {}
+    pendentes = Filial.objects.exclude(versao_consolidada=F("versao_saldos")).values_list(
+        "empresa_id", "consolidar_desde"
+    )
+    for empresa_id, desde in pendentes:
+        atual = cortes.get(empresa_id, desde)
+        cortes[empresa_id] = None if atual is None or desde is None else min(atual, desde)
+    return cortes
+
+
+def empresas_pendentes():
+    """Ids das empresas com saldos de filial ainda não consolidados."""
+    return set(cortes_pendentes())
+
+
+def consolidar(empresa_ids=None, desde=None):
+    """Reconsolida as empresas (todas, se ``None``) e os grupos a que pertencem.
+
+    ``desde`` ({empresa_id: data}) limita a empresa aos períodos com
+    ``data_inicio`` a partir da data; sem data, vão todos. O grupo é refeito
+    desde a data mais antiga das suas empresas, e todas elas com ele.
+
+    Retorna ``{"empresa": n, "grupo": n, "removidos": n}`` com as linhas de
+    ``SaldoConsolidado`` gravadas (só as que mudaram) e removidas.
+    """
+    desde = desde or {}
+    if empresa_ids is None:
+        empresas = dict.fromkeys(Empresa.objects.values_list("id", flat=True), date.min)
+        grupos = dict.fromkeys(GrupoEmpresarial.objects.values_list("id", flat=True), date.min)
+    else:
+        empresas = {empresa_id: desde.get(empresa_id) or date.min for empresa_id in empresa_ids}
+        grupos = {}
+        for empresa_id, grupo_id in Empresa.objects.filter(
+            id__in=empresas, grupo_empresarial__isnull=False
+        ).values_list("id", "grupo_empresarial_id"):
+            grupos[grupo_id] = min(grupos.get(grupo_id, date.max), empresas[empresa_id])
+        # o total do grupo depende de todas as empresas dele
+        for empresa_id, grupo_id in Empresa.objects.filter(grupo_empresarial__in=grupos).values_list(
+            "id", "grupo_empresarial_id"
+        ):
+            empresas[empresa_id] = grupos[grupo_id]
+    if not empresas and not grupos:
+        return {"empresa": 0, "grupo": 0, "removidos": 0}
+
+    sql = _SQL_CONSOLIDAR.format(
+        saldo=SaldoContaPeriodo._meta.db_table,
+        filial=Filial._meta.db_table,
+        empresa=Empresa._meta.db_table,
+        periodo=Periodo._meta.db_table,
+        consolidado=SaldoConsolidado._meta.db_table,
+        atualizar=_ATUALIZAR,
+        mudou=_MUDOU,
+    )
+    params = {
+        "empresas": list(empresas),
+        "desde_empresas": list(empresas.values()),
+        "grupos": list(grupos),
+        "desde_grupos": list(grupos.values()),
+    }
+    # Versões lidas antes da agregação: a filial que mudar durante ela não é
+    # marcada e continua pendente, com o ``consolidar_desde`` acumulado.
+    filiais = list(
+        Filial.objects.filter(empresa_id__in=empresas)
+        .exclude(versao_consolidada=F("versao_saldos"))
+        .values_list("id", "versao_saldos")
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        gravadas_empresa, gravadas_grupo, removidas = cursor.fetchone()
+        if filiais:
+            Filial.objects.filter(
+                reduce(or_, (Q(pk=pk, versao_saldos=versao) for pk, versao in filiais))
+            ).update(versao_consolidada=F("versao_saldos"), consolidar_desde=None)
+    return {"empresa": gravadas_empresa, "grupo": gravadas_grupo, "removidos": removidas}
+
+
+def atualizar_consolidacao():
+    """Reconsolida só o que mudou desde a última execução (``None`` se nada mudou)."""
+    pendentes = cortes_pendentes()
+    if not pendentes:
+        return None
+    return consolidar(pendentes, desde=pendentes)
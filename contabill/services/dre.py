@@ -0,0 +1,156 @@
+"""DRE gerencial por centro de custo e por projeto.
+
+Lê ``SaldoCentroCustoPeriodo``/``SaldoProjetoPeriodo`` (preenchidos pelos
+rateios) das contas de receita, custo e despesa. Uma única consulta com
+``GROUPING SETS`` devolve, para todos os períodos pedidos, o valor por conta,
+o total de cada grupo e o resultado, já somados sobre a subárvore do centro
+de custo. O resultado fica em cache com a chave (períodos, filial/empresa,
+``Filial.versao_saldos``), então qualquer alteração de saldo o invalida.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+
+from ..models import (
+    CentroCusto,
+    ContaContabil,
+    Filial,
+    SaldoCentroCustoPeriodo,
+    SaldoContaPeriodo,
+    SaldoProjetoPeriodo,
+)
+
+CACHE_TIMEOUT = 60 * 60
+
+# Ordem dos grupos na DRE; o valor é crédito - débito, então receitas
+# entram positivas e custos/despesas negativos.
+GRUPOS = (
+    ("R", "Receitas"),
+    ("C", "Custos"),
+    ("D", "Despesas"),
+)
+
+_SQL_DRE = """
+    SELECT c.classificacao, c.id, c.codigo, c.descricao, d.periodo_id,
+           GROUPING(c.classificacao, c.id) AS nivel_grupo,
+           SUM(d.credito - d.debito)
+      FROM {tabela} d
+      JOIN {saldo} s ON s.id = d.saldo_conta_periodo_id
+      JOIN {conta} c ON c.id = s.conta_contabil_id
+      JOIN {filial} f ON f.id = s.filial_id
+      {join_dimensao}
+     WHERE d.periodo_id = ANY(%(periodos)s)
+       AND c.classificacao IN ('R', 'C', 'D')
+       AND {filtro_filial}
+       AND {filtro_dimensao}
+     GROUP BY GROUPING SETS (
+         (d.periodo_id, c.classificacao, c.id, c.codigo, c.descricao),
+         (d.periodo_id, c.classificacao),
+         (d.periodo_id)
+     )
+"""
+
+
+def _versao(filial_id, empresa_id):
+    if filial_id:
+        return Filial.objects.values_list("versao_saldos", flat=True).get(pk=filial_id)
+    versoes = Filial.objects.filter(empresa_id=empresa_id).aggregate(total=Sum("versao_saldos"))
+    return versoes["total"] or 0
+
+
+def _executar(tabela, join_dimensao, filtro_dimensao, params, periodo_ids, filial_id, empresa_id):
+    if not filial_id and not empresa_id:
+        raise ValueError("Informe a empresa ou a filial.")
+    sql = _SQL_DRE.format(
+        tabela=tabela,
+        saldo=SaldoContaPeriodo._meta.db_table,
+        conta=ContaContabil._meta.db_table,
+        filial=Filial._meta.db_table,
+        join_dimensao=join_dimensao,
+        filtro_dimensao=filtro_dimensao,
+        filtro_filial="f.id = %(filial)s" if filial_id else "f.empresa_id = %(empresa)s",
+    )
+    params = {**params, "periodos": periodo_ids, "filial": filial_id, "empresa": empresa_id}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return _montar(cursor.fetchall(), periodo_ids)
+
+
+def _montar(linhas, periodo_ids):
+    """Pivota as linhas (uma por período) em colunas na ordem de ``periodo_ids``."""
+    coluna = {periodo_id: n for n, periodo_id in enumerate(periodo_ids)}
+    vazio = [0] * len(periodo_ids)
+    grupos = {
+        classificacao: {"classificacao": classificacao, "titulo": titulo, "contas": {}, "total": list(vazio)}
+        for classificacao, titulo in GRUPOS
+    }
+    resultado = list(vazio)
+    for classificacao, conta_id, codigo, descricao, periodo_id, nivel, valor in linhas:
+        n = coluna[periodo_id]
+        if nivel == 3:
+            resultado[n] = valor
+        elif nivel == 1:
+            grupos[classificacao]["total"][n] = valor
+        else:
+            conta = grupos[classificacao]["contas"].setdefault(
+                conta_id,
+                {"id": conta_id, "codigo": codigo, "descricao": descricao, "valores": list(vazio)},
+            )
+            conta["valores"][n] = valor
+    for grupo in grupos.values():
+        grupo["contas"] = sorted(grupo["contas"].values(), key=lambda c: c["codigo"])
+    return {"grupos": list(grupos.values()), "resultado": resultado}
+
+
+def _em_cache(chave, periodos, filial_id, empresa_id, calcular):
+    periodo_ids = [getattr(p, "pk", p) for p in periodos]
+    escopo = f"f{filial_id}" if filial_id else f"e{empresa_id}"
+    chave = (
+        f"contabill:dre:{chave}:{escopo}:{'-'.join(map(str, periodo_ids))}"
+        f":v{_versao(filial_id, empresa_id)}"
+    )
+    dre = cache.get(chave)
+    if dre is None:
+        dre = calcular(periodo_ids)
+        cache.set(chave, dre, CACHE_TIMEOUT)
+    return dre
+
+
+def dre_centro_custo(periodos, centro_custo=None, filial_id=None, empresa_id=None):
+    """DRE da subárvore de ``centro_custo`` (todos os centros, se ``None``).
+
+    Retorna ``{"grupos": [...], "resultado": [...]}``; cada grupo traz
+    ``contas`` (com ``valores`` por período) e ``total``, e as listas seguem a
+    ordem de ``periodos``.
+    """
+    join_dimensao = f"JOIN {CentroCusto._meta.db_table} cc ON cc.id = d.centro_custo_id"
+    filtro, params = "TRUE", {}
+    if centro_custo is not None:
+        filtro, params = "cc.caminho LIKE %(caminho)s", {"caminho": centro_custo.caminho + "%"}
+
+    def calcular(periodo_ids):
+        return _executar(
+            SaldoCentroCustoPeriodo._meta.db_table,
+            join_dimensao, filtro, params, periodo_ids, filial_id, empresa_id,
+        )
+
+    chave = f"cc{centro_custo.pk if centro_custo else ''}"
+    return _em_cache(chave, periodos, filial_id, empresa_id, calcular)
+
+
+def dre_projeto(periodos, projetos=None, filial_id=None, empresa_id=None):
+    """DRE dos ``projetos`` (ids ou objetos; todos, se ``None``); ver ``dre_centro_custo``."""
+    filtro, params = "TRUE", {}
+    projeto_ids = None
+    if projetos is not None:
+        projeto_ids = sorted(getattr(p, "pk", p) for p in projetos)
+        filtro, params = "d.projeto_id = ANY(%(projetos)s)", {"projetos": projeto_ids}
+
+    def calcular(periodo_ids):
+        return _executar(
+            SaldoProjetoPeriodo._meta.db_table,
+            "", filtro, params, periodo_ids, filial_id, empresa_id,
+        )
+
+    chave = "proj" + ("" if projeto_ids is None else ",".join(map(str, projeto_ids)))
+    return _em_cache(chave, periodos, filial_id, empresa_id, calcular)
@@ -0,0 +1,139 @@
+"""Opções dos campos conta, histórico e moeda dos itens de lançamento.
+
+Os formulários não renderizam mais a lista inteira: conta e histórico são
+buscados enquanto se digita (``buscar``) e só a moeda, que é uma tabela
+pequena, vira ``<select>`` (``escolhas``). Listas e buscas ficam no cache do
+Django com a versão da fonte na chave: um contador, também no cache, que os
+sinais ``post_save``/``post_delete`` do modelo incrementam. Alterações em
+massa (``QuerySet.update``, ``bulk_create``) não disparam sinais e só
+aparecem quando o cache expira ou com ``invalidar``. A busca de conta por
+código usa o índice ``LIKE`` de ``codigo``.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from ..models import ContaContabil, HistoricoPadrao, Moeda
+
+CACHE_TIMEOUT = 15 * 60
+LIMITE_BUSCA = 20
+
+
+def _buscar_contas(qs, termo):
+    if termo[:1].isdigit():
+        return qs.filter(codigo__startswith=termo)
+    return qs.filter(descricao__icontains=termo)
+
+
+def _buscar_historicos(qs, termo):
+    filtro = Q(descricao__icontains=termo)
+    if termo.isdigit():
+        filtro |= Q(pk=int(termo))
+    return qs.filter(filtro)
+
+
+def _buscar_moedas(qs, termo):
+    return qs.filter(Q(codigo__istartswith=termo) | Q(descricao__icontains=termo))
+
+
+# nome do campo -> (modelo, filtro das opções, busca, campos usados no __str__)
+FONTES = {
+    "conta_contabil": (ContaContabil, {"tipo": "A", "status": True}, _buscar_contas, ("codigo", "descricao")),
+    "historico": (HistoricoPadrao, {"status": True}, _buscar_historicos, ("descricao",)),
+    "moeda": (Moeda, {"status": True}, _buscar_moedas, ("codigo", "descricao")),
+}
+
+
+def _opcoes(fonte):
+    modelo, filtro, _, campos = FONTES[fonte]
+    return modelo.objects.filter(**filtro).only("pk", *campos)
+
+
+def _lista(qs):
+    return [(obj.pk, str(obj)) for obj in qs]
+
+
+def _chave_versao(fonte):
+    return f"contabill:escolhas:{fonte}:versao"
+
+
+def versao(fonte):
+    """Versão das opções da fonte; muda a cada inclusão, alteração ou exclusão."""
+    chave = _chave_versao(fonte)
+    atual = cache.get(chave)
+    if atual is None:
+        # começa de um valor novo, para não reaproveitar listas de uma versão perdida
+        cache.add(chave, time.time_ns(), None)
+        atual = cache.get(chave)
+    return atual
+
+
+def invalidar(fonte):
+    """Descarta as listas e buscas em cache da fonte."""
+    try:
+        cache.incr(_chave_versao(fonte))
+    except ValueError:
+        cache.add(_chave_versao(fonte), time.time_ns(), None)
+
+
+def _invalidar_pelo_sinal(sender, **kwargs):
+    for fonte, (modelo, *_) in FONTES.items():
+        if issubclass(sender, modelo):
+            invalidar(fonte)
+
+
+def conectar_sinais():
+    """Liga a invalidação às gravações dos modelos das fontes (ver ``apps.ready``)."""
+    for modelo, *_ in FONTES.values():
+        uid = f"contabill:escolhas:{modelo.__name__}"
+        post_save.connect(_invalidar_pelo_sinal, sender=modelo, dispatch_uid=uid)
+        post_delete.connect(_invalidar_pelo_sinal, sender=modelo, dispatch_uid=uid)
+
+
+def _em_cache(fonte, chave, calcular):
+    chave = f"contabill:escolhas:{fonte}:{versao(fonte)}:{chave}"
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, CACHE_TIMEOUT)
+    return valor
+
+
+def escolhas(fonte):
+    """Lista ``[(id, rótulo)]`` de todas as opções ativas da fonte."""
+    return _em_cache(fonte, "todas", lambda: _lista(_opcoes(fonte)))
+
+
+def buscar(fonte, termo, limite=LIMITE_BUSCA):
+    """Até ``limite`` opções ``[(id, rótulo)]`` que casam com ``termo``."""
+    termo = " ".join(termo.split())
+    if not termo:
+        return []
+    busca = FONTES[fonte][2]
+    chave = hashlib.sha1(termo.lower().encode()).hexdigest()
+    return _em_cache(
+        fonte, f"busca:{limite}:{chave}",
+        lambda: _lista(busca(_opcoes(fonte), termo)[:limite]),
+    )
+
+
+def rotulos(fonte, pks):
+    """``{pk: rótulo}`` das opções ``pks`` da fonte, numa única consulta."""
+    modelo, _, _, campos = FONTES[fonte]
+    ids = set()
+    for pk in pks:
+        try:
+            ids.add(int(pk))
+        except (TypeError, ValueError):
+            continue
+    if not ids:
+        return {}
+    return {obj.pk: str(obj) for obj in modelo.objects.only("pk", *campos).filter(pk__in=ids)}
+
+
+def rotulo(fonte, pk):
+    """Rótulo da opção ``pk`` (vazio se não existir)."""
+    return next(iter(rotulos(fonte, [pk]).values()), "")
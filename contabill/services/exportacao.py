@@ -0,0 +1,68 @@
+"""Exportação de relatórios em CSV/XLSX sem montar o arquivo em memória."""
+import csv
+import tempfile
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+
+
+class _Eco:
+    """Pseudo-arquivo para o ``csv.writer``: devolve a linha em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def _celula_csv(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, Decimal):
+        return f"{valor:.2f}".replace(".", ",")
+    return valor
+
+
+def resposta_csv(nome, cabecalho, linhas):
+    """``StreamingHttpResponse`` que escreve o CSV (``;``, decimal com vírgula) linha a linha."""
+    escritor = csv.writer(_Eco(), delimiter=";")
+
+    def gerar():
+        yield "\ufeff" + escritor.writerow(cabecalho)
+        for linha in linhas:
+            yield escritor.writerow([_celula_csv(v) for v in linha])
+
+    resposta = StreamingHttpResponse(gerar(), content_type="text/csv; charset=utf-8")
+    resposta["Content-Disposition"] = f'attachment; filename="{nome}.csv"'
+    return resposta
+
+
+def resposta_xlsx(nome, cabecalho, linhas):
+    """Resposta com o xlsx gravado em modo ``write_only`` num arquivo temporário.
+
+    O xlsx é um zip e só fica válido quando fechado, então as linhas vão para
+    disco à medida que chegam e o arquivo é enviado em blocos depois.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as exc:
+        raise ValueError("Exportação para xlsx requer o pacote openpyxl.") from exc
+
+    livro = Workbook(write_only=True)
+    folha = livro.create_sheet(nome[:31])
+    folha.append(list(cabecalho))
+    for linha in linhas:
+        folha.append(list(linha))
+    arquivo = tempfile.TemporaryFile()
+    livro.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=f"{nome}.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+def resposta_exportacao(formato, nome, cabecalho, linhas):
+    if formato == "xlsx":
+        return resposta_xlsx(nome, cabecalho, linhas)
+    return resposta_csv(nome, cabecalho, linhas)
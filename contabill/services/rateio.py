@@ -0,0 +1,173 @@
+"""Rateio automático dos itens pelos modelos de rateio (``ModeloRateio``).
+
+``dividir`` reparte um valor pelos percentuais com o método dos maiores
+restos: cada parte recebe o piso em centavos e os centavos que sobram vão,
+um a um, para as maiores frações, então as parcelas somam exatamente o
+valor do item. ``ModelosRateio`` carrega os modelos ativos uma vez e
+``aplicar_modelos`` rateia qualquer quantidade de itens com poucas
+consultas, gravando com ``bulk_create``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from ..models import (
+    ModeloRateio,
+    ModeloRateioCentroCusto,
+    ModeloRateioProjeto,
+    RateioLancamentoItemCentroCusto,
+    RateioLancamentoItemProjeto,
+)
+from .saldo import manter_saldos
+
+CENTAVO = Decimal("0.01")
+# percentuais têm 4 casas decimais
+ESCALA_PERCENTUAL = 10000
+TAMANHO_LOTE = 1000
+
+
+def dividir(valor, percentuais):
+    """Reparte ``valor`` na proporção de ``percentuais``; as partes somam ``valor``.
+
+    Os percentuais não precisam somar 100: valem como pesos.
+    """
+    pesos = [int(Decimal(p) * ESCALA_PERCENTUAL) for p in percentuais]
+    total = sum(pesos)
+    if not pesos or total <= 0:
+        raise ValueError("Percentuais do rateio devem somar mais que zero.")
+    centavos = int(Decimal(valor).quantize(CENTAVO) / CENTAVO)
+    partes, restos = [], []
+    for indice, peso in enumerate(pesos):
+        parte, resto = divmod(centavos * peso, total)
+        partes.append(parte)
+        restos.append((-resto, indice))
+    # o que sobrou do piso é menor que o número de partes
+    for _, indice in sorted(restos)[: centavos - sum(partes)]:
+        partes[indice] += 1
+    return [Decimal(parte) * CENTAVO for parte in partes]
+
+
+class ModelosRateio:
+    """Modelos ativos indexados por (conta, histórico), carregados em três consultas.
+
+    Em cada tipo (CC ou projeto) vale o modelo mais específico que tenha
+    percentuais daquele tipo: conta e histórico, só a conta, só o histórico.
+    """
+
+    def __init__(self):
+        chaves = {}
+        for modelo_id, conta_id, historico_id in (
+            ModeloRateio.objects.filter(status=True)
+            .order_by("id")
+            .values_list("id", "conta_contabil_id", "historico_id")
+        ):
+            chaves.setdefault((conta_id, historico_id), modelo_id)
+        self.centros_custo = self._indexar(chaves, ModeloRateioCentroCusto, "centro_custo_id")
+        self.projetos = self._indexar(chaves, ModeloRateioProjeto, "projeto_id")
+
+    @staticmethod
+    def _indexar(chaves, modelo, campo):
+        percentuais = defaultdict(list)
+        for modelo_id, destino, percentual in (
+            modelo.objects.filter(modelo_id__in=chaves.values())
+            .order_by("modelo_id", "id")
+            .values_list("modelo_id", campo, "percentual")
+        ):
+            percentuais[modelo_id].append((destino, percentual))
+        return {
+            chave: percentuais[modelo_id]
+            for chave, modelo_id in chaves.items()
+            if modelo_id in percentuais
+        }
+
+    @staticmethod
+    def _procurar(indice, conta_id, historico_id):
+        for chave in ((conta_id, historico_id), (conta_id, None), (None, historico_id)):
+            if chave in indice:
+                return indice[chave]
+        return None
+
+    def percentuais_cc(self, conta_id, historico_id):
+        """``[(centro_custo_id, percentual)]`` que valem para o item (ou ``None``)."""
+        return self._procurar(self.centros_custo, conta_id, historico_id)
+
+    def percentuais_projeto(self, conta_id, historico_id):
+        """``[(projeto_id, percentual)]`` que valem para o item (ou ``None``)."""
+        return self._procurar(self.projetos, conta_id, historico_id)
+
+    def __bool__(self):
+        return bool(self.centros_custo or self.projetos)
+
+
+def ratear(valor, percentuais):
+    """``[(destino, valor)]`` do rateio de ``valor``; partes zeradas ficam de fora."""
+    destinos = [destino for destino, _ in percentuais]
+    partes = dividir(valor, [percentual for _, percentual in percentuais])
+    return [(destino, parte) for destino, parte in zip(destinos, partes) if parte]
+
+
+def aplicar_modelos(itens, substituir=False, modelos=None):
+    """Rateia pelos modelos os itens ativos do queryset ``itens``.
+
+    Por padrão só recebem rateio de um tipo os itens que ainda não têm
+    nenhum daquele tipo; com ``substituir`` os rateios existentes dos itens
+    cobertos por um modelo são trocados. Os itens ficam travados da leitura
+    dos rateios existentes até a gravação, e os saldos de CC e projeto são
+    ajustados na mesma transação. Retorna ``{"itens": n, "cc": n, "projeto": n}``.
+    """
+    modelos = modelos if modelos is not None else ModelosRateio()
+    resultado = {"itens": 0, "cc": 0, "projeto": 0}
+    if not modelos:
+        return resultado
+    with transaction.atomic():
+        # trava os itens antes de ler quais já têm rateio: uma aplicação
+        # simultânea espera e depois enxerga os rateios gravados por esta
+        list(
+            itens.filter(status=True).select_for_update(of=("self",)).order_by("id").values_list("id")
+        )
+        linhas = (
+            itens.filter(status=True)
+            .annotate(
+                tem_cc=Exists(
+                    RateioLancamentoItemCentroCusto.objects.filter(lancamento_item=OuterRef("pk"))
+                ),
+                tem_projeto=Exists(
+                    RateioLancamentoItemProjeto.objects.filter(lancamento_item=OuterRef("pk"))
+                ),
+            )
+            .order_by("id")
+            .values_list("id", "valor", "conta_contabil_id", "historico_id", "tem_cc", "tem_projeto")
+        )
+        novos_cc, novos_projeto = [], []
+        trocar_cc, trocar_projeto = [], []
+        afetados = set()
+        for item_id, valor, conta_id, historico_id, tem_cc, tem_projeto in linhas:
+            for percentuais, existe, trocar, novos, modelo, campo in (
+                (
+                    modelos.percentuais_cc(conta_id, historico_id), tem_cc, trocar_cc, novos_cc,
+                    RateioLancamentoItemCentroCusto, "centro_custo_id",
+                ),
+                (
+                    modelos.percentuais_projeto(conta_id, historico_id), tem_projeto, trocar_projeto,
+                    novos_projeto, RateioLancamentoItemProjeto, "projeto_id",
+                ),
+            ):
+                if not percentuais or (existe and not substituir):
+                    continue
+                if existe:
+                    trocar.append(item_id)
+                novos.extend(
+                    modelo(lancamento_item_id=item_id, valor=parte, **{campo: destino})
+                    for destino, parte in ratear(valor, percentuais)
+                )
+                afetados.add(item_id)
+        if not afetados:
+            return resultado
+        with manter_saldos(itens=afetados):
+            RateioLancamentoItemCentroCusto.objects.filter(lancamento_item_id__in=trocar_cc).delete()
+            RateioLancamentoItemProjeto.objects.filter(lancamento_item_id__in=trocar_projeto).delete()
+            RateioLancamentoItemCentroCusto.objects.bulk_create(novos_cc, batch_size=TAMANHO_LOTE)
+            RateioLancamentoItemProjeto.objects.bulk_create(novos_projeto, batch_size=TAMANHO_LOTE)
+    return {"itens": len(afetados), "cc": len(novos_cc), "projeto": len(novos_projeto)}
@@ -0,0 +1,165 @@
+"""Razão contábil: lançamentos de uma conta no intervalo com saldo acumulado.
+
+O saldo de abertura vem de ``SaldoContaPeriodo`` (saldo inicial do período
+que contém a data inicial, mais o movimento entre o início do período e a
+data). As linhas são lidas com cursor no servidor e o saldo linha a linha é
+calculado no banco com ``SUM(...) OVER``, então nada do intervalo precisa
+caber na memória do processo.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import F, Q
+
+from ..models import (
+    ContaContabil,
+    Filial,
+    HistoricoPadrao,
+    LancamentoContabil,
+    LancamentoItem,
+    Periodo,
+    SaldoContaPeriodo,
+)
+
+TAMANHO_LOTE = 2000
+
+COLUNAS = (
+    "data",
+    "lancamento_id",
+    "numero_documento",
+    "filial",
+    "conta",
+    "historico",
+    "descricao",
+    "debito",
+    "credito",
+    "saldo",
+)
+
+
+def _tabelas():
+    return {
+        "conta": ContaContabil._meta.db_table,
+        "filial": Filial._meta.db_table,
+        "hist": HistoricoPadrao._meta.db_table,
+        "lanc": LancamentoContabil._meta.db_table,
+        "item": LancamentoItem._meta.db_table,
+        "periodo": Periodo._meta.db_table,
+        "saldo": SaldoContaPeriodo._meta.db_table,
+    }
+
+
+# Itens ativos da conta (ou das analíticas abaixo dela, se for sintética).
+_FILTRO_ITENS = """
+    (c.codigo = %(codigo)s OR c.codigo LIKE %(prefixo)s)
+    AND l.status AND i.status
+    AND {filtro_filial}
+"""
+
+_SQL_MOVIMENTO_ANTERIOR = """
+    SELECT COALESCE(SUM(CASE WHEN i.tipo_dc = 'D' THEN i.valor ELSE -i.valor END), 0)
+      FROM {item} i
+      JOIN {lanc} l ON l.id = i.lancamento_id
+      JOIN {conta} c ON c.id = i.conta_contabil_id
+      JOIN {filial} f ON f.id = l.filial_id
+     WHERE {filtro}
+       AND l.data_competencia < %(inicio)s
+       AND (%(desde)s::date IS NULL OR l.data_competencia >= %(desde)s)
+"""
+
+_SQL_SALDO_INICIAL = """
+    SELECT COALESCE(SUM(s.saldo_inicial), 0)
+      FROM {saldo} s
+      JOIN {filial} f ON f.id = s.filial_id
+     WHERE s.conta_contabil_id = %(conta)s
+       AND s.periodo_id = %(periodo)s
+       AND {filtro_filial}
+"""
+
+_SQL_RAZAO = """
+    SELECT l.data_competencia, l.id, l.numero_documento, f.codigo, c.codigo,
+           h.descricao, l.descricao,
+           CASE WHEN i.tipo_dc = 'D' THEN i.valor ELSE 0 END,
+           CASE WHEN i.tipo_dc = 'C' THEN i.valor ELSE 0 END,
+           %(abertura)s + SUM(CASE WHEN i.tipo_dc = 'D' THEN i.valor ELSE -i.valor END)
+               OVER (ORDER BY l.data_competencia, l.id, i.id ROWS UNBOUNDED PRECEDING)
+      FROM {item} i
+      JOIN {lanc} l ON l.id = i.lancamento_id
+      JOIN {conta} c ON c.id = i.conta_contabil_id
+      JOIN {filial} f ON f.id = l.filial_id
+      JOIN {hist} h ON h.id = i.historico_id
+     WHERE {filtro}
+       AND l.data_competencia BETWEEN %(inicio)s AND %(fim)s
+     ORDER BY l.data_competencia, l.id, i.id
+"""
+
+
+def _parametros(conta, filial_id, empresa_id):
+    if not filial_id and not empresa_id:
+        raise ValueError("Informe a empresa ou a filial.")
+    filtro_filial = "f.id = %(filial)s" if filial_id else "f.empresa_id = %(empresa)s"
+    params = {
+        "conta": conta.id,
+        "codigo": conta.codigo,
+        "prefixo": conta.codigo + ".%",
+        "filial": filial_id,
+        "empresa": empresa_id,
+    }
+    return filtro_filial, params
+
+
+def saldo_abertura(conta, data, filial_id=None, empresa_id=None):
+    """Saldo (débito - crédito) da conta no início do dia ``data``."""
+    filtro_filial, params = _parametros(conta, filial_id, empresa_id)
+    if not empresa_id:
+        empresa_id = Filial.objects.values_list("empresa_id", flat=True).get(pk=filial_id)
+    # como em ``saldo.periodo_da_data``: o período da empresa ou, sem ele, um global
+    periodo = (
+        Periodo.objects.filter(data_inicio__lte=data, data_fim__gte=data)
+        .filter(Q(empresa_id=empresa_id) | Q(empresa__isnull=True))
+        .order_by(F("empresa").asc(nulls_last=True), "data_inicio")
+        .first()
+    )
+    t = _tabelas()
+    filtro = _FILTRO_ITENS.format(filtro_filial=filtro_filial)
+    params.update(inicio=data, desde=periodo.data_inicio if periodo else None)
+    saldo = Decimal("0")
+    with connection.cursor() as cursor:
+        if periodo:
+            params["periodo"] = periodo.id
+            cursor.execute(_SQL_SALDO_INICIAL.format(filtro_filial=filtro_filial, **t), params)
+            saldo += cursor.fetchone()[0]
+        # Sem período fechando a data, o saldo é todo o movimento anterior.
+        if periodo is None or data > periodo.data_inicio:
+            cursor.execute(_SQL_MOVIMENTO_ANTERIOR.format(filtro=filtro, **t), params)
+            saldo += cursor.fetchone()[0]
+    return saldo
+
+
+def razao(conta, data_inicio, data_fim, filial_id=None, empresa_id=None, tamanho_lote=TAMANHO_LOTE):
+    """Gera as linhas do razão (dicts com ``COLUNAS``) em ordem de competência.
+
+    A primeira linha é a de saldo anterior (sem lançamento). A leitura usa um
+    cursor no servidor e busca ``tamanho_lote`` linhas por vez.
+    """
+    if data_fim < data_inicio:
+        raise ValueError("A data final é anterior à inicial.")
+    abertura = saldo_abertura(conta, data_inicio, filial_id, empresa_id)
+    filtro_filial, params = _parametros(conta, filial_id, empresa_id)
+    params.update(inicio=data_inicio, fim=data_fim, abertura=abertura)
+    sql = _SQL_RAZAO.format(filtro=_FILTRO_ITENS.format(filtro_filial=filtro_filial), **_tabelas())
+
+    yield dict.fromkeys(COLUNAS, None) | {
+        "data": data_inicio - timedelta(days=1),
+        "descricao": "Saldo anterior",
+        "saldo": abertura,
+    }
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                break
+            for linha in lote:
+                yield dict(zip(COLUNAS, linha))
@@ -0,0 +1,297 @@
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from ..models import Filial, Periodo, TarefaRecalculoSaldo
+from .saldo import (
+    materializar_sinteticas,
+    propagar_saldos_iniciais,
+    recalcular_periodo,
+    recalcular_rateios_cc_projeto,
+    recalcular_saldos_por_periodo,
+)
+
+
+def periodos_da_empresa(empresa_id, inicio=None, fim=None, somente_abertos=False):
+    """Períodos da empresa (e os globais, sem empresa) ordenados por ``data_inicio``.
+
+    ``inicio``/``fim`` são códigos de período (limites inclusivos); com o
+    mesmo código na empresa e global, vale o da empresa. ``somente_abertos``
+    restringe a períodos com status "A".
+    """
+    da_empresa = Q(empresa_id=empresa_id) | Q(empresa__isnull=True)
+    qs = Periodo.objects.filter(da_empresa).order_by("data_inicio")
+
+    def limite(codigo):
+        data = (
+            Periodo.objects.filter(da_empresa, codigo=codigo)
+            .order_by(F("empresa").asc(nulls_last=True))
+            .values_list("data_inicio", flat=True)
+            .first()
+        )
+        if data is None:
+            raise Periodo.DoesNotExist(f"Período {codigo} não encontrado.")
+        return data
+
+    if inicio:
+        qs = qs.filter(data_inicio__gte=limite(inicio))
+    if fim:
+        qs = qs.filter(data_inicio__lte=limite(fim))
+    if somente_abertos:
+        qs = qs.filter(status="A")
+    return list(qs)
+
+
+def unidades_de_trabalho(empresa_id, periodos, filiais=None):
+    """Pares (filial_id, periodo_id) a recalcular para a empresa."""
+    qs = Filial.objects.filter(empresa_id=empresa_id, status=True).order_by("codigo")
+    if filiais:
+        qs = qs.filter(id__in=filiais)
+    filial_ids = list(qs.values_list("id", flat=True))
+    return [(filial_id, periodo.id) for periodo in periodos for filial_id in filial_ids]
+
+
+def recalcular_unidade(filial_id, periodo_id):
+    """Recalcula contas e rateios de uma filial/período, isolado dos demais.
+
+    Roda dentro dos processos do pool: nunca levanta exceção, devolve o erro
+    no resultado para que uma unidade com falha não derrube as outras.
+    """
+    inicio = time.monotonic()
+    resultado = {"filial_id": filial_id, "periodo_id": periodo_id, "erro": None}
+    try:
+        with transaction.atomic():
+            resultado["conta"] = recalcular_saldos_por_periodo(filial_id, periodo_id)
+            resultado.update(recalcular_rateios_cc_projeto(filial_id, periodo_id))
+    except Exception:
+        resultado["erro"] = traceback.format_exc()
+    resultado["duracao"] = time.monotonic() - inicio
+    return resultado
+
+
+def _iniciar_processo():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def recalcular_em_paralelo(empresa_id, periodos, filiais=None, processos=None, progresso=None):
+    """Recalcula todas as filiais x períodos da empresa num pool de processos.
+
+    Cada par (filial, período) grava linhas próprias, então as unidades rodam
+    em paralelo, cada processo com a sua conexão. Depois que todas terminam,
+    o saldo inicial é encadeado e as sintéticas materializadas, uma vez por
+    cadeia de períodos (da empresa ou globais), a partir do primeiro período
+    recalculado com sucesso.
+
+    ``processos=1`` roda tudo no processo atual (sem pool). Se um processo do
+    pool morrer, as unidades que ele levou são refeitas em série no processo
+    atual (marcadas com ``reexecutada``). ``progresso`` é chamado com
+    (concluidas, total, resultado) a cada unidade. Retorna
+    ``{"unidades": [...], "encadeamento": {...}}``.
+    """
+    unidades = unidades_de_trabalho(empresa_id, periodos, filiais)
+    total = len(unidades)
+    resultados = []
+
+    def registrar(resultado):
+        resultados.append(resultado)
+        if progresso:
+            progresso(len(resultados), total, resultado)
+
+    if processos == 1 or total <= 1:
+        for filial_id, periodo_id in unidades:
+            registrar(recalcular_unidade(filial_id, periodo_id))
+    else:
+        # Conexões abertas não podem ser herdadas pelos processos filhos.
+        connections.close_all()
+        perdidas = []
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as pool:
+            futuros = {pool.submit(recalcular_unidade, *unidade): unidade for unidade in unidades}
+            for futuro in as_completed(futuros):
+                try:
+                    registrar(futuro.result())
+                except Exception:
+                    # o processo morreu (BrokenProcessPool) e levou a unidade junto
+                    perdidas.append(futuros[futuro])
+        # As unidades perdidas rodam de novo aqui, uma a uma; se falharem
+        # outra vez, o erro fica no resultado como o de qualquer unidade.
+        for filial_id, periodo_id in sorted(perdidas, key=unidades.index):
+            resultado = recalcular_unidade(filial_id, periodo_id)
+            resultado["reexecutada"] = True
+            registrar(resultado)
+
+    encadeamento = {"duracao": 0.0, "erro": None}
+    ok = {r["periodo_id"] for r in resultados if not r["erro"]}
+    # a cadeia de saldos é a dos períodos da empresa ou a dos globais
+    primeiros = {}
+    for periodo in periodos:
+        if periodo.id in ok:
+            primeiros.setdefault(periodo.empresa_id, periodo)
+    if primeiros:
+        inicio = time.monotonic()
+        try:
+            with transaction.atomic():
+                for cadeia, primeiro in primeiros.items():
+                    propagar_saldos_iniciais(cadeia, a_partir_de=primeiro.id)
+                    periodo_ids = list(
+                        Periodo.objects.filter(
+                            empresa_id=cadeia, data_inicio__gte=primeiro.data_inicio
+                        ).values_list("id", flat=True)
+                    )
+                    materializar_sinteticas(periodo_ids)
+        except Exception:
+            encadeamento["erro"] = traceback.format_exc()
+        encadeamento["duracao"] = time.monotonic() - inicio
+    return {"unidades": resultados, "encadeamento": encadeamento}
+
+
+# ---------------------------------------------------------------------------
+# Fila de recálculo (tabela TarefaRecalculoSaldo, consumida por
+# ``manage.py processar_recalculos``)
+# ---------------------------------------------------------------------------
+
+
+# Cada volta perde a corrida para um worker que assumiu a pendente entre o
+# INSERT e o UPDATE; mais que isso é sinal de outro problema.
+TENTATIVAS_ENFILEIRAR = 5
+
+
+def _restricao_violada(exc):
+    diag = getattr(exc.__cause__, "diag", None)
+    return getattr(diag, "constraint_name", None)
+
+
+def enfileirar_recalculo(filial_id, periodo_id, usuario=None):
+    """Registra um pedido de recálculo e devolve ``(tarefa, criada)``.
+
+    Se já existe tarefa pendente para a mesma filial/período o pedido é
+    mesclado nela (só ``solicitacoes`` é incrementado): o recálculo é
+    idempotente, basta rodá-lo uma vez depois do último pedido. Violações de
+    outras restrições (ex.: período nulo) são levantadas sem nova tentativa.
+    """
+    for _ in range(TENTATIVAS_ENFILEIRAR):
+        try:
+            with transaction.atomic():
+                tarefa = TarefaRecalculoSaldo.objects.create(
+                    filial_id=filial_id, periodo_id=periodo_id, usuario=usuario
+                )
+            return tarefa, True
+        except IntegrityError as exc:
+            if _restricao_violada(exc) != "uniq_recalculo_pendente":
+                raise
+            erro = exc
+            pendentes = TarefaRecalculoSaldo.objects.filter(
+                filial_id=filial_id, periodo_id=periodo_id, status="P"
+            )
+            if pendentes.update(solicitacoes=F("solicitacoes") + 1):
+                return pendentes.get(), False
+            # a pendente foi assumida por um worker entre o INSERT e o UPDATE
+    raise erro
+
+
+def liberar_tarefas_abandonadas():
+    """Dá como falhas as tarefas "Em execução" cujo worker morreu e as enfileira de novo.
+
+    O worker mantém a linha da tarefa travada enquanto recalcula (ver
+    ``executar_tarefa``); se ele cai, a conexão fecha e a trava some. Uma
+    tarefa "E" sem trava, reservada há mais de
+    ``CONTABILL_RECALCULO_CARENCIA`` segundos (tempo entre reservar e travar),
+    está abandonada e deixaria o par filial/período bloqueado para sempre.
+    Retorna as tarefas liberadas.
+    """
+    carencia = getattr(settings, "CONTABILL_RECALCULO_CARENCIA", 60)
+    agora = timezone.now()
+    with transaction.atomic():
+        abandonadas = list(
+            TarefaRecalculoSaldo.objects.select_for_update(skip_locked=True).filter(
+                status="E", iniciado_em__lt=agora - timedelta(seconds=carencia)
+            )
+        )
+        for tarefa in abandonadas:
+            tarefa.status = "F"
+            tarefa.erro = "Execução abandonada: o worker parou sem concluir a tarefa."
+            tarefa.concluido_em = agora
+            tarefa.save(update_fields=["status", "erro", "concluido_em", "updated_at"])
+    for tarefa in abandonadas:
+        enfileirar_recalculo(tarefa.filial_id, tarefa.periodo_id, usuario=tarefa.usuario)
+    return abandonadas
+
+
+def reservar_proxima_tarefa():
+    """Assume a tarefa pendente mais antiga, marcando-a "Em execução".
+
+    ``SKIP LOCKED`` deixa vários workers consumirem a fila sem disputar a
+    mesma linha; pares filial/período que já estão em execução ficam para
+    depois, para não recalcular o mesmo período em paralelo. Antes, tarefas
+    abandonadas por workers que morreram voltam para a fila.
+    """
+    liberar_tarefas_abandonadas()
+    em_execucao = TarefaRecalculoSaldo.objects.filter(
+        filial_id=OuterRef("filial_id"), periodo_id=OuterRef("periodo_id"), status="E"
+    )
+    with transaction.atomic():
+        tarefa = (
+            TarefaRecalculoSaldo.objects.select_for_update(skip_locked=True)
+            .filter(status="P")
+            .exclude(Exists(em_execucao))
+            .order_by("created_at", "id")
+            .first()
+        )
+        if tarefa is None:
+            return None
+        tarefa.status = "E"
+        tarefa.iniciado_em = timezone.now()
+        tarefa.save(update_fields=["status", "iniciado_em", "updated_at"])
+    return tarefa
+
+
+def executar_tarefa(tarefa):
+    """Roda o recálculo da tarefa e grava status, duração e resultado."""
+    inicio = time.monotonic()
+    try:
+        with transaction.atomic():
+            # a trava na linha mostra que a tarefa está viva (ver liberar_tarefas_abandonadas)
+            status = (
+                TarefaRecalculoSaldo.objects.select_for_update()
+                .values_list("status", flat=True)
+                .get(pk=tarefa.pk)
+            )
+            if status != "E":
+                # dada como abandonada antes de começar; outra tarefa a substituiu
+                tarefa.refresh_from_db()
+                return tarefa
+            tarefa.resultado = recalcular_periodo(tarefa.filial_id, tarefa.periodo_id)
+        tarefa.status = "C"
+        tarefa.erro = ""
+    except Exception:
+        tarefa.status = "F"
+        tarefa.erro = traceback.format_exc()
+    tarefa.duracao = time.monotonic() - inicio
+    tarefa.concluido_em = timezone.now()
+    tarefa.save(
+        update_fields=["status", "resultado", "erro", "duracao", "concluido_em", "updated_at"]
+    )
+    return tarefa
+
+
+def processar_fila(limite=None):
+    """Consome a fila até esvaziá-la (ou até ``limite`` tarefas).
+
+    Retorna a lista de tarefas processadas.
+    """
+    processadas = []
+    while limite is None or len(processadas) < limite:
+        tarefa = reservar_proxima_tarefa()
+        if tarefa is None:
+            break
+        processadas.append(executar_tarefa(tarefa))
+    return processadas
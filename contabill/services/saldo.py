@@ -1,8 +1,15 @@
+from contextlib import contextmanager
 from decimal import Decimal
 
-from django.db.models import Sum, Case, When
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DateField, F, Min, Q, Sum, Value, When
+from django.db.models.functions import Least
 
 from ..models import (
+    ContaContabil,
+    Filial,
+    LancamentoContabil,
     LancamentoItem,
     RateioLancamentoItemCentroCusto,
     RateioLancamentoItemProjeto,
@@ -17,96 +24,861 @@ def _faixa_periodo(periodo):
     return periodo.data_inicio, periodo.data_fim
 
 
+def _tabelas():
+    return {
+        "conta": ContaContabil._meta.db_table,
+        "lanc": LancamentoContabil._meta.db_table,
+        "item": LancamentoItem._meta.db_table,
+        "rateio_cc": RateioLancamentoItemCentroCusto._meta.db_table,
+        "rateio_proj": RateioLancamentoItemProjeto._meta.db_table,
+        "saldo": SaldoContaPeriodo._meta.db_table,
+        "saldo_cc": SaldoCentroCustoPeriodo._meta.db_table,
+        "saldo_proj": SaldoProjetoPeriodo._meta.db_table,
+    }
+
+
+def incrementar_versao_saldos(filial_ids=(), empresa_ids=(), desde=None):
+    """Marca os saldos das filiais (ou das empresas) como alterados.
+
+    Invalida os relatórios em cache que usam ``Filial.versao_saldos`` na
+    chave. Empresa ``None`` (períodos globais) vale para todas as filiais.
+    ``desde`` é o ``data_inicio`` do primeiro período alterado (``None``:
+    todos); vai para ``Filial.consolidar_desde``, que limita a consolidação.
+    O ``UPDATE`` em ``Filial`` só roda depois do commit: dentro da transação
+    ele travaria a linha da filial até o fim, enfileirando atrás dela as
+    demais gravações de saldo da mesma filial. Fora de transação roda na hora.
+    """
+    pendentes = _pendentes()
+    for chave, ids in (("filiais", filial_ids), ("empresas", empresa_ids)):
+        for id_ in ids:
+            pendentes[chave][id_] = _data_mais_antiga(pendentes[chave].get(id_, desde), desde)
+    transaction.on_commit(_concluir_pendentes)
+
+
+def _data_mais_antiga(a, b):
+    # ``None`` (todos os períodos) prevalece
+    return None if a is None or b is None else min(a, b)
+
+
+def _gravar_versoes(filiais, empresas):
+    """Incrementa ``versao_saldos`` e recua ``consolidar_desde`` das filiais.
+
+    ``filiais`` e ``empresas`` mapeiam id -> ``desde``; um ``UPDATE`` por data.
+    """
+    por_data = {}
+    for chave, ids in (("filiais", filiais), ("empresas", empresas)):
+        for id_, desde in ids.items():
+            por_data.setdefault(desde, {"filiais": set(), "empresas": set()})[chave].add(id_)
+    for desde, alvo in por_data.items():
+        if None in alvo["empresas"]:
+            filtro = Q()
+        else:
+            filtro = Q(pk__in=alvo["filiais"]) | Q(empresa_id__in=alvo["empresas"])
+        if desde is None:
+            consolidar_desde = Value(None, output_field=DateField())
+        else:
+            # já consolidada: começa na data; pendente de tudo (nulo) continua
+            # assim; pendente desde outra data: fica a mais antiga
+            consolidar_desde = Case(
+                When(versao_consolidada=F("versao_saldos"), then=Value(desde)),
+                When(consolidar_desde__isnull=True, then=Value(None, output_field=DateField())),
+                default=Least("consolidar_desde", Value(desde)),
+                output_field=DateField(),
+            )
+        Filial.objects.filter(filtro).update(
+            versao_saldos=F("versao_saldos") + 1, consolidar_desde=consolidar_desde
+        )
+
+
+def _pendentes():
+    """Trabalho de saldo acumulado pela transação corrente, feito uma vez no commit.
+
+    Quem acumula registra ``_concluir_pendentes`` com ``on_commit``; o primeiro
+    a rodar esvazia o acumulado e os demais não têm o que fazer. O que sobrar
+    de uma transação desfeita só repete, no próximo commit, trabalho idempotente.
+    """
+    pendentes = getattr(connection, "contabill_saldos_pendentes", None)
+    if pendentes is None:
+        pendentes = {"filiais": {}, "empresas": {}, "rolagem": {}}
+        connection.contabill_saldos_pendentes = pendentes
+    return pendentes
+
+
+def _concluir_pendentes():
+    pendentes = getattr(connection, "contabill_saldos_pendentes", None)
+    if pendentes is None:
+        return
+    del connection.contabill_saldos_pendentes
+    if pendentes["rolagem"]:
+        _rolar(pendentes["rolagem"])
+    _gravar_versoes(pendentes["filiais"], pendentes["empresas"])
+
+
+def _contar_upsert(cursor, sql, params):
+    """Executa um INSERT ... ON CONFLICT ... RETURNING (xmax = 0) e conta o resultado.
+
+    Retorna (inseridos, atualizados).
+    """
+    cursor.execute(
+        f"WITH up AS ({sql}) "
+        "SELECT COUNT(*) FILTER (WHERE inserido), COUNT(*) FILTER (WHERE NOT inserido) FROM up",
+        params,
+    )
+    inseridos, atualizados = cursor.fetchone()
+    return inseridos, atualizados
+
+
+# Movimento (débito/crédito) por conta dos itens ativos da filial no intervalo.
+_SQL_MOVIMENTO_CONTA = """
+    SELECT i.conta_contabil_id,
+           COALESCE(SUM(CASE WHEN i.tipo_dc = 'D' THEN i.valor END), 0) AS debito,
+           COALESCE(SUM(CASE WHEN i.tipo_dc = 'C' THEN i.valor END), 0) AS credito
+      FROM {item} i
+      JOIN {lanc} l ON l.id = i.lancamento_id
+     WHERE l.filial_id = %(filial)s
+       AND l.data_competencia BETWEEN %(inicio)s AND %(fim)s
+       AND l.status AND i.status
+     GROUP BY i.conta_contabil_id
+"""
+
+
 def recalcular_saldos_por_periodo(filial_id, periodo_id):
+    """Recalcula os saldos por conta da filial/período com um único upsert.
+
+    Agrega débitos e créditos no banco e grava todas as linhas de
+    ``SaldoContaPeriodo`` com ``INSERT ... ON CONFLICT`` em
+    ``uniq_saldo_conta_periodo``. Contas que deixaram de ter movimento são
+    zeradas na mesma transação. Retorna (inseridos, atualizados).
+    """
     periodo = Periodo.objects.get(id=periodo_id)
     inicio, fim = _faixa_periodo(periodo)
-    itens = LancamentoItem.objects.filter(
-        lancamento__filial_id=filial_id,
-        lancamento__data_competencia__range=(inicio, fim),
-        lancamento__status=True,
-        status=True,
+    t = _tabelas()
+    params = {"filial": filial_id, "periodo": periodo_id, "inicio": inicio, "fim": fim}
+    movimento = _SQL_MOVIMENTO_CONTA.format(**t)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {t['saldo']} s
+               SET debito = 0, credito = 0, saldo_final = s.saldo_inicial
+             WHERE s.filial_id = %(filial)s
+               AND s.periodo_id = %(periodo)s
+               AND (s.debito <> 0 OR s.credito <> 0)
+               AND s.conta_contabil_id IN (SELECT id FROM {t['conta']} WHERE tipo = 'A')
+               AND NOT EXISTS (
+                   SELECT 1 FROM ({movimento}) m
+                    WHERE m.conta_contabil_id = s.conta_contabil_id
+               )
+            """,
+            params,
+        )
+        zerados = cursor.rowcount
+        inseridos, atualizados = _contar_upsert(
+            cursor,
+            f"""
+            INSERT INTO {t['saldo']} AS s
+                   (conta_contabil_id, filial_id, periodo_id,
+                    saldo_inicial, debito, credito, saldo_final)
+            SELECT m.conta_contabil_id, %(filial)s, %(periodo)s,
+                   0, m.debito, m.credito, m.debito - m.credito
+              FROM ({movimento}) m
+            ON CONFLICT ON CONSTRAINT uniq_saldo_conta_periodo DO UPDATE
+               SET debito = EXCLUDED.debito,
+                   credito = EXCLUDED.credito,
+                   saldo_final = s.saldo_inicial + EXCLUDED.debito - EXCLUDED.credito
+            RETURNING (xmax = 0) AS inserido
+            """,
+            params,
+        )
+        incrementar_versao_saldos(filial_ids=[filial_id], desde=inicio)
+    return inseridos, atualizados + zerados
+
+
+# Movimento por conta e dimensão (centro de custo ou projeto) dos rateios.
+_SQL_MOVIMENTO_RATEIO = """
+    SELECT i.conta_contabil_id,
+           r.{dimensao},
+           COALESCE(SUM(CASE WHEN i.tipo_dc = 'D' THEN r.valor END), 0) AS debito,
+           COALESCE(SUM(CASE WHEN i.tipo_dc = 'C' THEN r.valor END), 0) AS credito
+      FROM {rateio} r
+      JOIN {item} i ON i.id = r.lancamento_item_id
+      JOIN {lanc} l ON l.id = i.lancamento_id
+     WHERE l.filial_id = %(filial)s
+       AND l.data_competencia BETWEEN %(inicio)s AND %(fim)s
+       AND l.status AND i.status
+     GROUP BY i.conta_contabil_id, r.{dimensao}
+"""
+
+
+def _upsert_rateio(cursor, t, params, rateio, tabela, dimensao, constraint):
+    movimento = _SQL_MOVIMENTO_RATEIO.format(rateio=rateio, dimensao=dimensao, **t)
+
+    # Garante a linha de conta (pai) para toda conta com rateio.
+    cursor.execute(
+        f"""
+        INSERT INTO {t['saldo']}
+               (conta_contabil_id, filial_id, periodo_id,
+                saldo_inicial, debito, credito, saldo_final)
+        SELECT DISTINCT m.conta_contabil_id, %(filial)s, %(periodo)s, 0, 0, 0, 0
+          FROM ({movimento}) m
+        ON CONFLICT ON CONSTRAINT uniq_saldo_conta_periodo DO NOTHING
+        """,
+        params,
     )
-    movimentos = itens.values("conta_contabil_id").annotate(
-        debito=Sum(Case(When(tipo_dc="D", then="valor"), default=Decimal("0.00"))),
-        credito=Sum(Case(When(tipo_dc="C", then="valor"), default=Decimal("0.00"))),
+    cursor.execute(
+        f"""
+        UPDATE {tabela} d
+           SET debito = 0, credito = 0, saldo_final = d.saldo_inicial
+          FROM {t['saldo']} s
+         WHERE s.id = d.saldo_conta_periodo_id
+           AND s.filial_id = %(filial)s
+           AND d.periodo_id = %(periodo)s
+           AND (d.debito <> 0 OR d.credito <> 0)
+           AND NOT EXISTS (
+               SELECT 1 FROM ({movimento}) m
+                WHERE m.conta_contabil_id = s.conta_contabil_id
+                  AND m.{dimensao} = d.{dimensao}
+           )
+        """,
+        params,
     )
-    for mov in movimentos:
-        saldo, _ = SaldoContaPeriodo.objects.get_or_create(
-            conta_contabil_id=mov["conta_contabil_id"],
-            filial_id=filial_id,
-            periodo_id=periodo_id,
-            defaults={"saldo_inicial": Decimal("0.00")},
-        )
-        saldo.debito = mov["debito"] or Decimal("0.00")
-        saldo.credito = mov["credito"] or Decimal("0.00")
-        saldo.saldo_final = saldo.saldo_inicial + saldo.debito - saldo.credito
-        saldo.save()
+    zerados = cursor.rowcount
+    inseridos, atualizados = _contar_upsert(
+        cursor,
+        f"""
+        INSERT INTO {tabela} AS d
+               (saldo_conta_periodo_id, {dimensao}, periodo_id,
+                saldo_inicial, debito, credito, saldo_final)
+        SELECT s.id, m.{dimensao}, %(periodo)s,
+               0, m.debito, m.credito, m.debito - m.credito
+          FROM ({movimento}) m
+          JOIN {t['saldo']} s
+            ON s.conta_contabil_id = m.conta_contabil_id
+           AND s.filial_id = %(filial)s
+           AND s.periodo_id = %(periodo)s
+        ON CONFLICT ON CONSTRAINT {constraint} DO UPDATE
+           SET debito = EXCLUDED.debito,
+               credito = EXCLUDED.credito,
+               saldo_final = d.saldo_inicial + EXCLUDED.debito - EXCLUDED.credito
+        RETURNING (xmax = 0) AS inserido
+        """,
+        params,
+    )
+    return inseridos, atualizados + zerados
 
 
 def recalcular_rateios_cc_projeto(filial_id, periodo_id):
+    """Recalcula os saldos por centro de custo e por projeto da filial/período.
+
+    Mesma estratégia de ``recalcular_saldos_por_periodo``: um upsert por
+    tabela, numa única transação. Retorna um dict com (inseridos, atualizados)
+    para as chaves ``"cc"`` e ``"projeto"``.
+    """
     periodo = Periodo.objects.get(id=periodo_id)
     inicio, fim = _faixa_periodo(periodo)
-    itens = LancamentoItem.objects.filter(
-        lancamento__filial_id=filial_id,
-        lancamento__data_competencia__range=(inicio, fim),
-        lancamento__status=True,
-        status=True,
-    )
-    itens_ids = list(itens.values_list("id", flat=True))
-
-    # Centro de Custo
-    cc_agreg = (
-        RateioLancamentoItemCentroCusto.objects.filter(lancamento_item_id__in=itens_ids)
-        .values("lancamento_item__conta_contabil_id", "centro_custo_id")
-        .annotate(
-            debito=Sum(Case(When(lancamento_item__tipo_dc="D", then="valor"), default=Decimal("0.00"))),
-            credito=Sum(Case(When(lancamento_item__tipo_dc="C", then="valor"), default=Decimal("0.00"))),
+    t = _tabelas()
+    params = {"filial": filial_id, "periodo": periodo_id, "inicio": inicio, "fim": fim}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cc = _upsert_rateio(
+            cursor, t, params,
+            rateio=t["rateio_cc"],
+            tabela=t["saldo_cc"],
+            dimensao="centro_custo_id",
+            constraint="uniq_saldo_cc_periodo",
+        )
+        projeto = _upsert_rateio(
+            cursor, t, params,
+            rateio=t["rateio_proj"],
+            tabela=t["saldo_proj"],
+            dimensao="projeto_id",
+            constraint="uniq_saldo_projeto_periodo",
+        )
+        incrementar_versao_saldos(filial_ids=[filial_id], desde=inicio)
+    return {"cc": cc, "projeto": projeto}
+
+
+# ---------------------------------------------------------------------------
+# Manutenção incremental (delta) dos saldos
+# ---------------------------------------------------------------------------
+
+def saldos_incrementais_ativos():
+    return getattr(settings, "CONTABILL_SALDOS_INCREMENTAIS", True)
+
+
+def _somar(valores, chave, debito, credito):
+    atual = valores.get(chave)
+    if atual is None:
+        valores[chave] = [debito, credito]
+    else:
+        atual[0] += debito
+        atual[1] += credito
+
+
+def _contribuicoes(filtro_itens):
+    """Movimento que os itens selecionados representam hoje nos saldos.
+
+    Retorna três dicts (conta, cc, projeto) com chave
+    ``(filial_id, data_competencia, conta_id[, dimensao_id])`` e valor
+    ``[debito, credito]``. Só entram itens e lançamentos ativos.
+    """
+    debito = Sum(Case(When(tipo_dc="D", then="valor"), default=Decimal("0.00")))
+    credito = Sum(Case(When(tipo_dc="C", then="valor"), default=Decimal("0.00")))
+    itens = LancamentoItem.objects.filter(filtro_itens, status=True, lancamento__status=True)
+
+    conta = {}
+    for mov in itens.values(
+        "lancamento__filial_id", "lancamento__data_competencia", "conta_contabil_id"
+    ).annotate(debito=debito, credito=credito).order_by():
+        chave = (
+            mov["lancamento__filial_id"],
+            mov["lancamento__data_competencia"],
+            mov["conta_contabil_id"],
         )
+        _somar(conta, chave, mov["debito"], mov["credito"])
+
+    dimensoes = []
+    for modelo, campo in (
+        (RateioLancamentoItemCentroCusto, "centro_custo_id"),
+        (RateioLancamentoItemProjeto, "projeto_id"),
+    ):
+        valores = {}
+        agreg = (
+            modelo.objects.filter(lancamento_item__in=itens)
+            .values(
+                "lancamento_item__lancamento__filial_id",
+                "lancamento_item__lancamento__data_competencia",
+                "lancamento_item__conta_contabil_id",
+                campo,
+            )
+            .annotate(
+                debito=Sum(Case(When(lancamento_item__tipo_dc="D", then="valor"), default=Decimal("0.00"))),
+                credito=Sum(Case(When(lancamento_item__tipo_dc="C", then="valor"), default=Decimal("0.00"))),
+            )
+            .order_by()
+        )
+        for mov in agreg:
+            chave = (
+                mov["lancamento_item__lancamento__filial_id"],
+                mov["lancamento_item__lancamento__data_competencia"],
+                mov["lancamento_item__conta_contabil_id"],
+                mov[campo],
+            )
+            _somar(valores, chave, mov["debito"], mov["credito"])
+        dimensoes.append(valores)
+
+    return conta, dimensoes[0], dimensoes[1]
+
+
+def _diferenca(antes, depois):
+    delta = {}
+    for chave in set(antes) | set(depois):
+        d_antes, c_antes = antes.get(chave, (Decimal("0.00"), Decimal("0.00")))
+        d_depois, c_depois = depois.get(chave, (Decimal("0.00"), Decimal("0.00")))
+        debito, credito = d_depois - d_antes, c_depois - c_antes
+        if debito or credito:
+            delta[chave] = (debito, credito)
+    return delta
+
+
+def periodo_da_data(filial_id, data):
+    """Período que contém a data para a empresa da filial (ou um período global)."""
+    return (
+        Periodo.objects.filter(data_inicio__lte=data, data_fim__gte=data)
+        .filter(Q(empresa__filiais__id=filial_id) | Q(empresa__isnull=True))
+        .order_by(F("empresa").asc(nulls_last=True), "data_inicio")
+        .values_list("id", flat=True)
+        .first()
     )
-    for mov in cc_agreg:
-        saldo_conta, _ = SaldoContaPeriodo.objects.get_or_create(
-            conta_contabil_id=mov["lancamento_item__conta_contabil_id"],
-            filial_id=filial_id,
-            periodo_id=periodo_id,
-            defaults={"saldo_inicial": Decimal("0.00")},
+
+
+def _valores_sql(linhas):
+    marcadores = ", ".join(["(" + ", ".join(["%s"] * len(linhas[0])) + ")"] * len(linhas))
+    params = [valor for linha in linhas for valor in linha]
+    return marcadores, params
+
+
+def _aplicar_delta(delta_conta, delta_cc, delta_proj):
+    periodos = {}
+
+    def periodo(filial_id, data):
+        if (filial_id, data) not in periodos:
+            periodos[(filial_id, data)] = periodo_da_data(filial_id, data)
+        return periodos[(filial_id, data)]
+
+    contas = {}
+    for (filial_id, data, conta_id), (debito, credito) in delta_conta.items():
+        periodo_id = periodo(filial_id, data)
+        if periodo_id:
+            _somar(contas, (conta_id, filial_id, periodo_id), debito, credito)
+    dimensoes = []
+    for delta in (delta_cc, delta_proj):
+        valores = {}
+        for (filial_id, data, conta_id, dim_id), (debito, credito) in delta.items():
+            periodo_id = periodo(filial_id, data)
+            if periodo_id:
+                _somar(valores, (conta_id, filial_id, periodo_id, dim_id), debito, credito)
+                # a linha da conta precisa existir para receber o rateio
+                _somar(contas, (conta_id, filial_id, periodo_id), Decimal("0.00"), Decimal("0.00"))
+        dimensoes.append(valores)
+
+    if not contas:
+        return
+    t = _tabelas()
+    with connection.cursor() as cursor:
+        linhas = [chave + tuple(valor) for chave, valor in contas.items()]
+        marcadores, params = _valores_sql(linhas)
+        cursor.execute(
+            f"""
+            INSERT INTO {t['saldo']} AS s
+                   (conta_contabil_id, filial_id, periodo_id,
+                    saldo_inicial, debito, credito, saldo_final)
+            SELECT v.conta, v.filial, v.periodo, 0, v.debito, v.credito, v.debito - v.credito
+              FROM (VALUES {marcadores}) AS v(conta, filial, periodo, debito, credito)
+            ON CONFLICT ON CONSTRAINT uniq_saldo_conta_periodo DO UPDATE
+               SET debito = s.debito + EXCLUDED.debito,
+                   credito = s.credito + EXCLUDED.credito,
+                   saldo_final = s.saldo_final + EXCLUDED.debito - EXCLUDED.credito
+            """,
+            params,
         )
-        saldo_cc, _ = SaldoCentroCustoPeriodo.objects.get_or_create(
-            saldo_conta_periodo=saldo_conta,
-            centro_custo_id=mov["centro_custo_id"],
-            periodo_id=periodo_id,
-            defaults={}
+        for valores, tabela, dimensao, constraint in (
+            (dimensoes[0], t["saldo_cc"], "centro_custo_id", "uniq_saldo_cc_periodo"),
+            (dimensoes[1], t["saldo_proj"], "projeto_id", "uniq_saldo_projeto_periodo"),
+        ):
+            if not valores:
+                continue
+            linhas = [chave + tuple(valor) for chave, valor in valores.items()]
+            marcadores, params = _valores_sql(linhas)
+            cursor.execute(
+                f"""
+                INSERT INTO {tabela} AS d
+                       (saldo_conta_periodo_id, {dimensao}, periodo_id,
+                        saldo_inicial, debito, credito, saldo_final)
+                SELECT s.id, v.dim, v.periodo, 0, v.debito, v.credito, v.debito - v.credito
+                  FROM (VALUES {marcadores}) AS v(conta, filial, periodo, dim, debito, credito)
+                  JOIN {t['saldo']} s
+                    ON s.conta_contabil_id = v.conta
+                   AND s.filial_id = v.filial
+                   AND s.periodo_id = v.periodo
+                ON CONFLICT ON CONSTRAINT {constraint} DO UPDATE
+                   SET debito = d.debito + EXCLUDED.debito,
+                       credito = d.credito + EXCLUDED.credito,
+                       saldo_final = d.saldo_final + EXCLUDED.debito - EXCLUDED.credito
+                """,
+                params,
+            )
+
+        conta_ids = {conta_id for conta_id, _, _ in contas}
+        filial_ids = {filial_id for _, filial_id, _ in contas}
+        periodos = list(
+            Periodo.objects.filter(id__in={periodo_id for _, _, periodo_id in contas})
+            .values_list("id", "empresa_id", "data_inicio")
         )
-        saldo_cc.debito = mov["debito"] or Decimal("0.00")
-        saldo_cc.credito = mov["credito"] or Decimal("0.00")
-        saldo_cc.saldo_final = saldo_cc.saldo_inicial + saldo_cc.debito - saldo_cc.credito
-        saldo_cc.save()
-
-    # Projeto
-    proj_agreg = (
-        RateioLancamentoItemProjeto.objects.filter(lancamento_item_id__in=itens_ids)
-        .values("lancamento_item__conta_contabil_id", "projeto_id")
-        .annotate(
-            debito=Sum(Case(When(lancamento_item__tipo_dc="D", then="valor"), default=Decimal("0.00"))),
-            credito=Sum(Case(When(lancamento_item__tipo_dc="C", then="valor"), default=Decimal("0.00"))),
+        _agendar_rolagem(periodos, conta_ids, filial_ids)
+    inicios = {periodo_id: inicio for periodo_id, _, inicio in periodos}
+    desde = {}
+    for _, filial_id, periodo_id in contas:
+        desde[filial_id] = min(desde.get(filial_id, inicios[periodo_id]), inicios[periodo_id])
+    for filial_id, inicio in desde.items():
+        incrementar_versao_saldos(filial_ids=[filial_id], desde=inicio)
+
+
+def _agendar_rolagem(periodos, conta_ids, filial_ids):
+    """Acumula, para o commit, o encadeamento dos períodos seguintes.
+
+    Levar a diferença adiante (saldo inicial do próprio período, nas linhas
+    novas, e dos períodos seguintes) e refazer as sintéticas ancestrais custa
+    uma rolagem por função de janela e um agregado por período; em vez de a
+    cada gravação, ficam uma vez por empresa e transação, só para as contas
+    tocadas.
+    """
+    rolagem = _pendentes()["rolagem"]
+    for periodo_id, empresa_id, inicio in periodos:
+        pendente = rolagem.setdefault(
+            empresa_id, {"inicio": inicio, "periodo": periodo_id, "contas": set(), "filiais": set()}
         )
+        if inicio < pendente["inicio"]:
+            pendente["inicio"], pendente["periodo"] = inicio, periodo_id
+        pendente["contas"].update(conta_ids)
+        pendente["filiais"].update(filial_ids)
+    transaction.on_commit(_concluir_pendentes)
+
+
+def _rolar(rolagem):
+    """Encadeia os períodos acumulados por ``_agendar_rolagem`` e refaz as sintéticas.
+
+    Roda depois do commit, numa transação própria. Se falhar, os saldos
+    gravados continuam valendo e o encadeamento vai para a fila de recálculo.
+    """
+    from .recalculo import enfileirar_recalculo
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            for empresa_id, pendente in rolagem.items():
+                _propagar(cursor, empresa_id, pendente["inicio"], pendente["contas"])
+                _materializar(
+                    cursor,
+                    _periodos_a_partir(empresa_id, pendente["inicio"]),
+                    contas=pendente["contas"],
+                )
+    except Exception:
+        for pendente in rolagem.values():
+            for filial_id in pendente["filiais"]:
+                enfileirar_recalculo(filial_id, pendente["periodo"])
+
+
+@contextmanager
+def manter_saldos(lancamento=None, item=None, itens=None):
+    """Aplica nos saldos apenas a diferença causada pela gravação do bloco.
+
+    Tira uma foto agregada do movimento do lançamento (do item ou dos ids em
+    ``itens``) antes e depois do bloco e ajusta ``SaldoContaPeriodo``,
+    ``SaldoCentroCustoPeriodo`` e ``SaldoProjetoPeriodo`` pela diferença, na
+    mesma transação da gravação. O encadeamento dos períodos seguintes e as
+    contas sintéticas ficam para o commit (``_agendar_rolagem``).
+    Com ``CONTABILL_SALDOS_INCREMENTAIS = False`` apenas executa o bloco.
+    """
+    if not saldos_incrementais_ativos():
+        yield
+        return
+    if itens is not None:
+        itens = list(itens)
+
+    def filtro():
+        if itens is not None:
+            return Q(pk__in=itens)
+        if lancamento is not None:
+            return Q(lancamento_id=lancamento.pk) if lancamento.pk else None
+        return Q(pk=item.pk) if item.pk else None
+
+    vazio = ({}, {}, {})
+    with transaction.atomic():
+        escopo = filtro()
+        antes = _contribuicoes(escopo) if escopo is not None else vazio
+        yield
+        escopo = filtro()
+        depois = _contribuicoes(escopo) if escopo is not None else vazio
+        _aplicar_delta(*(_diferenca(a, d) for a, d in zip(antes, depois)))
+
+
+def incorporar_lancamentos(lancamento_ids):
+    """Soma nos saldos o movimento de lançamentos gravados sem ``save()``.
+
+    Para cargas com ``bulk_create``, que não passam por ``manter_saldos``:
+    os lançamentos são novos, então o movimento inteiro é a diferença.
+    """
+    if not saldos_incrementais_ativos() or not lancamento_ids:
+        return
+    with transaction.atomic():
+        _aplicar_delta(*_contribuicoes(Q(lancamento_id__in=list(lancamento_ids))))
+
+
+# ---------------------------------------------------------------------------
+# Saldo inicial: encadeamento dos períodos da empresa
+# ---------------------------------------------------------------------------
+
+def _sql_rolagem(fonte, chave, filtro_contas):
+    """CTE ``calc`` com o saldo inicial de cada chave em cada período da cadeia.
+
+    A cadeia são os períodos da empresa com ``data_inicio`` >= ``%(inicio)s``;
+    o saldo de abertura vem do ``saldo_final`` do período imediatamente
+    anterior (ou, no primeiro período da empresa, do próprio saldo inicial).
+    O acumulado dos movimentos é feito por função de janela, num só passo.
+    """
+    periodo = Periodo._meta.db_table
+    colunas = ", ".join(chave)
+    colunas_g = ", ".join(f"g.{c}" for c in chave)
+    junta_k = " AND ".join(f"f.{c} = k.{c}" for c in chave)
+    junta_b = " AND ".join(f"b.{c} = g.{c}" for c in chave)
+    contas = "AND conta = ANY(%(contas)s)" if filtro_contas else ""
+    return f"""
+    WITH periodos AS (
+        SELECT id, data_inicio FROM {periodo}
+         WHERE empresa_id IS NOT DISTINCT FROM %(empresa)s
+           AND data_inicio >= %(inicio)s
+    ),
+    anterior AS (
+        SELECT id FROM {periodo}
+         WHERE empresa_id IS NOT DISTINCT FROM %(empresa)s
+           AND data_inicio < %(inicio)s
+         ORDER BY data_inicio DESC
+         LIMIT 1
+    ),
+    fonte AS ({fonte}),
+    chaves AS (
+        SELECT {colunas} FROM fonte
+         WHERE periodo_id IN (SELECT id FROM periodos) {contas}
+        UNION
+        SELECT {colunas} FROM fonte
+         WHERE periodo_id IN (SELECT id FROM anterior) AND saldo_final <> 0 {contas}
+    ),
+    grade AS (
+        SELECT k.*, p.id AS periodo_id, p.data_inicio,
+               f.saldo_inicial AS inicial_atual,
+               COALESCE(f.debito, 0) AS debito,
+               COALESCE(f.credito, 0) AS credito,
+               f.periodo_id IS NOT NULL AS existe
+          FROM chaves k
+         CROSS JOIN periodos p
+          LEFT JOIN fonte f ON {junta_k} AND f.periodo_id = p.id
+    ),
+    calc AS (
+        SELECT g.*,
+               CASE WHEN EXISTS (SELECT 1 FROM anterior) THEN COALESCE(b.saldo_final, 0)
+                    ELSE FIRST_VALUE(COALESCE(g.inicial_atual, 0)) OVER w
+               END
+               + COALESCE(SUM(g.debito - g.credito) OVER (w ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0)
+               AS novo_inicial
+          FROM grade g
+          LEFT JOIN fonte b ON b.periodo_id IN (SELECT id FROM anterior) AND {junta_b}
+        WINDOW w AS (PARTITION BY {colunas_g} ORDER BY g.data_inicio)
     )
-    for mov in proj_agreg:
-        saldo_conta, _ = SaldoContaPeriodo.objects.get_or_create(
-            conta_contabil_id=mov["lancamento_item__conta_contabil_id"],
-            filial_id=filial_id,
-            periodo_id=periodo_id,
-            defaults={"saldo_inicial": Decimal("0.00")},
+    """
+
+
+def _propagar(cursor, empresa_id, inicio, contas=None):
+    t = _tabelas()
+    params = {"empresa": empresa_id, "inicio": inicio, "contas": list(contas or [])}
+    escopo = "periodo_id IN (SELECT id FROM periodos UNION ALL SELECT id FROM anterior)"
+    fonte_conta = f"""
+        SELECT conta_contabil_id AS conta, filial_id AS filial, periodo_id,
+               saldo_inicial, debito, credito, saldo_final
+          FROM {t['saldo']}
+         WHERE {escopo}
+           AND conta_contabil_id IN (SELECT id FROM {t['conta']} WHERE tipo = 'A')
+    """
+    cte = _sql_rolagem(fonte_conta, ("conta", "filial"), contas)
+    resultado = {
+        "conta": _contar_upsert(
+            cursor,
+            f"""
+            {cte}
+            INSERT INTO {t['saldo']} AS s
+                   (conta_contabil_id, filial_id, periodo_id,
+                    saldo_inicial, debito, credito, saldo_final)
+            SELECT conta, filial, periodo_id, novo_inicial, debito, credito,
+                   novo_inicial + debito - credito
+              FROM calc
+             WHERE existe OR novo_inicial <> 0
+            ON CONFLICT ON CONSTRAINT uniq_saldo_conta_periodo DO UPDATE
+               SET saldo_inicial = EXCLUDED.saldo_inicial,
+                   saldo_final = EXCLUDED.saldo_final
+             WHERE s.saldo_inicial <> EXCLUDED.saldo_inicial
+                OR s.saldo_final <> EXCLUDED.saldo_final
+            RETURNING (xmax = 0) AS inserido
+            """,
+            params,
         )
-        saldo_proj, _ = SaldoProjetoPeriodo.objects.get_or_create(
-            saldo_conta_periodo=saldo_conta,
-            projeto_id=mov["projeto_id"],
-            periodo_id=periodo_id,
-            defaults={}
+    }
+
+    for nome, tabela, dimensao, constraint in (
+        ("cc", t["saldo_cc"], "centro_custo_id", "uniq_saldo_cc_periodo"),
+        ("projeto", t["saldo_proj"], "projeto_id", "uniq_saldo_projeto_periodo"),
+    ):
+        fonte = f"""
+            SELECT s.conta_contabil_id AS conta, s.filial_id AS filial, d.{dimensao} AS dim,
+                   d.periodo_id, d.saldo_inicial, d.debito, d.credito, d.saldo_final
+              FROM {tabela} d
+              JOIN {t['saldo']} s ON s.id = d.saldo_conta_periodo_id
+             WHERE d.{escopo}
+        """
+        cte = _sql_rolagem(fonte, ("conta", "filial", "dim"), contas)
+        cursor.execute(
+            f"""
+            {cte}
+            INSERT INTO {t['saldo']}
+                   (conta_contabil_id, filial_id, periodo_id,
+                    saldo_inicial, debito, credito, saldo_final)
+            SELECT DISTINCT conta, filial, periodo_id, 0, 0, 0, 0
+              FROM calc
+             WHERE NOT existe AND novo_inicial <> 0
+            ON CONFLICT ON CONSTRAINT uniq_saldo_conta_periodo DO NOTHING
+            """,
+            params,
+        )
+        resultado[nome] = _contar_upsert(
+            cursor,
+            f"""
+            {cte}
+            INSERT INTO {tabela} AS d
+                   (saldo_conta_periodo_id, {dimensao}, periodo_id,
+                    saldo_inicial, debito, credito, saldo_final)
+            SELECT s.id, c.dim, c.periodo_id, c.novo_inicial, c.debito, c.credito,
+                   c.novo_inicial + c.debito - c.credito
+              FROM calc c
+              JOIN {t['saldo']} s
+                ON s.conta_contabil_id = c.conta
+               AND s.filial_id = c.filial
+               AND s.periodo_id = c.periodo_id
+             WHERE c.existe OR c.novo_inicial <> 0
+            ON CONFLICT ON CONSTRAINT {constraint} DO UPDATE
+               SET saldo_inicial = EXCLUDED.saldo_inicial,
+                   saldo_final = EXCLUDED.saldo_final
+             WHERE d.saldo_inicial <> EXCLUDED.saldo_inicial
+                OR d.saldo_final <> EXCLUDED.saldo_final
+            RETURNING (xmax = 0) AS inserido
+            """,
+            params,
         )
-        saldo_proj.debito = mov["debito"] or Decimal("0.00")
-        saldo_proj.credito = mov["credito"] or Decimal("0.00")
-        saldo_proj.saldo_final = (
-            saldo_proj.saldo_inicial + saldo_proj.debito - saldo_proj.credito
+    return resultado
+
+
+def propagar_saldos_iniciais(empresa_id, a_partir_de=None, contas=None):
+    """Encadeia ``saldo_inicial`` = ``saldo_final`` do período anterior.
+
+    Os períodos da empresa são ordenados por ``data_inicio``; a partir do
+    período ``a_partir_de`` (id; ``None`` = primeiro período da empresa) todos
+    os seguintes são recalculados num único comando por tabela de saldo
+    (conta, centro de custo e projeto). Contas com saldo transportado e sem
+    movimento ganham linha no período. ``contas`` restringe a propagação a
+    esses ids de ``ContaContabil``.
+
+    Retorna um dict com (inseridos, atualizados) para ``"conta"``, ``"cc"`` e
+    ``"projeto"``.
+    """
+    if a_partir_de is not None:
+        inicio = Periodo.objects.values_list("data_inicio", flat=True).get(id=a_partir_de)
+    else:
+        inicio = (
+            Periodo.objects.filter(empresa_id=empresa_id)
+            .order_by("data_inicio")
+            .values_list("data_inicio", flat=True)
+            .first()
+        )
+        if inicio is None:
+            return {"conta": (0, 0), "cc": (0, 0), "projeto": (0, 0)}
+    with transaction.atomic(), connection.cursor() as cursor:
+        resultado = _propagar(cursor, empresa_id, inicio, contas)
+        incrementar_versao_saldos(empresa_ids=[empresa_id], desde=inicio)
+    return resultado
+
+
+def recalcular_periodo(filial_id, periodo_id):
+    """Recalcula a filial/período (contas e rateios) e encadeia os seguintes."""
+    with transaction.atomic():
+        contas = recalcular_saldos_por_periodo(filial_id, periodo_id)
+        rateios = recalcular_rateios_cc_projeto(filial_id, periodo_id)
+        periodo = Periodo.objects.get(id=periodo_id)
+        propagar_saldos_iniciais(periodo.empresa_id, a_partir_de=periodo_id)
+        materializar_sinteticas(
+            _periodos_a_partir(periodo.empresa_id, periodo.data_inicio), filial_id=filial_id
         )
-        saldo_proj.save()
+    return {"conta": contas, **rateios}
+
+
+# ---------------------------------------------------------------------------
+# Contas sintéticas: saldos agregados materializados
+# ---------------------------------------------------------------------------
+
+def _periodos_a_partir(empresa_id, inicio):
+    qs = Periodo.objects.filter(data_inicio__gte=inicio)
+    if empresa_id is None:
+        qs = qs.filter(empresa__isnull=True)
+    else:
+        qs = qs.filter(empresa_id=empresa_id)
+    return list(qs.values_list("id", flat=True))
+
+
+def _sinteticas_de(contas):
+    """Ids das contas sintéticas ancestrais (pelo prefixo do código) das contas."""
+    prefixos = set()
+    for codigo in ContaContabil.objects.filter(id__in=contas).values_list("codigo", flat=True):
+        partes = codigo.split(".")
+        prefixos.update(".".join(partes[:n]) for n in range(1, len(partes)))
+    return list(
+        ContaContabil.objects.filter(codigo__in=prefixos, tipo="S").values_list("id", flat=True)
+    )
+
+
+def _materializar(cursor, periodo_ids, filial_id=None, contas=None):
+    if not periodo_ids:
+        return 0, 0
+    t = _tabelas()
+    params = {"periodos": list(periodo_ids), "filial": filial_id}
+    filtro_filial = "AND s.filial_id = %(filial)s" if filial_id is not None else ""
+    filtro_sint = ""
+    if contas is not None:
+        params["sinteticas"] = _sinteticas_de(contas)
+        if not params["sinteticas"]:
+            return 0, 0
+        filtro_sint = "AND sint.id = ANY(%(sinteticas)s)"
+
+    # Remove linhas sintéticas que não têm mais nenhuma analítica abaixo.
+    cursor.execute(
+        f"""
+        DELETE FROM {t['saldo']} s
+         USING {t['conta']} sint
+         WHERE sint.id = s.conta_contabil_id
+           AND sint.tipo = 'S'
+           AND s.periodo_id = ANY(%(periodos)s)
+           {filtro_filial} {filtro_sint}
+           AND NOT EXISTS (
+               SELECT 1
+                 FROM {t['saldo']} a
+                 JOIN {t['conta']} c ON c.id = a.conta_contabil_id
+                WHERE a.filial_id = s.filial_id
+                  AND a.periodo_id = s.periodo_id
+                  AND c.tipo = 'A'
+                  AND c.codigo LIKE sint.codigo || '.%%'
+           )
+        """,
+        params,
+    )
+    removidos = cursor.rowcount
+    inseridos, atualizados = _contar_upsert(
+        cursor,
+        f"""
+        INSERT INTO {t['saldo']} AS d
+               (conta_contabil_id, filial_id, periodo_id,
+                saldo_inicial, debito, credito, saldo_final)
+        SELECT sint.id, s.filial_id, s.periodo_id,
+               SUM(s.saldo_inicial), SUM(s.debito), SUM(s.credito), SUM(s.saldo_final)
+          FROM {t['saldo']} s
+          JOIN {t['conta']} c ON c.id = s.conta_contabil_id AND c.tipo = 'A'
+         CROSS JOIN LATERAL generate_series(
+               1, array_length(string_to_array(c.codigo, '.'), 1) - 1
+         ) AS n(nivel)
+          JOIN {t['conta']} sint
+            ON sint.codigo = array_to_string((string_to_array(c.codigo, '.'))[1:n.nivel], '.')
+           AND sint.tipo = 'S'
+         WHERE s.periodo_id = ANY(%(periodos)s)
+           {filtro_filial} {filtro_sint}
+         GROUP BY sint.id, s.filial_id, s.periodo_id
+        ON CONFLICT ON CONSTRAINT uniq_saldo_conta_periodo DO UPDATE
+           SET saldo_inicial = EXCLUDED.saldo_inicial,
+               debito = EXCLUDED.debito,
+               credito = EXCLUDED.credito,
+               saldo_final = EXCLUDED.saldo_final
+         WHERE (d.saldo_inicial, d.debito, d.credito, d.saldo_final)
+               IS DISTINCT FROM
+               (EXCLUDED.saldo_inicial, EXCLUDED.debito, EXCLUDED.credito, EXCLUDED.saldo_final)
+        RETURNING (xmax = 0) AS inserido
+        """,
+        params,
+    )
+    return inseridos, atualizados + removidos
+
+
+def materializar_sinteticas(periodo_ids, filial_id=None, contas=None):
+    """Grava em ``SaldoContaPeriodo`` o saldo das contas sintéticas (níveis 1-4).
 
+    Os ancestrais de cada conta analítica saem do prefixo do código
+    (``1.01.02.003.0001`` -> ``1``, ``1.01``, ``1.01.02``, ``1.01.02.003``),
+    a mesma estrutura validada em ``ContaContabil.clean``. Tudo num único
+    ``INSERT ... SELECT ... GROUP BY`` com upsert; linhas sintéticas sem
+    analíticas abaixo são removidas. ``contas`` (ids analíticos) limita a
+    atualização aos ancestrais dessas contas. Retorna (inseridos, atualizados).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        resultado = _materializar(cursor, periodo_ids, filial_id=filial_id, contas=contas)
+        periodos = Periodo.objects.filter(id__in=list(periodo_ids))
+        desde = periodos.aggregate(desde=Min("data_inicio"))["desde"]
+        if filial_id is not None:
+            incrementar_versao_saldos(filial_ids=[filial_id], desde=desde)
+        else:
+            incrementar_versao_saldos(
+                empresa_ids=periodos.values_list("empresa_id", flat=True).distinct(),
+                desde=desde,
+            )
+    return resultado
@@ -0,0 +1,156 @@
+"""Validação de lançamentos em conjunto: débito x crédito e rateios.
+
+Em vez de percorrer os itens consultando rateios e conta de cada um, duas
+consultas agregadas cobrem qualquer quantidade de lançamentos: uma soma
+débitos e créditos por lançamento; a outra traz só os itens ativos sem o
+rateio de centro de custo obrigatório (contas R/D/C) ou cujos rateios não
+fecham com o valor do item.
+
+As mesmas regras existem no PostgreSQL como triggers de constraint adiados
+(migrações ``0007_validacao_no_commit`` e ``0009_validacao_por_disparo``),
+que conferem cada lançamento tocado uma vez por disparo: no commit ou em
+``SET CONSTRAINTS ALL IMMEDIATE``. Ficam desligados até que a transação os ligue com
+``validacao_no_banco``; cargas em massa (``bulk_create``) podem então deixar a
+conferência para o banco. Para ligar sempre: ``ALTER DATABASE ... SET
+contabill.validar_lancamentos = on``.
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum
+
+from ..models import LancamentoItem, RateioLancamentoItemCentroCusto, RateioLancamentoItemProjeto
+
+TAMANHO_LOTE = 5000
+
+PARAMETRO_VALIDACAO = "contabill.validar_lancamentos"
+
+CLASSIFICACOES_COM_RATEIO_CC = ("R", "D", "C")
+
+ERRO_BALANCEAMENTO = "Débitos e créditos não estão balanceados"
+ERRO_CC_OBRIGATORIO = "Rateio de centro de custo obrigatório"
+ERRO_CC_TOTAL = "Rateios de centro de custo não fecham com o valor do item"
+ERRO_PROJETO_TOTAL = "Rateios de projeto não fecham com o valor do item"
+
+
+def _soma_rateios(modelo):
+    return Subquery(
+        modelo.objects.filter(lancamento_item=OuterRef("pk"))
+        .order_by()
+        .values("lancamento_item")
+        .annotate(total=Sum("valor"))
+        .values("total")[:1],
+        output_field=DecimalField(max_digits=18, decimal_places=2),
+    )
+
+
+def mensagens_rateio(valor, classificacao, total_cc, total_projeto):
+    """Mensagens de erro do rateio de um item (``total_*`` é ``None`` sem rateio)."""
+    if total_cc is None:
+        if classificacao in CLASSIFICACOES_COM_RATEIO_CC:
+            yield ERRO_CC_OBRIGATORIO
+    elif total_cc != valor:
+        yield ERRO_CC_TOTAL
+    if total_projeto is not None and total_projeto != valor:
+        yield ERRO_PROJETO_TOTAL
+
+
+def totais_rateio(item_id):
+    """``(total_cc, total_projeto)`` gravados para o item, numa consulta."""
+    totais = (
+        LancamentoItem.objects.filter(pk=item_id)
+        .annotate(
+            total_cc=_soma_rateios(RateioLancamentoItemCentroCusto),
+            total_projeto=_soma_rateios(RateioLancamentoItemProjeto),
+        )
+        .values_list("total_cc", "total_projeto")
+        .first()
+    )
+    return totais or (None, None)
+
+
+def erros_rateio(itens):
+    """Gera ``(lancamento_id, item_id, conta, mensagem)`` dos itens com rateio inválido.
+
+    ``itens`` é um queryset de ``LancamentoItem``; itens inativos são ignorados.
+    """
+    invalidos = (
+        itens.filter(status=True)
+        .annotate(
+            total_cc=_soma_rateios(RateioLancamentoItemCentroCusto),
+            total_projeto=_soma_rateios(RateioLancamentoItemProjeto),
+        )
+        .filter(
+            Q(total_cc__isnull=True, conta_contabil__classificacao__in=CLASSIFICACOES_COM_RATEIO_CC)
+            | (Q(total_cc__isnull=False) & ~Q(total_cc=F("valor")))
+            | (Q(total_projeto__isnull=False) & ~Q(total_projeto=F("valor")))
+        )
+        .order_by("lancamento_id", "id")
+        .values_list(
+            "lancamento_id", "id", "valor", "total_cc", "total_projeto",
+            "conta_contabil__codigo", "conta_contabil__classificacao",
+        )
+    )
+    for lancamento_id, item_id, valor, total_cc, total_projeto, conta, classificacao in invalidos:
+        for mensagem in mensagens_rateio(valor, classificacao, total_cc, total_projeto):
+            yield lancamento_id, item_id, conta, mensagem
+
+
+def desbalanceados(lancamento_ids):
+    """``{lancamento_id: (débito, crédito)}`` dos lançamentos com débito diferente do crédito."""
+    totais = (
+        LancamentoItem.objects.filter(lancamento_id__in=lancamento_ids, status=True)
+        .order_by()
+        .values("lancamento_id")
+        .annotate(
+            debito=Sum("valor", filter=Q(tipo_dc="D"), default=Decimal("0.00")),
+            credito=Sum("valor", filter=Q(tipo_dc="C"), default=Decimal("0.00")),
+        )
+        .exclude(debito=F("credito"))
+        .values_list("lancamento_id", "debito", "credito")
+    )
+    return {lancamento_id: (debito, credito) for lancamento_id, debito, credito in totais}
+
+
+def validar_lote(lancamento_ids, tamanho_lote=TAMANHO_LOTE):
+    """Valida vários lançamentos de uma vez.
+
+    Retorna ``{lancamento_id: [mensagens]}`` para todos os ids informados
+    (lista vazia quando o lançamento está válido). São duas consultas por
+    lote de ``tamanho_lote`` lançamentos, qualquer que seja o número de itens.
+    """
+    ids = list(dict.fromkeys(lancamento_ids))
+    erros = {lancamento_id: [] for lancamento_id in ids}
+    for inicio in range(0, len(ids), tamanho_lote):
+        lote = ids[inicio : inicio + tamanho_lote]
+        itens = LancamentoItem.objects.filter(lancamento_id__in=lote)
+        for lancamento_id, item_id, conta, mensagem in erros_rateio(itens):
+            erros[lancamento_id].append(f"Item {item_id} (conta {conta}): {mensagem}")
+        for lancamento_id, (debito, credito) in desbalanceados(lote).items():
+            erros[lancamento_id].append(f"{ERRO_BALANCEAMENTO}: débito {debito} x crédito {credito}")
+    return erros
+
+
+@contextmanager
+def validacao_no_banco(using=DEFAULT_DB_ALIAS):
+    """Bloco atômico cujas gravações em itens e rateios são conferidas no commit.
+
+    Uma violação levanta ``IntegrityError`` ao confirmar a transação externa
+    (ou em ``SET CONSTRAINTS ALL IMMEDIATE``). Fora do PostgreSQL é só um
+    ``transaction.atomic``.
+    """
+    conexao = connections[using]
+    with transaction.atomic(using=using):
+        if conexao.vendor != "postgresql":
+            yield
+            return
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT current_setting(%s, true)", [PARAMETRO_VALIDACAO])
+            anterior = cursor.fetchone()[0] or "off"
+            cursor.execute("SELECT set_config(%s, 'on', true)", [PARAMETRO_VALIDACAO])
+        yield
+        # os eventos já enfileirados continuam valendo até o commit; com erro,
+        # o rollback do atomic já desfaz o set_config
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT set_config(%s, %s, true)", [PARAMETRO_VALIDACAO, anterior])
@@ -0,0 +1,52 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from contabill.models import CentroCusto, ContaContabil
+
+
+class CaminhoMaterializadoTests(TestCase):
+    def setUp(self):
+        self.raiz = CentroCusto.objects.create(codigo="1", descricao="Raiz", tipo="O")
+        self.adm = CentroCusto.objects.create(
+            codigo="1.1", descricao="Adm", tipo="A", centro_custo_pai=self.raiz
+        )
+        self.rh = CentroCusto.objects.create(
+            codigo="1.1.1", descricao="RH", tipo="A", centro_custo_pai=self.adm
+        )
+        self.outra = CentroCusto.objects.create(codigo="2", descricao="Outra", tipo="O")
+
+    def test_caminho_e_consultas(self):
+        self.assertEqual(self.rh.caminho, f"/{self.raiz.pk}/{self.adm.pk}/{self.rh.pk}/")
+        self.assertEqual(self.rh.nivel, 3)
+        self.assertQuerysetEqual(
+            self.raiz.descendentes().order_by("codigo"), [self.adm, self.rh]
+        )
+        self.assertQuerysetEqual(self.rh.ancestrais().order_by("codigo"), [self.raiz, self.adm])
+        self.assertTrue(self.raiz.eh_ancestral_de(self.rh))
+        self.assertFalse(self.outra.eh_ancestral_de(self.rh))
+
+    def test_mover_subarvore_reescreve_descendentes(self):
+        self.adm.centro_custo_pai = self.outra
+        self.adm.save()
+        self.rh.refresh_from_db()
+        self.assertEqual(self.rh.caminho, f"/{self.outra.pk}/{self.adm.pk}/{self.rh.pk}/")
+        self.assertEqual(self.rh.nivel, 3)
+        self.assertFalse(self.raiz.descendentes().exists())
+
+        self.adm.centro_custo_pai = None
+        self.adm.save()
+        self.rh.refresh_from_db()
+        self.assertEqual((self.adm.nivel, self.rh.nivel), (1, 2))
+
+    def test_ciclo_detectado_pelo_caminho(self):
+        self.raiz.centro_custo_pai = self.rh
+        with self.assertRaises(ValidationError):
+            self.raiz.clean()
+
+    def test_conta_contabil(self):
+        n1 = ContaContabil.objects.create(codigo="1", descricao="Ativo", tipo="S", natureza="D", nivel=1)
+        n2 = ContaContabil.objects.create(
+            codigo="1.01", descricao="Circulante", tipo="S", natureza="D", nivel=2, conta_pai=n1
+        )
+        self.assertEqual(n2.caminho, f"/{n1.pk}/{n2.pk}/")
+        self.assertQuerysetEqual(n1.descendentes(), [n2])
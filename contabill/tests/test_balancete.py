@@ -0,0 +1,125 @@
+import csv
+import io
+import importlib.util
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from contabill.models import Filial, Periodo
+from contabill.services.balancete import balancete, linhas_balancete, periodos_do_intervalo
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class BalanceteTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.filial2 = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Filial 2")
+        self.fevereiro = Periodo.objects.create(
+            codigo="202402",
+            data_inicio=date(2024, 2, 1),
+            data_fim=date(2024, 2, 29),
+            empresa=self.empresa,
+            status="A",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="100")
+            self.preparar_lancamento(valor="30", filial=self.filial2)
+            self.preparar_lancamento(valor="5", data=date(2024, 2, 3))
+
+    def linha(self, linhas, conta):
+        return next(l for l in linhas if l["codigo"] == conta.codigo)
+
+    def test_periodos_do_intervalo(self):
+        self.assertEqual(periodos_do_intervalo(self.periodo, self.fevereiro), [self.periodo, self.fevereiro])
+        self.assertEqual(periodos_do_intervalo(self.fevereiro), [self.fevereiro])
+        with self.assertRaises(ValueError):
+            periodos_do_intervalo(self.fevereiro, self.periodo)
+
+    def test_filial_um_periodo(self):
+        linhas = balancete([self.fevereiro], filial_id=self.filial.id)
+        conta_d = self.linha(linhas, self.conta_d)
+        self.assertEqual(
+            (conta_d["saldo_inicial"], conta_d["debito"], conta_d["credito"], conta_d["saldo_final"]),
+            (Decimal("100"), Decimal("5"), Decimal("0"), Decimal("105")),
+        )
+        n1 = self.linha(linhas, self.n1)
+        self.assertEqual((n1["debito"], n1["credito"], n1["saldo_final"]), (Decimal("5"), Decimal("5"), Decimal("0")))
+        self.assertEqual(
+            [l["codigo"] for l in linhas],
+            ["1", "1.01", "1.01.02", "1.01.02.003", "1.01.02.003.0001", "1.01.02.003.0002"],
+        )
+
+    def test_empresa_intervalo_e_nivel(self):
+        periodos = periodos_do_intervalo(self.periodo, self.fevereiro)
+        linhas = balancete(periodos, empresa_id=self.empresa.id)
+        conta_d = self.linha(linhas, self.conta_d)
+        self.assertEqual(
+            (conta_d["saldo_inicial"], conta_d["debito"], conta_d["saldo_final"]),
+            (Decimal("0"), Decimal("135"), Decimal("135")),
+        )
+        conta_c = self.linha(linhas, self.conta_c)
+        self.assertEqual(conta_c["saldo_final"], Decimal("-135"))
+
+        linhas = balancete(periodos, empresa_id=self.empresa.id, nivel=2)
+        self.assertEqual([l["codigo"] for l in linhas], ["1", "1.01"])
+
+    def test_paginacao_por_chave(self):
+        periodos = [self.periodo]
+        pagina1 = balancete(periodos, filial_id=self.filial.id, limite=4)
+        pagina2 = balancete(periodos, filial_id=self.filial.id, apos=pagina1[-1]["codigo"], limite=4)
+        self.assertEqual(len(pagina1), 4)
+        self.assertEqual([l["codigo"] for l in pagina2], [self.conta_d.codigo, self.conta_c.codigo])
+        todas = list(linhas_balancete(periodos, tamanho_pagina=2, filial_id=self.filial.id))
+        self.assertEqual([l["codigo"] for l in todas], [l["codigo"] for l in pagina1 + pagina2])
+
+    def test_ocultar_zeradas(self):
+        vazio = Filial.objects.create(empresa=self.empresa, codigo="003", descricao="Sem movimento")
+        self.assertEqual(balancete([self.periodo], filial_id=vazio.id), [])
+        with self.assertRaises(ValueError):
+            balancete([self.periodo])
+
+
+class BalanceteViewTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="100")
+        self.client.force_login(self.user)
+        self.url = reverse("contabill:relatorios_balancete")
+
+    def test_pagina_e_validacao(self):
+        resposta = self.client.get(self.url, {"filial": self.filial.id, "periodo_inicial": self.periodo.id, "nivel": 5})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.context["linhas"]), 6)
+        self.assertIsNone(resposta.context["proxima"])
+
+        resposta = self.client.get(self.url, {"periodo_inicial": self.periodo.id, "nivel": 5})
+        self.assertTrue(resposta.context["form"].errors)
+        self.assertNotIn("linhas", resposta.context)
+
+    def test_exporta_csv(self):
+        resposta = self.client.get(
+            self.url,
+            {"empresa": self.empresa.id, "periodo_inicial": self.periodo.id, "nivel": 5, "exportar": "csv"},
+        )
+        self.assertTrue(resposta.streaming)
+        conteudo = b"".join(resposta.streaming_content).decode("utf-8-sig")
+        linhas = list(csv.reader(io.StringIO(conteudo), delimiter=";"))
+        self.assertEqual(linhas[0][0], "Código")
+        self.assertEqual(linhas[5], ["1.01.02.003.0001", "Conta D", "5", "0,00", "100,00", "0,00", "100,00"])
+
+    @unittest.skipUnless(importlib.util.find_spec("openpyxl"), "openpyxl não instalado")
+    def test_exporta_xlsx(self):
+        from openpyxl import load_workbook
+
+        resposta = self.client.get(
+            self.url,
+            {"filial": self.filial.id, "periodo_inicial": self.periodo.id, "nivel": 1, "exportar": "xlsx"},
+        )
+        livro = load_workbook(io.BytesIO(b"".join(resposta.streaming_content)), read_only=True)
+        linhas = list(livro.worksheets[0].iter_rows(values_only=True))
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(linhas[1][:3], ("1", "Ativo", 1))
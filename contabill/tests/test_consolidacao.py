@@ -0,0 +1,140 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from cadastros.models import Empresa
+from contabill.models import Filial, GrupoEmpresarial, Periodo, SaldoConsolidado
+from contabill.services.consolidacao import atualizar_consolidacao, consolidar, empresas_pendentes
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+def criar_outra_empresa(cnpj, grupo=None):
+    return Empresa.objects.create(
+        razao_social=f"Empresa {cnpj}",
+        nome_fantasia="",
+        cnpj=cnpj,
+        ie="",
+        im="",
+        endereco="Rua",
+        numero="1",
+        complemento="",
+        bairro="Bairro",
+        cidade="Cidade",
+        estado="SP",
+        cep="12345678",
+        telefone="",
+        email="",
+        site="",
+        ativo=True,
+        grupo_empresarial=grupo,
+    )
+
+
+class ConsolidacaoTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.grupo = GrupoEmpresarial.objects.create(nome="Grupo")
+        Empresa.objects.filter(pk=self.empresa.pk).update(grupo_empresarial=self.grupo)
+        self.filial2 = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Filial 2")
+
+        self.empresa2 = criar_outra_empresa("22222222000122", self.grupo)
+        self.filial_e2 = Filial.objects.create(empresa=self.empresa2, codigo="001", descricao="E2")
+        Periodo.objects.create(
+            codigo="202401", data_inicio=date(2024, 1, 1), data_fim=date(2024, 1, 31),
+            empresa=self.empresa2, status="A",
+        )
+        self.avulsa = criar_outra_empresa("33333333000133")
+        self.filial_avulsa = Filial.objects.create(empresa=self.avulsa, codigo="001", descricao="Avulsa")
+        Periodo.objects.create(
+            codigo="202401", data_inicio=date(2024, 1, 1), data_fim=date(2024, 1, 31),
+            empresa=self.avulsa, status="A",
+        )
+
+        # a versão dos saldos da filial só muda no commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="100")
+            self.preparar_lancamento(valor="30", filial=self.filial2)
+            self.preparar_lancamento(valor="7", filial=self.filial_e2)
+            self.preparar_lancamento(valor="1", filial=self.filial_avulsa)
+
+    def consolidado(self, conta, empresa=None, grupo=None):
+        filtro = {"nivel": "E", "empresa": empresa} if empresa else {"nivel": "G", "grupo": grupo}
+        return SaldoConsolidado.objects.get(conta_contabil=conta, data_inicio=date(2024, 1, 1), **filtro)
+
+    def test_consolida_empresas_e_grupo(self):
+        self.assertEqual(empresas_pendentes(), {self.empresa.id, self.empresa2.id, self.avulsa.id})
+        resultado = consolidar()
+        self.assertGreater(resultado["empresa"], 0)
+        self.assertEqual(self.consolidado(self.conta_d, empresa=self.empresa).debito, Decimal("130"))
+        self.assertEqual(self.consolidado(self.conta_d, empresa=self.empresa2).debito, Decimal("7"))
+        grupo = self.consolidado(self.n1, grupo=self.grupo)
+        self.assertEqual((grupo.debito, grupo.credito, grupo.saldo_final), (Decimal("137"), Decimal("137"), Decimal("0")))
+        self.assertEqual(self.consolidado(self.conta_c, grupo=self.grupo).saldo_final, Decimal("-137"))
+        self.assertFalse(SaldoConsolidado.objects.filter(nivel="G", grupo__isnull=True).exists())
+        self.assertEqual(empresas_pendentes(), set())
+        self.assertIsNone(atualizar_consolidacao())
+
+    def test_atualizacao_incremental(self):
+        consolidar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="5", filial=self.filial_e2)
+        self.assertEqual(empresas_pendentes(), {self.empresa2.id})
+
+        resultado = atualizar_consolidacao()
+        # conta D, conta C e as 4 sintéticas, na empresa e no grupo
+        self.assertEqual((resultado["empresa"], resultado["grupo"]), (6, 6))
+        self.assertEqual(self.consolidado(self.conta_d, empresa=self.empresa2).debito, Decimal("12"))
+        self.assertEqual(self.consolidado(self.conta_d, grupo=self.grupo).debito, Decimal("142"))
+        self.assertEqual(self.consolidado(self.conta_d, empresa=self.avulsa).debito, Decimal("1"))
+
+    def test_atualizacao_so_dos_periodos_alterados(self):
+        for empresa in (self.empresa, self.empresa2):
+            Periodo.objects.create(
+                codigo="202402", data_inicio=date(2024, 2, 1), data_fim=date(2024, 2, 29),
+                empresa=empresa, status="A",
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="3", data=date(2024, 2, 10))
+        consolidar()
+        self.assertIsNone(Filial.objects.get(pk=self.filial.pk).consolidar_desde)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="5", data=date(2024, 2, 10), filial=self.filial_e2)
+        self.assertEqual(Filial.objects.get(pk=self.filial_e2.pk).consolidar_desde, date(2024, 2, 1))
+        # janeiro fora do corte: a linha adulterada não é refeita
+        SaldoConsolidado.objects.filter(data_inicio=date(2024, 1, 1)).update(debito=0)
+        atualizar_consolidacao()
+        self.assertEqual(self.consolidado(self.conta_d, grupo=self.grupo).debito, Decimal("0"))
+        fevereiro = SaldoConsolidado.objects.get(
+            nivel="G", grupo=self.grupo, conta_contabil=self.conta_d, data_inicio=date(2024, 2, 1)
+        )
+        self.assertEqual(fevereiro.debito, Decimal("8"))
+        self.assertIsNone(Filial.objects.get(pk=self.filial_e2.pk).consolidar_desde)
+
+        # pendências acumuladas valem a partir do período mais antigo
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="1", filial=self.filial_e2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="1", data=date(2024, 2, 10), filial=self.filial_e2)
+        self.assertEqual(Filial.objects.get(pk=self.filial_e2.pk).consolidar_desde, date(2024, 1, 1))
+        atualizar_consolidacao()
+        self.assertEqual(self.consolidado(self.conta_d, grupo=self.grupo).debito, Decimal("138"))
+
+    def test_remove_linhas_sem_saldo(self):
+        consolidar()
+        Empresa.objects.filter(pk=self.empresa2.pk).update(grupo_empresarial=None)
+        self.filial_e2.saldocontaperiodo_set.all().delete()
+        resultado = consolidar()
+        self.assertGreater(resultado["removidos"], 0)
+        self.assertFalse(SaldoConsolidado.objects.filter(empresa=self.empresa2).exists())
+        self.assertEqual(self.consolidado(self.conta_d, grupo=self.grupo).debito, Decimal("130"))
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command("consolidar_saldos", stdout=saida)
+        self.assertIn("linha(s) de empresa", saida.getvalue())
+        call_command("consolidar_saldos", stdout=saida)
+        self.assertIn("Nada a consolidar.", saida.getvalue())
@@ -0,0 +1,102 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from contabill.models import (
+    CentroCusto,
+    ContaContabil,
+    Filial,
+    Periodo,
+    RateioLancamentoItemCentroCusto,
+    RateioLancamentoItemProjeto,
+)
+from contabill.services.dre import dre_centro_custo, dre_projeto
+from contabill.services.saldo import incrementar_versao_saldos
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class DRETests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.fevereiro = Periodo.objects.create(
+            codigo="202402",
+            data_inicio=date(2024, 2, 1),
+            data_fim=date(2024, 2, 29),
+            empresa=self.empresa,
+            status="A",
+        )
+        self.cc2 = CentroCusto.objects.create(codigo="CC2", descricao="Filho", tipo="O", centro_custo_pai=self.cc)
+        self.despesa = ContaContabil.objects.create(
+            codigo="1.01.02.003.0003", descricao="Despesa", tipo="A", natureza="D",
+            nivel=5, conta_pai=self.n4, classificacao="D",
+        )
+        # janeiro: despesa 40 no CC2 (e no projeto), receita 40 no CC1
+        lanc = self.criar_lancamento(data=date(2024, 1, 10))
+        self.ratear(self.criar_item(lanc, self.despesa, "40", "D"), self.cc2, projeto=True)
+        self.ratear(self.criar_item(lanc, self.conta_c, "40", "C"), self.cc)
+        # fevereiro: despesa 10 no CC1, receita 25 no CC2
+        lanc = self.criar_lancamento(data=date(2024, 2, 10))
+        self.ratear(self.criar_item(lanc, self.despesa, "10", "D"), self.cc)
+        self.ratear(self.criar_item(lanc, self.conta_c, "25", "C"), self.cc2)
+        self.periodos = [self.periodo, self.fevereiro]
+
+    def ratear(self, item, cc, projeto=False):
+        RateioLancamentoItemCentroCusto.objects.create(lancamento_item=item, centro_custo=cc, valor=item.valor)
+        if projeto:
+            RateioLancamentoItemProjeto.objects.create(lancamento_item=item, projeto=self.proj, valor=item.valor)
+
+    def totais(self, dre):
+        return {g["classificacao"]: g["total"] for g in dre["grupos"]}
+
+    def test_centro_custo_raiz_e_subarvore(self):
+        dre = dre_centro_custo(self.periodos, self.cc, filial_id=self.filial.id)
+        self.assertEqual(self.totais(dre)["R"], [Decimal("40"), Decimal("25")])
+        self.assertEqual(self.totais(dre)["D"], [Decimal("-40"), Decimal("-10")])
+        self.assertEqual(dre["resultado"], [Decimal("0"), Decimal("15")])
+        despesas = dre["grupos"][2]["contas"]
+        self.assertEqual([(c["codigo"], c["valores"]) for c in despesas], [(self.despesa.codigo, [Decimal("-40"), Decimal("-10")])])
+
+        dre = dre_centro_custo(self.periodos, self.cc2, empresa_id=self.empresa.id)
+        self.assertEqual(dre["resultado"], [Decimal("-40"), Decimal("25")])
+        self.assertEqual(self.totais(dre)["C"], [0, 0])
+
+    def test_projeto(self):
+        dre = dre_projeto(self.periodos, [self.proj], filial_id=self.filial.id)
+        self.assertEqual(self.totais(dre)["D"], [Decimal("-40"), 0])
+        self.assertEqual(dre["resultado"], [Decimal("-40"), 0])
+
+    def test_cache_pela_versao_dos_saldos(self):
+        dre_centro_custo(self.periodos, self.cc, filial_id=self.filial.id)
+        with self.assertNumQueries(1):  # só a versão
+            dre_centro_custo(self.periodos, self.cc, filial_id=self.filial.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lanc = self.criar_lancamento(data=date(2024, 2, 12))
+            self.ratear(self.criar_item(lanc, self.conta_c, "5", "C"), self.cc)
+        dre = dre_centro_custo(self.periodos, self.cc, filial_id=self.filial.id)
+        self.assertEqual(dre["resultado"], [Decimal("0"), Decimal("20")])
+
+        outra = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Outra")
+        versao = Filial.objects.get(pk=self.filial.pk).versao_saldos
+        with self.captureOnCommitCallbacks() as callbacks:
+            incrementar_versao_saldos(filial_ids=[outra.id])
+        # só no commit
+        self.assertEqual(Filial.objects.get(pk=outra.pk).versao_saldos, 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Filial.objects.get(pk=outra.pk).versao_saldos, 1)
+        self.assertEqual(Filial.objects.get(pk=self.filial.pk).versao_saldos, versao)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        resposta = self.client.get(
+            reverse("contabill:relatorios_dre"),
+            {"por": "cc", "filial": self.filial.id, "periodos": [self.fevereiro.id, self.periodo.id]},
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context["periodos"], self.periodos)
+        self.assertEqual(resposta.context["dre"]["resultado"], [Decimal("0"), Decimal("15")])
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contabill.forms.lancamentos import LancamentoItemForm, LancamentoItemFormSet
+from contabill.models import ContaContabil, HistoricoPadrao
+from contabill.services.escolhas import buscar, escolhas
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class EscolhasTests(SaldoFixturesMixin, TestCase):
+    def test_busca_so_analiticas(self):
+        self.assertEqual([pk for pk, _ in buscar("conta_contabil", "1.01.02")], [self.conta_d.pk, self.conta_c.pk])
+        self.assertEqual(buscar("conta_contabil", " conta   c "), [(self.conta_c.pk, str(self.conta_c))])
+        self.assertEqual(buscar("conta_contabil", ""), [])
+        self.assertEqual(buscar("historico", str(self.historico.pk)), [(self.historico.pk, "Hist")])
+
+    def test_cache_invalidado_pela_versao(self):
+        buscar("conta_contabil", "1.01")
+        # a versão também fica no cache: nenhuma consulta
+        with self.assertNumQueries(0):
+            buscar("conta_contabil", "1.01")
+
+        nova = ContaContabil.objects.create(
+            codigo="1.01.02.003.0003", descricao="Nova", tipo="A", natureza="D", nivel=5, conta_pai=self.n4,
+        )
+        self.assertIn(nova.pk, [pk for pk, _ in buscar("conta_contabil", "1.01")])
+
+        escolhas("historico")
+        self.historico.descricao = "Renomeado"
+        self.historico.save()
+        self.assertEqual(escolhas("historico"), [(self.historico.pk, "Renomeado")])
+
+    def test_formulario_sem_lista_de_contas(self):
+        HistoricoPadrao.objects.create(descricao="Outro", tipo="padrao")
+        html = LancamentoItemForm(prefix="novo").as_p()
+        self.assertNotIn(self.conta_d.codigo, html)
+        self.assertNotIn("Outro", html)
+        self.assertIn(str(self.moeda), html)
+
+        html = LancamentoItemForm(prefix="novo", initial={"conta_contabil": self.conta_d.pk}).as_p()
+        self.assertIn(str(self.conta_d), html)
+        self.assertNotIn(str(self.conta_c), html)
+
+    def test_formset_busca_rotulos_de_uma_vez(self):
+        lanc = self.criar_lancamento()
+        for _ in range(5):
+            self.criar_item(lanc, self.conta_d, "10", "D")
+            self.criar_item(lanc, self.conta_c, "10", "C")
+        escolhas("moeda")
+        with CaptureQueriesContext(connection) as consultas:
+            html = LancamentoItemFormSet(instance=lanc, prefix="itens").as_p()
+        # uma consulta por fonte (conta e histórico), não uma por linha
+        tabelas = (ContaContabil._meta.db_table, HistoricoPadrao._meta.db_table)
+        self.assertEqual(
+            [tabela for q in consultas for tabela in tabelas if f'FROM "{tabela}"' in q["sql"]],
+            list(tabelas),
+        )
+        self.assertEqual(html.count(f'value="{self.conta_c}"'), 5)
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        url = reverse("contabill:lancamentos_escolhas", args=["conta_contabil"])
+        resposta = self.client.get(url, {"q": "1.01.02.003.0002"})
+        self.assertEqual(resposta.json(), {"resultados": [{"id": self.conta_c.pk, "texto": str(self.conta_c)}]})
+        resposta = self.client.get(reverse("contabill:lancamentos_escolhas", args=["filial"]), {"q": "1"})
+        self.assertEqual(resposta.status_code, 404)
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from contabill.models import TarefaRecalculoSaldo
+from contabill.services import recalculo
+from contabill.services.recalculo import (
+    enfileirar_recalculo,
+    processar_fila,
+    reservar_proxima_tarefa,
+)
+from contabill.tests.test_saldo import SaldoBaseTestCase
+
+
+@override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+class FilaRecalculoTests(SaldoBaseTestCase):
+    def test_pedidos_repetidos_sao_mesclados(self):
+        t1, criada1 = enfileirar_recalculo(self.filial.id, self.periodo.id, usuario=self.user)
+        t2, criada2 = enfileirar_recalculo(self.filial.id, self.periodo.id)
+        self.assertEqual((criada1, criada2), (True, False))
+        self.assertEqual(t1.pk, t2.pk)
+        self.assertEqual(t2.solicitacoes, 2)
+
+    def test_outras_violacoes_nao_repetem(self):
+        with self.assertRaises(IntegrityError):
+            enfileirar_recalculo(self.filial.id, None)
+        enfileirar_recalculo(self.filial.id, self.periodo.id)
+        # a pendente some a cada volta: desiste depois de algumas tentativas
+        with mock.patch.object(QuerySet, "update", return_value=0) as update:
+            with self.assertRaises(IntegrityError):
+                enfileirar_recalculo(self.filial.id, self.periodo.id)
+        self.assertEqual(update.call_count, recalculo.TENTATIVAS_ENFILEIRAR)
+
+    def test_novo_pedido_durante_execucao_gera_nova_tarefa(self):
+        enfileirar_recalculo(self.filial.id, self.periodo.id)
+        em_execucao = reservar_proxima_tarefa()
+        self.assertEqual(em_execucao.status, "E")
+        nova, criada = enfileirar_recalculo(self.filial.id, self.periodo.id)
+        self.assertTrue(criada)
+        # mesmo par já em execução: fica na fila até a primeira terminar
+        self.assertIsNone(reservar_proxima_tarefa())
+        recalculo.executar_tarefa(em_execucao)
+        self.assertEqual(reservar_proxima_tarefa().pk, nova.pk)
+
+    def test_tarefa_abandonada_volta_para_a_fila(self):
+        enfileirar_recalculo(self.filial.id, self.periodo.id)
+        abandonada = reservar_proxima_tarefa()
+        # o worker morreu: a tarefa ficou "E" e ninguém trava a linha
+        TarefaRecalculoSaldo.objects.filter(pk=abandonada.pk).update(
+            iniciado_em=timezone.now() - timedelta(minutes=5)
+        )
+        nova = reservar_proxima_tarefa()
+        self.assertNotEqual(nova.pk, abandonada.pk)
+        self.assertEqual((nova.filial_id, nova.periodo_id, nova.status), (self.filial.id, self.periodo.id, "E"))
+        abandonada.refresh_from_db()
+        self.assertEqual(abandonada.status, "F")
+        self.assertIn("abandonada", abandonada.erro)
+
+        # o worker antigo, se voltar, não roda a tarefa substituída
+        recalculo.executar_tarefa(abandonada)
+        abandonada.refresh_from_db()
+        self.assertEqual(abandonada.status, "F")
+
+    def test_processar_fila(self):
+        self.preparar_lancamento(valor="100")
+        tarefa, _ = enfileirar_recalculo(self.filial.id, self.periodo.id)
+        self.assertEqual([t.pk for t in processar_fila()], [tarefa.pk])
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, "C")
+        self.assertIsNotNone(tarefa.duracao)
+        self.assertEqual(tarefa.resultado["conta"], [2, 0])
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("100"))
+        self.assertEqual(processar_fila(), [])
+
+    def test_falha_registrada_na_tarefa(self):
+        tarefa, _ = enfileirar_recalculo(self.filial.id, self.periodo.id)
+        with mock.patch.object(recalculo, "recalcular_periodo", side_effect=RuntimeError("boom")):
+            processar_fila()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, "F")
+        self.assertIn("boom", tarefa.erro)
+
+    def test_comando_worker(self):
+        enfileirar_recalculo(self.filial.id, self.periodo.id)
+        saida = StringIO()
+        call_command("processar_recalculos", "--uma-vez", stdout=saida)
+        self.assertIn(f"filial {self.filial.id}", saida.getvalue())
+        self.assertFalse(TarefaRecalculoSaldo.objects.exclude(status="C").exists())
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        url = reverse("contabill:lancamentos_recalcular_saldo")
+        dados = {"filial_id": self.filial.id, "periodo_id": self.periodo.id}
+        self.assertRedirects(self.client.post(url, dados), reverse("contabill:lancamentos_lista"))
+        resposta = self.client.post(url, dados, HTTP_HX_REQUEST="true")
+        self.assertContains(resposta, 'hx-trigger="every 5s"')
+
+        tarefa = TarefaRecalculoSaldo.objects.get()
+        self.assertEqual(tarefa.solicitacoes, 2)
+        status = self.client.get(reverse("contabill:lancamentos_recalculo_status", args=[tarefa.pk]))
+        self.assertEqual(status.json()["status"], "P")
+        processar_fila()
+        status = self.client.get(reverse("contabill:lancamentos_recalculo_status", args=[tarefa.pk]))
+        self.assertEqual(status.json()["status"], "C")
+        self.assertIsNotNone(status.json()["duracao"])
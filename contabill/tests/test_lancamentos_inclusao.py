@@ -0,0 +1,65 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contabill.models import LancamentoItem
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class InclusaoItemHXTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.lanc = self.criar_lancamento()
+        self.url = reverse("contabill:lancamentos_item_create")
+
+    def incluir(self, conta, tipo_dc, valor):
+        return self.client.post(
+            self.url,
+            {
+                "lancamento_id": self.lanc.id,
+                "novo-conta_contabil": conta.id,
+                "novo-historico": self.historico.id,
+                "novo-moeda": self.moeda.id,
+                "novo-tipo_dc": tipo_dc,
+                "novo-valor": valor,
+            },
+            HTTP_HX_REQUEST="true",
+        )
+
+    def test_devolve_so_a_linha_nova_e_totais(self):
+        self.incluir(self.conta_d, "D", "100,00")
+        resposta = self.incluir(self.conta_c, "C", "40,00")
+        html = resposta.content.decode()
+        item = LancamentoItem.objects.latest("id")
+        self.assertIn(f'data-item-id="{item.pk}"', html)
+        self.assertEqual(html.count("data-item-id="), 1)
+        self.assertIn('<tr id="linha-nova" hx-swap-oob="true">', html)
+        self.assertIn('data-diferenca="60.00"', html)
+        self.assertEqual(resposta.context["totais"]["credito"], item.valor)
+
+    def test_consultas_constantes(self):
+        self.incluir(self.conta_d, "D", "1")
+        with CaptureQueriesContext(connection) as segunda:
+            self.incluir(self.conta_d, "D", "1")
+        for _ in range(8):
+            self.incluir(self.conta_c, "C", "1")
+        with CaptureQueriesContext(connection) as decima:
+            self.incluir(self.conta_d, "D", "1")
+        self.assertEqual(len(segunda), len(decima))
+
+    def test_erro_troca_a_linha_de_inclusao(self):
+        resposta = self.incluir(self.conta_d, "D", "abc")
+        self.assertEqual(resposta["HX-Retarget"], "#linha-nova")
+        self.assertEqual(resposta["HX-Reswap"], "outerHTML")
+        self.assertIn("valor", resposta.context["form_novo"].errors)
+        self.assertContains(resposta, '<tr id="linha-nova">')
+        self.assertFalse(LancamentoItem.objects.exists())
+
+    def test_tela_do_lancamento_mostra_totais(self):
+        self.preparar_lancamento(valor="25")
+        lanc = LancamentoItem.objects.latest("id").lancamento
+        resposta = self.client.get(reverse("contabill:lancamentos_editar", args=[lanc.pk]))
+        self.assertEqual(resposta.context["totais"]["debito"], lanc.itens.get(tipo_dc="D").valor)
+        self.assertContains(resposta, 'id="itens-totais" data-diferenca="0.00"')
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contabill.models import Filial, LancamentoContabil
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class LancamentoListaTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.filial2 = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Filial 2")
+        # 23 lançamentos, alguns no mesmo dia, para o desempate por id
+        for n in range(23):
+            lanc, _, _ = self.preparar_lancamento(
+                valor=str(n + 1),
+                data=date(2024, 1, 1) + timedelta(days=n // 2),
+                filial=self.filial2 if n % 5 == 0 else None,
+            )
+            LancamentoContabil.objects.filter(pk=lanc.pk).update(numero_documento=f"DOC{n}")
+        self.client.force_login(self.user)
+        self.url = reverse("contabill:lancamentos_lista")
+
+    def ordem_esperada(self):
+        return list(LancamentoContabil.objects.order_by("-data_competencia", "-id").values_list("id", flat=True))
+
+    def test_percorre_paginas_por_cursor(self):
+        vistos, params = [], {}
+        while True:
+            resposta = self.client.get(self.url, params)
+            pagina = resposta.context["page_obj"]
+            vistos += [obj.pk for obj in resposta.context["object_list"]]
+            if not pagina.has_next:
+                break
+            params = {"apos": pagina.cursor_proximo}
+        self.assertEqual(vistos, self.ordem_esperada())
+
+        # volta uma página a partir da última
+        resposta = self.client.get(self.url, {"antes": pagina.cursor_anterior})
+        self.assertEqual([obj.pk for obj in resposta.context["object_list"]], self.ordem_esperada()[10:20])
+        self.assertTrue(resposta.context["page_obj"].has_previous)
+
+    def test_totais_e_consultas_constantes(self):
+        with CaptureQueriesContext(connection) as primeira:
+            resposta = self.client.get(self.url)
+        obj = resposta.context["object_list"][0]
+        self.assertEqual(obj.qtd_itens, 2)
+        self.assertEqual(obj.total_debito, obj.total_credito)
+        self.assertEqual(obj.total_debito, Decimal("23"))
+
+        cursor = resposta.context["page_obj"].cursor_proximo
+        with CaptureQueriesContext(connection) as seguinte:
+            self.client.get(self.url, {"apos": cursor})
+        self.assertEqual(len(primeira), len(seguinte))
+        self.assertFalse([q for q in seguinte.captured_queries if "OFFSET" in q["sql"]])
+
+    def test_filtros(self):
+        resposta = self.client.get(self.url, {"filial": self.filial2.id})
+        self.assertEqual(len(resposta.context["object_list"]), 5)
+        self.assertNotIn("apos", resposta.context["filtros_url"])
+
+        resposta = self.client.get(self.url, {"documento": "DOC7"})
+        self.assertEqual([o.numero_documento for o in resposta.context["object_list"]], ["DOC7"])
+
+        resposta = self.client.get(self.url, {"data_inicio": "2024-01-11", "data_fim": "2024-01-12"})
+        self.assertEqual(len(resposta.context["object_list"]), 3)
+
+        resposta = self.client.get(self.url, {"periodo": self.periodo.id, "origem": "1"})
+        self.assertEqual(list(resposta.context["object_list"]), [])
+
+        # ids inválidos são ignorados em vez de derrubar a página
+        resposta = self.client.get(self.url, {"filial": "abc", "periodo": "x"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.context["object_list"]), 10)
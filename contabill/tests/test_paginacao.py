@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.paginator import EmptyPage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from contabill.models import Moeda
+from velzon.paginacao import PaginadorEstimado, estimar_linhas
+
+
+class PaginadorEstimadoTests(TestCase):
+    def setUp(self):
+        Moeda.objects.bulk_create(
+            Moeda(codigo=f"M{n:02d}", descricao=f"Moeda {n}", simbolo="$") for n in range(23)
+        )
+        self.qs = Moeda.objects.order_by("codigo")
+
+    def test_abaixo_do_limiar_conta_exato(self):
+        paginador = PaginadorEstimado(self.qs, 10, limiar=1000)
+        self.assertEqual(paginador.count, 23)
+        self.assertFalse(paginador.estimado)
+
+    def test_estimativa_do_planejador(self):
+        self.assertIsInstance(estimar_linhas(self.qs.filter(codigo__startswith="M1")), int)
+        self.assertIsInstance(estimar_linhas(self.qs), int)
+
+    def test_paginas_com_estimativa(self):
+        paginador = PaginadorEstimado(self.qs, 10, limiar=0)
+        pagina = paginador.page(1)
+        self.assertTrue(paginador.estimado)
+        self.assertEqual(len(pagina), 10)
+        self.assertTrue(pagina.has_next())
+
+        paginador = PaginadorEstimado(self.qs, 10, limiar=0)
+        pagina = paginador.page(3)
+        self.assertEqual([m.codigo for m in pagina], ["M20", "M21", "M22"])
+        self.assertFalse(paginador.estimado)
+        self.assertEqual(paginador.count, 23)
+        self.assertFalse(pagina.has_next())
+
+        with self.assertRaises(EmptyPage):
+            PaginadorEstimado(self.qs, 10, limiar=0).page(9)
+
+    @override_settings(PAGINACAO_LIMIAR_ESTIMATIVA=0)
+    def test_list_view(self):
+        self.client.force_login(get_user_model().objects.create_user(username="u", password="x"))
+        resposta = self.client.get(reverse("contabill:moedas_lista"), {"page": 2})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIsInstance(resposta.context["paginator"], PaginadorEstimado)
+        self.assertEqual(len(resposta.context["object_list"]), 10)
@@ -0,0 +1,136 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contabill.models import (
+    CentroCusto,
+    LancamentoItem,
+    ModeloRateio,
+    RateioLancamentoItemCentroCusto,
+    RateioLancamentoItemProjeto,
+    SaldoCentroCustoPeriodo,
+)
+from contabill.services.rateio import ModelosRateio, aplicar_modelos, dividir
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class DividirTests(SimpleTestCase):
+    def test_maiores_restos(self):
+        self.assertEqual(
+            dividir(Decimal("100"), [Decimal("33.3333")] * 3),
+            [Decimal("33.34"), Decimal("33.33"), Decimal("33.33")],
+        )
+        self.assertEqual(dividir(Decimal("0.01"), [50, 50]), [Decimal("0.01"), Decimal("0.00")])
+        self.assertEqual(dividir(Decimal("10"), [1, 2, 1]), [Decimal("2.50"), Decimal("5.00"), Decimal("2.50")])
+
+    def test_partes_somam_o_valor(self):
+        percentuais = [Decimal("12.5"), Decimal("37.1234"), Decimal("50.3766")]
+        for centavos in range(1, 2000, 7):
+            valor = Decimal(centavos) / 100
+            self.assertEqual(sum(dividir(valor, percentuais)), valor)
+
+    def test_percentuais_zerados(self):
+        with self.assertRaises(ValueError):
+            dividir(Decimal("10"), [0, 0])
+
+
+class AplicarModelosTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cc2 = CentroCusto.objects.create(codigo="CC2", descricao="CC 2", tipo="O")
+        modelo = ModeloRateio.objects.create(descricao="Caixa", conta_contabil=self.conta_d)
+        modelo.centros_custo.create(centro_custo=self.cc, percentual=Decimal("70"))
+        modelo.centros_custo.create(centro_custo=self.cc2, percentual=Decimal("30"))
+
+    def lancamento_sem_rateio(self, valor="100.01", quantidade=1):
+        lanc = self.criar_lancamento()
+        for _ in range(quantidade):
+            self.criar_item(lanc, self.conta_d, valor, "D")
+            self.criar_item(lanc, self.conta_c, valor, "C")
+        return lanc
+
+    def rateios_cc(self, item):
+        return sorted(
+            RateioLancamentoItemCentroCusto.objects.filter(lancamento_item=item).values_list(
+                "centro_custo__codigo", "valor"
+            )
+        )
+
+    def test_rateia_em_lote_e_atualiza_saldos(self):
+        pequeno = self.lancamento_sem_rateio(quantidade=2)
+        with CaptureQueriesContext(connection) as consultas_pequeno:
+            aplicar_modelos(LancamentoItem.objects.filter(lancamento=pequeno))
+        lanc = self.lancamento_sem_rateio(quantidade=18)
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = aplicar_modelos(LancamentoItem.objects.filter(lancamento=lanc))
+        self.assertEqual(resultado, {"itens": 18, "cc": 36, "projeto": 0})
+        self.assertEqual(len(consultas), len(consultas_pequeno))
+        item = LancamentoItem.objects.filter(conta_contabil=self.conta_d).first()
+        self.assertEqual(self.rateios_cc(item), [("CC1", Decimal("70.01")), ("CC2", Decimal("30.00"))])
+        saldo_cc2 = SaldoCentroCustoPeriodo.objects.get(
+            saldo_conta_periodo=self.saldo(self.conta_d), centro_custo=self.cc2
+        )
+        self.assertEqual(saldo_cc2.debito, Decimal("600.00"))
+
+    def test_preserva_ou_substitui_rateios_existentes(self):
+        lanc, item_d, _ = self.preparar_lancamento()
+        itens = LancamentoItem.objects.filter(lancamento=lanc)
+        self.assertEqual(aplicar_modelos(itens)["itens"], 0)
+        self.assertEqual(self.rateios_cc(item_d), [("CC1", Decimal("100"))])
+
+        self.assertEqual(aplicar_modelos(itens, substituir=True)["itens"], 1)
+        self.assertEqual(self.rateios_cc(item_d), [("CC1", Decimal("70.00")), ("CC2", Decimal("30.00"))])
+        saldo_cc = SaldoCentroCustoPeriodo.objects.get(
+            saldo_conta_periodo=self.saldo(self.conta_d), centro_custo=self.cc
+        )
+        self.assertEqual(saldo_cc.debito, Decimal("70.00"))
+
+    def test_modelo_mais_especifico_por_tipo(self):
+        especifico = ModeloRateio.objects.create(
+            descricao="Caixa/Hist", conta_contabil=self.conta_d, historico=self.historico
+        )
+        especifico.projetos.create(projeto=self.proj, percentual=Decimal("100"))
+        modelos = ModelosRateio()
+        # o modelo conta+histórico só tem projeto: o CC continua vindo do modelo da conta
+        self.assertEqual(
+            modelos.percentuais_cc(self.conta_d.id, self.historico.id),
+            [(self.cc.id, Decimal("70.0000")), (self.cc2.id, Decimal("30.0000"))],
+        )
+        self.assertEqual(
+            modelos.percentuais_projeto(self.conta_d.id, self.historico.id),
+            [(self.proj.id, Decimal("100.0000"))],
+        )
+        self.assertIsNone(modelos.percentuais_projeto(self.conta_d.id, None))
+        self.assertIsNone(modelos.percentuais_cc(self.conta_c.id, self.historico.id))
+
+        lanc = self.lancamento_sem_rateio(valor="10")
+        aplicar_modelos(LancamentoItem.objects.filter(lancamento=lanc), modelos=modelos)
+        self.assertEqual(
+            list(RateioLancamentoItemProjeto.objects.values_list("projeto_id", "valor")),
+            [(self.proj.id, Decimal("10.00"))],
+        )
+
+    def test_um_modelo_ativo_por_conta_e_historico(self):
+        repetido = ModeloRateio(descricao="Outro", conta_contabil=self.conta_d)
+        with self.assertRaisesMessage(ValidationError, "Já existe um modelo ativo"):
+            repetido.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            repetido.save()
+        repetido.status = False
+        repetido.save()
+        ModeloRateio.objects.create(
+            descricao="Caixa/Hist", conta_contabil=self.conta_d, historico=self.historico
+        )
+
+    def test_view_aplica_e_volta_para_o_lancamento(self):
+        self.client.force_login(self.user)
+        lanc = self.lancamento_sem_rateio()
+        resposta = self.client.post(reverse("contabill:lancamentos_aplicar_rateios", args=[lanc.pk]))
+        self.assertRedirects(
+            resposta, reverse("contabill:lancamentos_editar", args=[lanc.pk]), fetch_redirect_response=False
+        )
+        self.assertEqual(RateioLancamentoItemCentroCusto.objects.count(), 2)
@@ -0,0 +1,109 @@
+import csv
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from contabill.models import Filial, LancamentoItem, Periodo
+from contabill.services.razao import razao, saldo_abertura
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class RazaoTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.filial2 = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Filial 2")
+        self.fevereiro = Periodo.objects.create(
+            codigo="202402",
+            data_inicio=date(2024, 2, 1),
+            data_fim=date(2024, 2, 29),
+            empresa=self.empresa,
+            status="A",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="100", data=date(2024, 1, 5))
+            self.preparar_lancamento(valor="30", data=date(2024, 1, 20))
+            self.preparar_lancamento(valor="7", data=date(2024, 1, 8), filial=self.filial2)
+            self.preparar_lancamento(valor="5", data=date(2024, 2, 3))
+
+    def test_saldo_abertura(self):
+        # início de período: só o saldo inicial materializado
+        self.assertEqual(saldo_abertura(self.conta_d, date(2024, 2, 1), filial_id=self.filial.id), Decimal("130"))
+        # meio do período: saldo inicial + movimento desde o início do período
+        self.assertEqual(saldo_abertura(self.conta_d, date(2024, 1, 10), filial_id=self.filial.id), Decimal("100"))
+        self.assertEqual(saldo_abertura(self.conta_d, date(2024, 1, 10), empresa_id=self.empresa.id), Decimal("107"))
+        self.assertEqual(saldo_abertura(self.conta_c, date(2024, 2, 10), filial_id=self.filial.id), Decimal("-135"))
+
+    def test_saldo_acumulado(self):
+        linhas = list(razao(self.conta_d, date(2024, 1, 10), date(2024, 2, 29), filial_id=self.filial.id))
+        self.assertEqual(linhas[0]["descricao"], "Saldo anterior")
+        self.assertEqual(linhas[0]["saldo"], Decimal("100"))
+        self.assertEqual(
+            [(l["data"], l["debito"], l["saldo"]) for l in linhas[1:]],
+            [(date(2024, 1, 20), Decimal("30"), Decimal("130")), (date(2024, 2, 3), Decimal("5"), Decimal("135"))],
+        )
+
+    def test_sintetica_por_empresa_em_lotes(self):
+        linhas = list(
+            razao(self.n4, date(2024, 1, 1), date(2024, 1, 31), empresa_id=self.empresa.id, tamanho_lote=1)
+        )
+        self.assertEqual(len(linhas), 7)
+        self.assertEqual({l["conta"] for l in linhas[1:]}, {self.conta_d.codigo, self.conta_c.codigo})
+        self.assertEqual(linhas[-1]["saldo"], Decimal("0"))
+        with self.assertRaises(ValueError):
+            next(razao(self.n4, date(2024, 1, 31), date(2024, 1, 1), empresa_id=self.empresa.id))
+
+
+class RazaoPeriodoGlobalTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Periodo.objects.filter(pk=self.periodo.pk).update(empresa=None)
+        Periodo.objects.create(
+            codigo="202402", data_inicio=date(2024, 2, 1), data_fim=date(2024, 2, 29), status="A"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="100", data=date(2024, 1, 5))
+            self.preparar_lancamento(valor="5", data=date(2024, 2, 3))
+
+    def test_saldo_abertura_usa_o_periodo_global(self):
+        itens = LancamentoItem._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            saldo = saldo_abertura(self.conta_d, date(2024, 2, 1), filial_id=self.filial.id)
+        self.assertEqual(saldo, Decimal("100"))
+        # o saldo inicial do período basta: o histórico de itens não é lido
+        self.assertFalse([q for q in consultas.captured_queries if itens in q["sql"]])
+        self.assertEqual(
+            saldo_abertura(self.conta_d, date(2024, 2, 10), empresa_id=self.empresa.id), Decimal("105")
+        )
+
+
+class RazaoViewTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.preparar_lancamento(valor="100")
+        self.client.force_login(self.user)
+        self.url = reverse("contabill:relatorios_razao")
+        self.filtros = {
+            "conta": self.conta_d.id,
+            "filial": self.filial.id,
+            "data_inicio": "2024-01-01",
+            "data_fim": "2024-01-31",
+        }
+
+    def test_tela(self):
+        resposta = self.client.get(self.url, self.filtros)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.context["linhas"]), 2)
+        self.assertFalse(resposta.context["truncado"])
+
+    def test_exporta_csv(self):
+        resposta = self.client.get(self.url, {**self.filtros, "exportar": "csv"})
+        self.assertTrue(resposta.streaming)
+        conteudo = b"".join(resposta.streaming_content).decode("utf-8-sig")
+        linhas = list(csv.reader(io.StringIO(conteudo), delimiter=";"))
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[2][-3:], ["100,00", "0,00", "100,00"])
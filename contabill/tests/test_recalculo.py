@@ -0,0 +1,150 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+
+from contabill.models import Filial, Periodo, SaldoContaPeriodo
+from contabill.services import recalculo
+from contabill.services.recalculo import periodos_da_empresa, recalcular_em_paralelo
+from contabill.tests.test_saldo import SaldoBaseTestCase, SaldoFixturesMixin
+
+
+@override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+class RecalculoParaleloTests(SaldoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.filial2 = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Filial 2")
+        self.fevereiro = Periodo.objects.create(
+            codigo="202402",
+            data_inicio=date(2024, 2, 1),
+            data_fim=date(2024, 2, 29),
+            empresa=self.empresa,
+            status="F",
+        )
+        self.preparar_lancamento(valor="100")
+        self.preparar_lancamento(valor="30", filial=self.filial2)
+        self.preparar_lancamento(valor="5", data=date(2024, 2, 3))
+
+    def test_periodos_da_empresa(self):
+        self.assertEqual(periodos_da_empresa(self.empresa.id), [self.periodo, self.fevereiro])
+        self.assertEqual(periodos_da_empresa(self.empresa.id, somente_abertos=True), [self.periodo])
+        self.assertEqual(periodos_da_empresa(self.empresa.id, inicio="202402"), [self.fevereiro])
+
+    def test_periodos_globais(self):
+        Periodo.objects.filter(empresa=self.empresa).update(empresa=None)
+        self.periodo.refresh_from_db()
+        self.fevereiro.refresh_from_db()
+        self.assertEqual(periodos_da_empresa(self.empresa.id), [self.periodo, self.fevereiro])
+        self.assertEqual(periodos_da_empresa(self.empresa.id, inicio="202402"), [self.fevereiro])
+        self.assertEqual(periodos_da_empresa(self.empresa.id, fim="202401"), [self.periodo])
+        with self.assertRaises(Periodo.DoesNotExist):
+            periodos_da_empresa(self.empresa.id, inicio="209912")
+
+        resultado = recalcular_em_paralelo(
+            self.empresa.id, periodos_da_empresa(self.empresa.id), processos=1
+        )
+        self.assertEqual(len(resultado["unidades"]), 4)
+        self.assertIsNone(resultado["encadeamento"]["erro"])
+        fev = self.saldo(self.conta_d, self.fevereiro)
+        self.assertEqual((fev.saldo_inicial, fev.saldo_final), (Decimal("100"), Decimal("105")))
+
+    def test_recalcula_unidades_e_encadeia(self):
+        progresso = []
+        resultado = recalcular_em_paralelo(
+            self.empresa.id,
+            periodos_da_empresa(self.empresa.id),
+            processos=1,
+            progresso=lambda n, total, r: progresso.append((n, total)),
+        )
+        self.assertEqual(progresso[-1], (4, 4))
+        self.assertFalse([r for r in resultado["unidades"] if r["erro"]])
+        self.assertIsNone(resultado["encadeamento"]["erro"])
+        fev = self.saldo(self.conta_d, self.fevereiro)
+        self.assertEqual((fev.saldo_inicial, fev.saldo_final), (Decimal("100"), Decimal("105")))
+        self.assertEqual(
+            SaldoContaPeriodo.objects.get(
+                conta_contabil=self.n1, filial=self.filial2, periodo=self.periodo
+            ).debito,
+            Decimal("30"),
+        )
+
+    def test_falha_de_uma_unidade_nao_interrompe_as_demais(self):
+        original = recalculo.recalcular_saldos_por_periodo
+
+        def falhar_filial2(filial_id, periodo_id):
+            if filial_id == self.filial2.id:
+                raise RuntimeError("boom")
+            return original(filial_id, periodo_id)
+
+        with mock.patch.object(recalculo, "recalcular_saldos_por_periodo", falhar_filial2):
+            resultado = recalcular_em_paralelo(
+                self.empresa.id, periodos_da_empresa(self.empresa.id), processos=1
+            )
+        falhas = [r for r in resultado["unidades"] if r["erro"]]
+        self.assertEqual(len(falhas), 2)
+        self.assertIn("boom", falhas[0]["erro"])
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("100"))
+
+    def test_unidades_de_pool_quebrado_sao_refeitas_em_serie(self):
+        class PoolQuebrado:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def submit(self, funcao, *args):
+                futuro = Future()
+                futuro.set_exception(BrokenProcessPool("processo encerrado"))
+                return futuro
+
+        progresso = []
+        with mock.patch.object(recalculo, "ProcessPoolExecutor", PoolQuebrado), mock.patch.object(
+            recalculo.connections, "close_all"
+        ):
+            resultado = recalcular_em_paralelo(
+                self.empresa.id,
+                periodos_da_empresa(self.empresa.id),
+                processos=2,
+                progresso=lambda n, total, r: progresso.append((n, total)),
+            )
+        self.assertEqual(progresso[-1], (4, 4))
+        self.assertTrue(all(r["reexecutada"] and not r["erro"] for r in resultado["unidades"]))
+        fev = self.saldo(self.conta_d, self.fevereiro)
+        self.assertEqual((fev.saldo_inicial, fev.saldo_final), (Decimal("100"), Decimal("105")))
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command(
+            "recalcular_saldos", str(self.empresa.id), "--abertos", "--processos", "1", stdout=saida
+        )
+        self.assertIn("2/2 unidades recalculadas", saida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("recalcular_saldos", str(self.empresa.id), "--inicio", "209912", stdout=saida)
+
+
+@override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+class RecalculoPoolTests(SaldoFixturesMixin, TransactionTestCase):
+    def test_pool_de_processos(self):
+        filial2 = Filial.objects.create(empresa=self.empresa, codigo="002", descricao="Filial 2")
+        self.preparar_lancamento(valor="100")
+        self.preparar_lancamento(valor="7", filial=filial2)
+        resultado = recalcular_em_paralelo(
+            self.empresa.id, periodos_da_empresa(self.empresa.id), processos=2
+        )
+        self.assertEqual(len(resultado["unidades"]), 2)
+        self.assertFalse([r for r in resultado["unidades"] if r["erro"]])
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("100"))
+        self.assertEqual(
+            SaldoContaPeriodo.objects.get(conta_contabil=self.n1, filial=filial2).credito,
+            Decimal("7"),
+        )
@@ -0,0 +1,388 @@
+from decimal import Decimal
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from contabill.models import (
+    ContaContabil,
+    CentroCusto,
+    Projeto,
+    Filial,
+    Moeda,
+    HistoricoPadrao,
+    Periodo,
+    LancamentoContabil,
+    LancamentoItem,
+    RateioLancamentoItemCentroCusto,
+    RateioLancamentoItemProjeto,
+    SaldoContaPeriodo,
+    SaldoCentroCustoPeriodo,
+    SaldoProjetoPeriodo,
+    TarefaRecalculoSaldo,
+)
+from contabill.tests import criar_empresa
+from contabill.services.saldo import (
+    materializar_sinteticas,
+    propagar_saldos_iniciais,
+    recalcular_periodo,
+    recalcular_saldos_por_periodo,
+    recalcular_rateios_cc_projeto,
+)
+
+
+class SaldoFixturesMixin:
+    """Plano de contas mínimo (1 > 1.01 > 1.01.02 > 1.01.02.003 > analíticas)."""
+
+    def setUp(self):
+        self.empresa = criar_empresa()
+        self.filial = Filial.objects.create(empresa=self.empresa, codigo="001", descricao="Filial")
+        self.moeda = Moeda.objects.create(codigo="BRL", descricao="Real", simbolo="R$")
+        self.historico = HistoricoPadrao.objects.create(descricao="Hist", tipo="padrao")
+        self.periodo = Periodo.objects.create(
+            codigo="202401",
+            data_inicio=date(2024, 1, 1),
+            data_fim=date(2024, 1, 31),
+            empresa=self.empresa,
+            status="A",
+        )
+        self.user = get_user_model().objects.create_user(username="user", password="123")
+
+        self.n1 = ContaContabil.objects.create(codigo="1", descricao="Ativo", tipo="S", natureza="D", nivel=1)
+        self.n2 = ContaContabil.objects.create(
+            codigo="1.01", descricao="Circulante", tipo="S", natureza="D", nivel=2, conta_pai=self.n1
+        )
+        self.n3 = ContaContabil.objects.create(
+            codigo="1.01.02", descricao="Disponível", tipo="S", natureza="D", nivel=3, conta_pai=self.n2
+        )
+        self.n4 = ContaContabil.objects.create(
+            codigo="1.01.02.003", descricao="Caixa", tipo="S", natureza="D", nivel=4, conta_pai=self.n3
+        )
+        self.conta_d = ContaContabil.objects.create(
+            codigo="1.01.02.003.0001", descricao="Conta D", tipo="A", natureza="D",
+            nivel=5, conta_pai=self.n4, classificacao="R",
+        )
+        self.conta_c = ContaContabil.objects.create(
+            codigo="1.01.02.003.0002", descricao="Conta C", tipo="A", natureza="D",
+            nivel=5, conta_pai=self.n4, classificacao="R",
+        )
+        self.cc = CentroCusto.objects.create(codigo="CC1", descricao="CC", tipo="O")
+        self.proj = Projeto.objects.create(
+            codigo="P1",
+            descricao="Proj",
+            data_inicio=date(2024, 1, 1),
+            data_fim=date(2024, 12, 31),
+        )
+
+    def criar_lancamento(self, data=date(2024, 1, 5), filial=None):
+        return LancamentoContabil.objects.create(
+            data_lancamento=data,
+            data_competencia=data,
+            tipo_lancamento="0",
+            origem="0",
+            filial=filial or self.filial,
+            usuario=self.user,
+        )
+
+    def criar_item(self, lancamento, conta, valor, tipo_dc):
+        return LancamentoItem.objects.create(
+            lancamento=lancamento,
+            conta_contabil=conta,
+            filial=lancamento.filial,
+            moeda=self.moeda,
+            valor=Decimal(valor),
+            tipo_dc=tipo_dc,
+            historico=self.historico,
+        )
+
+    def preparar_lancamento(self, valor="100", data=date(2024, 1, 5), filial=None):
+        lanc = self.criar_lancamento(data=data, filial=filial)
+        item_d = self.criar_item(lanc, self.conta_d, valor, "D")
+        item_c = self.criar_item(lanc, self.conta_c, valor, "C")
+        RateioLancamentoItemCentroCusto.objects.create(
+            lancamento_item=item_d, centro_custo=self.cc, valor=Decimal(valor)
+        )
+        RateioLancamentoItemCentroCusto.objects.create(
+            lancamento_item=item_c, centro_custo=self.cc, valor=Decimal(valor)
+        )
+        return lanc, item_d, item_c
+
+    def saldo(self, conta, periodo=None):
+        return SaldoContaPeriodo.objects.get(
+            conta_contabil=conta, filial=self.filial, periodo=periodo or self.periodo
+        )
+
+
+class SaldoBaseTestCase(SaldoFixturesMixin, TestCase):
+    pass
+
+
+@override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+class RecalcularSaldosTests(SaldoBaseTestCase):
+    def test_insere_e_atualiza_em_lote(self):
+        self.preparar_lancamento()
+        inseridos, atualizados = recalcular_saldos_por_periodo(self.filial.id, self.periodo.id)
+        self.assertEqual((inseridos, atualizados), (2, 0))
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("100"))
+        self.assertEqual(self.saldo(self.conta_c).saldo_final, Decimal("-100"))
+
+        self.preparar_lancamento(valor="50")
+        inseridos, atualizados = recalcular_saldos_por_periodo(self.filial.id, self.periodo.id)
+        self.assertEqual((inseridos, atualizados), (0, 2))
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("150"))
+
+    def test_preserva_saldo_inicial_e_zera_contas_sem_movimento(self):
+        lanc, _, _ = self.preparar_lancamento()
+        recalcular_saldos_por_periodo(self.filial.id, self.periodo.id)
+        SaldoContaPeriodo.objects.filter(conta_contabil=self.conta_d).update(saldo_inicial=Decimal("10"))
+
+        lanc.status = False
+        lanc.save()
+        recalcular_saldos_por_periodo(self.filial.id, self.periodo.id)
+        saldo = self.saldo(self.conta_d)
+        self.assertEqual(saldo.debito, Decimal("0"))
+        self.assertEqual(saldo.saldo_final, Decimal("10"))
+
+    def test_ignora_outros_periodos(self):
+        self.preparar_lancamento(data=date(2024, 2, 5))
+        self.assertEqual(recalcular_saldos_por_periodo(self.filial.id, self.periodo.id), (0, 0))
+
+    def test_rateios_cc_projeto(self):
+        _, item_d, _ = self.preparar_lancamento()
+        RateioLancamentoItemProjeto.objects.create(
+            lancamento_item=item_d, projeto=self.proj, valor=Decimal("100")
+        )
+        resultado = recalcular_rateios_cc_projeto(self.filial.id, self.periodo.id)
+        self.assertEqual(resultado, {"cc": (2, 0), "projeto": (1, 0)})
+        saldo_cc = SaldoCentroCustoPeriodo.objects.get(
+            saldo_conta_periodo=self.saldo(self.conta_d), centro_custo=self.cc
+        )
+        self.assertEqual(saldo_cc.debito, Decimal("100"))
+        saldo_proj = SaldoProjetoPeriodo.objects.get(
+            saldo_conta_periodo=self.saldo(self.conta_d), projeto=self.proj
+        )
+        self.assertEqual(saldo_proj.saldo_final, Decimal("100"))
+
+
+class SaldoIncrementalTests(SaldoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fevereiro = Periodo.objects.create(
+            codigo="202402",
+            data_inicio=date(2024, 2, 1),
+            data_fim=date(2024, 2, 29),
+            empresa=self.empresa,
+            status="A",
+        )
+
+    def fotografar(self):
+        contas = sorted(
+            SaldoContaPeriodo.objects.values_list(
+                "conta_contabil_id", "periodo_id", "debito", "credito", "saldo_final"
+            )
+        )
+        ccs = sorted(
+            SaldoCentroCustoPeriodo.objects.values_list(
+                "saldo_conta_periodo__conta_contabil_id", "centro_custo_id", "periodo_id",
+                "debito", "credito",
+            )
+        )
+        projetos = sorted(
+            SaldoProjetoPeriodo.objects.values_list(
+                "saldo_conta_periodo__conta_contabil_id", "projeto_id", "periodo_id",
+                "debito", "credito",
+            )
+        )
+        return contas, ccs, projetos
+
+    def assertIgualRecalculo(self):
+        incremental = self.fotografar()
+        for periodo in (self.periodo, self.fevereiro):
+            recalcular_saldos_por_periodo(self.filial.id, periodo.id)
+            recalcular_rateios_cc_projeto(self.filial.id, periodo.id)
+        self.assertEqual(incremental, self.fotografar())
+
+    def test_criacao_de_itens_e_rateios(self):
+        _, item_d, _ = self.preparar_lancamento()
+        RateioLancamentoItemProjeto.objects.create(
+            lancamento_item=item_d, projeto=self.proj, valor=Decimal("100")
+        )
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("100"))
+        self.assertEqual(self.saldo(self.conta_c).saldo_final, Decimal("-100"))
+        self.assertEqual(
+            SaldoProjetoPeriodo.objects.get(projeto=self.proj, periodo=self.periodo).debito, Decimal("100")
+        )
+        self.assertIgualRecalculo()
+
+    def test_edicao_desativacao_e_exclusao_de_item(self):
+        lanc, item_d, item_c = self.preparar_lancamento()
+        item_d.valor = Decimal("80")
+        item_d.save()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("80"))
+
+        item_c.status = False
+        item_c.save()
+        self.assertEqual(self.saldo(self.conta_c).credito, Decimal("0"))
+
+        item_d.delete()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("0"))
+        self.assertIgualRecalculo()
+
+    def test_mudanca_de_competencia_move_saldo_de_periodo(self):
+        lanc, _, _ = self.preparar_lancamento()
+        lanc.data_competencia = date(2024, 2, 10)
+        lanc.save()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("0"))
+        self.assertEqual(self.saldo(self.conta_d, self.fevereiro).debito, Decimal("100"))
+        self.assertIgualRecalculo()
+
+    def test_desativacao_e_exclusao_do_lancamento(self):
+        lanc, _, _ = self.preparar_lancamento()
+        self.preparar_lancamento(valor="30")
+        lanc.status = False
+        lanc.save()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("30"))
+        lanc.status = True
+        lanc.save()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("130"))
+        lanc.delete()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("30"))
+        self.assertIgualRecalculo()
+
+    def test_data_fora_de_periodo_nao_gera_saldo(self):
+        self.preparar_lancamento(data=date(2023, 6, 1))
+        self.assertFalse(SaldoContaPeriodo.objects.exists())
+
+
+class SaldoInicialEncadeadoTests(SaldoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fevereiro = Periodo.objects.create(
+            codigo="202402",
+            data_inicio=date(2024, 2, 1),
+            data_fim=date(2024, 2, 29),
+            empresa=self.empresa,
+            status="A",
+        )
+        self.marco = Periodo.objects.create(
+            codigo="202403",
+            data_inicio=date(2024, 3, 1),
+            data_fim=date(2024, 3, 31),
+            empresa=self.empresa,
+            status="A",
+        )
+
+    @override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+    def test_encadeia_periodos_e_cria_linhas_transportadas(self):
+        self.preparar_lancamento(valor="100")
+        self.preparar_lancamento(valor="50", data=date(2024, 2, 10))
+        for periodo in (self.periodo, self.fevereiro, self.marco):
+            recalcular_saldos_por_periodo(self.filial.id, periodo.id)
+            recalcular_rateios_cc_projeto(self.filial.id, periodo.id)
+        SaldoContaPeriodo.objects.filter(
+            conta_contabil=self.conta_d, periodo=self.periodo
+        ).update(saldo_inicial=Decimal("1000"), saldo_final=Decimal("1100"))
+
+        resultado = propagar_saldos_iniciais(self.empresa.id)
+        self.assertEqual(resultado["conta"][0], 2)  # março: conta D e conta C
+
+        fev = self.saldo(self.conta_d, self.fevereiro)
+        self.assertEqual((fev.saldo_inicial, fev.saldo_final), (Decimal("1100"), Decimal("1150")))
+        mar = self.saldo(self.conta_d, self.marco)
+        self.assertEqual((mar.saldo_inicial, mar.debito, mar.saldo_final),
+                         (Decimal("1150"), Decimal("0"), Decimal("1150")))
+        self.assertEqual(self.saldo(self.conta_c, self.marco).saldo_inicial, Decimal("-150"))
+        cc_mar = SaldoCentroCustoPeriodo.objects.get(
+            saldo_conta_periodo=mar, centro_custo=self.cc
+        )
+        self.assertEqual(cc_mar.saldo_inicial, Decimal("150"))
+
+    @override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+    def test_recalculo_de_periodo_antigo_propaga_adiante(self):
+        self.preparar_lancamento(valor="100")
+        for periodo in (self.periodo, self.fevereiro, self.marco):
+            recalcular_periodo(self.filial.id, periodo.id)
+        self.assertEqual(self.saldo(self.conta_d, self.marco).saldo_inicial, Decimal("100"))
+
+        self.preparar_lancamento(valor="20")
+        recalcular_periodo(self.filial.id, self.periodo.id)
+        self.assertEqual(self.saldo(self.conta_d, self.fevereiro).saldo_inicial, Decimal("120"))
+        self.assertEqual(self.saldo(self.conta_d, self.marco).saldo_final, Decimal("120"))
+
+    def test_delta_em_periodo_antigo_ajusta_periodos_seguintes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preparar_lancamento(valor="50", data=date(2024, 3, 10))
+            _, item_d, _ = self.preparar_lancamento(valor="100")
+        self.assertEqual(self.saldo(self.conta_d, self.fevereiro).saldo_inicial, Decimal("100"))
+        mar = self.saldo(self.conta_d, self.marco)
+        self.assertEqual((mar.saldo_inicial, mar.saldo_final), (Decimal("100"), Decimal("150")))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            item_d.delete()
+        # o encadeamento fica para o commit, uma vez por transação
+        mar = self.saldo(self.conta_d, self.marco)
+        self.assertEqual((mar.saldo_inicial, mar.saldo_final), (Decimal("100"), Decimal("150")))
+        for callback in callbacks:
+            callback()
+        mar = self.saldo(self.conta_d, self.marco)
+        self.assertEqual((mar.saldo_inicial, mar.saldo_final), (Decimal("0"), Decimal("50")))
+
+    def test_falha_no_encadeamento_vai_para_a_fila(self):
+        with mock.patch("contabill.services.saldo._propagar", side_effect=RuntimeError("boom")):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.preparar_lancamento(valor="100")
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("100"))
+        self.assertEqual(
+            list(TarefaRecalculoSaldo.objects.values_list("filial_id", "periodo_id", "status")),
+            [(self.filial.id, self.periodo.id, "P")],
+        )
+
+
+class ContasSinteticasTests(SaldoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.n4b = ContaContabil.objects.create(
+            codigo="1.01.02.004", descricao="Bancos", tipo="S", natureza="D", nivel=4, conta_pai=self.n3
+        )
+        self.banco = ContaContabil.objects.create(
+            codigo="1.01.02.004.0001", descricao="Banco", tipo="A", natureza="D",
+            nivel=5, conta_pai=self.n4b,
+        )
+
+    def valores(self, conta):
+        saldo = self.saldo(conta)
+        return saldo.debito, saldo.credito, saldo.saldo_final
+
+    @override_settings(CONTABILL_SALDOS_INCREMENTAIS=False)
+    def test_recalculo_materializa_todos_os_niveis(self):
+        lanc, _, _ = self.preparar_lancamento(valor="100")
+        self.criar_item(lanc, self.banco, "40", "D")
+        recalcular_periodo(self.filial.id, self.periodo.id)
+
+        self.assertEqual(self.valores(self.n4), (Decimal("100"), Decimal("100"), Decimal("0")))
+        self.assertEqual(self.valores(self.n4b), (Decimal("40"), Decimal("0"), Decimal("40")))
+        for conta in (self.n3, self.n2, self.n1):
+            self.assertEqual(self.valores(conta), (Decimal("140"), Decimal("100"), Decimal("40")))
+
+    def test_delta_atualiza_apenas_ancestrais(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _, item_d, _ = self.preparar_lancamento(valor="100")
+        self.assertEqual(self.valores(self.n1), (Decimal("100"), Decimal("100"), Decimal("0")))
+        self.assertFalse(SaldoContaPeriodo.objects.filter(conta_contabil=self.n4b).exists())
+
+        # as sintéticas são refeitas uma vez, no commit
+        with self.captureOnCommitCallbacks() as callbacks:
+            item_d.valor = Decimal("70")
+            item_d.save()
+        self.assertEqual(self.valores(self.n1), (Decimal("100"), Decimal("100"), Decimal("0")))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.valores(self.n4), (Decimal("70"), Decimal("100"), Decimal("-30")))
+        self.assertEqual(self.valores(self.n1), (Decimal("70"), Decimal("100"), Decimal("-30")))
+
+    def test_remove_sinteticas_sem_analiticas(self):
+        self.preparar_lancamento(valor="100")
+        SaldoContaPeriodo.objects.filter(conta_contabil__tipo="A").delete()
+        materializar_sinteticas([self.periodo.id])
+        self.assertFalse(SaldoContaPeriodo.objects.exists())
@@ -0,0 +1,150 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from contabill.models import (
+    LancamentoItem,
+    RateioLancamentoItemCentroCusto,
+    RateioLancamentoItemProjeto,
+)
+from contabill.services.validacao import (
+    ERRO_BALANCEAMENTO,
+    ERRO_CC_OBRIGATORIO,
+    ERRO_CC_TOTAL,
+    ERRO_PROJETO_TOTAL,
+    erros_rateio,
+    validacao_no_banco,
+    validar_lote,
+)
+from contabill.tests.test_saldo import SaldoFixturesMixin
+
+
+class ValidacaoLoteTests(SaldoFixturesMixin, TestCase):
+    def test_consultas_constantes(self):
+        lanc = self.criar_lancamento()
+        for _ in range(30):
+            for conta, tipo_dc in ((self.conta_d, "D"), (self.conta_c, "C")):
+                item = self.criar_item(lanc, conta, "10", tipo_dc)
+                RateioLancamentoItemCentroCusto.objects.create(
+                    lancamento_item=item, centro_custo=self.cc, valor=Decimal("10")
+                )
+        with CaptureQueriesContext(connection) as consultas:
+            lanc.validar()
+        self.assertEqual(len(consultas), 2)
+
+    def test_erros_por_lancamento(self):
+        valido, _, _ = self.preparar_lancamento()
+
+        sem_rateio = self.criar_lancamento()
+        self.criar_item(sem_rateio, self.conta_d, "100", "D")
+        self.criar_item(sem_rateio, self.conta_c, "60", "C")
+
+        rateios, item_d, item_c = self.preparar_lancamento()
+        RateioLancamentoItemCentroCusto.objects.filter(lancamento_item=item_d).update(valor=Decimal("90"))
+        RateioLancamentoItemProjeto.objects.create(lancamento_item=item_c, projeto=self.proj, valor=Decimal("40"))
+        inativo = self.criar_item(rateios, self.conta_d, "5", "D")
+        inativo.status = False
+        inativo.save()
+
+        erros = validar_lote([valido.id, sem_rateio.id, rateios.id], tamanho_lote=2)
+        self.assertEqual(erros[valido.id], [])
+        self.assertEqual(len(erros[sem_rateio.id]), 3)
+        self.assertTrue(all(ERRO_CC_OBRIGATORIO in e for e in erros[sem_rateio.id][:2]))
+        self.assertIn(ERRO_BALANCEAMENTO, erros[sem_rateio.id][2])
+        self.assertEqual(
+            erros[rateios.id],
+            [
+                f"Item {item_d.id} (conta {self.conta_d.codigo}): {ERRO_CC_TOTAL}",
+                f"Item {item_c.id} (conta {self.conta_c.codigo}): {ERRO_PROJETO_TOTAL}",
+            ],
+        )
+
+    def test_validar_e_validar_rateios(self):
+        lanc, item_d, _ = self.preparar_lancamento()
+        RateioLancamentoItemProjeto.objects.create(lancamento_item=item_d, projeto=self.proj, valor=Decimal("1"))
+        with self.assertRaises(ValidationError) as ctx:
+            lanc.validar()
+        self.assertEqual(len(ctx.exception.messages), 1)
+        with self.assertRaisesMessage(ValidationError, ERRO_PROJETO_TOTAL):
+            item_d.validar_rateios()
+
+    def test_validar_rateios_confere_item_inativo(self):
+        lanc = self.criar_lancamento()
+        item = self.criar_item(lanc, self.conta_d, "10", "D")
+        LancamentoItem.objects.filter(pk=item.pk).update(status=False)
+        with self.assertRaisesMessage(ValidationError, ERRO_CC_OBRIGATORIO):
+            item.validar_rateios()
+        self.assertEqual(list(erros_rateio(LancamentoItem.objects.filter(pk=item.pk))), [])
+
+    def test_validar_rateios_usa_o_item_em_memoria(self):
+        _, item_d, _ = self.preparar_lancamento()
+        item_d.validar_rateios()
+        # alterado e ainda não gravado: o rateio de 100 não fecha mais
+        item_d.valor = Decimal("90")
+        with self.assertRaisesMessage(ValidationError, ERRO_CC_TOTAL):
+            item_d.validar_rateios()
+        novo = LancamentoItem(lancamento=item_d.lancamento, conta_contabil=self.conta_d, valor=Decimal("5"))
+        with self.assertRaisesMessage(ValidationError, ERRO_CC_OBRIGATORIO):
+            novo.validar_rateios()
+
+
+class ValidacaoNoBancoTests(SaldoFixturesMixin, TestCase):
+    def conferir(self):
+        """Dispara agora os triggers adiados (o TestCase nunca faz commit)."""
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+
+    def test_lancamento_valido(self):
+        with validacao_no_banco():
+            lanc, item_d, _ = self.preparar_lancamento()
+            RateioLancamentoItemProjeto.objects.create(lancamento_item=item_d, projeto=self.proj, valor=Decimal("100"))
+        self.conferir()
+
+    def test_desbalanceado(self):
+        with self.assertRaisesMessage(IntegrityError, "débitos e créditos não estão balanceados"):
+            with transaction.atomic():
+                with validacao_no_banco():
+                    lanc, _, item_c = self.preparar_lancamento()
+                    item_c.valor = Decimal("90")
+                    item_c.save()
+                self.conferir()
+
+    def test_rateios(self):
+        with self.assertRaisesMessage(IntegrityError, "rateio de centro de custo obrigatório"):
+            with transaction.atomic():
+                with validacao_no_banco():
+                    lanc = self.criar_lancamento()
+                    self.criar_item(lanc, self.conta_d, "10", "D")
+                    self.criar_item(lanc, self.conta_c, "10", "C")
+                self.conferir()
+
+        _, item_d, _ = self.preparar_lancamento()
+        with self.assertRaisesMessage(IntegrityError, "rateios de projeto não fecham"):
+            with transaction.atomic():
+                with validacao_no_banco():
+                    RateioLancamentoItemProjeto.objects.create(
+                        lancamento_item=item_d, projeto=self.proj, valor=Decimal("1")
+                    )
+                self.conferir()
+
+    def test_reconfere_depois_de_set_constraints_immediate(self):
+        with self.assertRaisesMessage(IntegrityError, "débitos e créditos não estão balanceados"):
+            with transaction.atomic():
+                with validacao_no_banco():
+                    lanc, _, item_c = self.preparar_lancamento()
+                    self.conferir()
+                    # mesmo lançamento, já conferido nesta transação
+                    item_c.valor = Decimal("90")
+                    item_c.save()
+                self.conferir()
+
+    def test_desligada_fora_do_bloco(self):
+        with validacao_no_banco():
+            pass
+        lanc = self.criar_lancamento()
+        self.criar_item(lanc, self.conta_d, "10", "D")
+        self.conferir()
@@ -39,11 +39,16 @@ from .views.lancamentos import (
     LancamentoContabilCreateView,
     LancamentoContabilUpdateView,
     LancamentoContabilDeleteView,
+    AplicarModelosRateioView,
     RecalcularSaldoView,
+    RecalculosHX,
+    RecalculoStatusView,
     LancamentoItemCreateHX,
+    EscolhasBuscaView,
     RateioCentroCustoView,
     RateioProjetoView,
 )
+from .views.relatorios import BalanceteView, DREView, RazaoView
 
 app_name = "contabill"
 
@@ -100,16 +105,36 @@ urlpatterns = [
         LancamentoContabilDeleteView.as_view(),
         name="lancamentos_excluir",
     ),
+    path(
+        "lancamentos/<int:pk>/aplicar-rateios/",
+        AplicarModelosRateioView.as_view(),
+        name="lancamentos_aplicar_rateios",
+    ),
     path(
         "lancamentos/recalcular-saldo/",
         RecalcularSaldoView.as_view(),
         name="lancamentos_recalcular_saldo",
     ),
+    path(
+        "lancamentos/recalculos/",
+        RecalculosHX.as_view(),
+        name="lancamentos_recalculos",
+    ),
+    path(
+        "lancamentos/recalculos/<int:pk>/",
+        RecalculoStatusView.as_view(),
+        name="lancamentos_recalculo_status",
+    ),
     path(
         "lancamentos/item/novo/",
         LancamentoItemCreateHX.as_view(),
         name="lancamentos_item_create",
     ),
+    path(
+        "lancamentos/escolhas/<str:fonte>/",
+        EscolhasBuscaView.as_view(),
+        name="lancamentos_escolhas",
+    ),
     path(
         "lancamentos/rateio-cc/",
         RateioCentroCustoView.as_view(),
@@ -130,4 +155,8 @@ urlpatterns = [
         RateioProjetoView.as_view(),
         name="lancamentos_rateio_projeto_save",
     ),
+
+    path("relatorios/balancete/", BalanceteView.as_view(), name="relatorios_balancete"),
+    path("relatorios/razao/", RazaoView.as_view(), name="relatorios_razao"),
+    path("relatorios/dre/", DREView.as_view(), name="relatorios_dre"),
 ]
@@ -5,6 +5,8 @@ from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from urllib.parse import urlencode
 
+from velzon.paginacao import PaginadorEstimado
+
 from ..models import (
     ContaContabil,
     CentroCusto,
@@ -32,6 +34,7 @@ class ContaContabilListView(LoginRequiredMixin, ListView):
     model = ContaContabil
     template_name = "contabill/contas/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -110,6 +113,7 @@ class CentroCustoListView(LoginRequiredMixin, ListView):
     model = CentroCusto
     template_name = "contabill/centros/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -160,6 +164,7 @@ class GrupoEmpresarialListView(LoginRequiredMixin, ListView):
     model = GrupoEmpresarial
     template_name = "contabill/grupos/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -209,6 +214,7 @@ class FilialListView(LoginRequiredMixin, ListView):
     model = Filial
     template_name = "contabill/filiais/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -261,6 +267,7 @@ class ProjetoListView(LoginRequiredMixin, ListView):
     model = Projeto
     template_name = "contabill/projetos/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -316,6 +323,7 @@ class MoedaListView(LoginRequiredMixin, ListView):
     model = Moeda
     template_name = "contabill/moedas/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -365,6 +373,7 @@ class HistoricoPadraoListView(LoginRequiredMixin, ListView):
     model = HistoricoPadrao
     template_name = "contabill/historicos/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -417,6 +426,7 @@ class PeriodoListView(LoginRequiredMixin, ListView):
     model = Periodo
     template_name = "contabill/periodos/lista.html"
     paginate_by = 10
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         qs = super().get_queryset()
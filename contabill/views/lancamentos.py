@@ -1,12 +1,17 @@
+from datetime import date
+from decimal import Decimal
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import redirect, render, get_object_or_404
 from django.urls import reverse_lazy
 from django.views import View
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from django.http import HttpResponseBadRequest
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 
 from ..forms.lancamentos import (
     LancamentoContabilForm,
@@ -15,14 +20,170 @@ from ..forms.lancamentos import (
     RateioCentroCustoFormSet,
     RateioProjetoFormSet,
 )
-from ..models import LancamentoContabil, LancamentoItem
-from ..services.saldo import recalcular_saldos_por_periodo, recalcular_rateios_cc_projeto
+from ..models import Filial, LancamentoContabil, LancamentoItem, Periodo, TarefaRecalculoSaldo
+from ..services.escolhas import FONTES, buscar
+from ..services.rateio import aplicar_modelos
+from ..services.recalculo import enfileirar_recalculo
+
+
+def _agregado_itens(expressao, output_field):
+    """Subconsulta com um agregado dos itens ativos do lançamento da linha.
+
+    Correlacionada, roda só para as linhas da página, na mesma consulta.
+    """
+    return Coalesce(
+        Subquery(
+            LancamentoItem.objects.filter(lancamento=OuterRef("pk"), status=True)
+            .order_by()
+            .values("lancamento")
+            .annotate(valor=expressao)
+            .values("valor")[:1]
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def _ler_cursor(valor):
+    """``"AAAA-MM-DD.id"`` -> ``(data, id)``; ``None`` se ausente ou inválido."""
+    try:
+        data, pk = (valor or "").split(".")
+        return date.fromisoformat(data), int(pk)
+    except ValueError:
+        return None
+
+
+class _PaginaCursor:
+    """Página da paginação por cursor, com a interface usada pelo template."""
+
+    def __init__(self, object_list, has_previous, has_next):
+        self.object_list = object_list
+        self.has_previous = has_previous and bool(object_list)
+        self.has_next = has_next and bool(object_list)
+
+    @staticmethod
+    def _cursor(obj):
+        return f"{obj.data_competencia.isoformat()}.{obj.pk}"
+
+    @property
+    def cursor_anterior(self):
+        return self._cursor(self.object_list[0])
+
+    @property
+    def cursor_proximo(self):
+        return self._cursor(self.object_list[-1])
 
 
 class LancamentoContabilListView(LoginRequiredMixin, ListView):
+    """Lançamentos do mais recente para o mais antigo, paginados por cursor.
+
+    A ordem é (data_competencia, id) decrescente; ``?apos=`` e ``?antes=``
+    recebem o cursor da última/primeira linha da página, então qualquer
+    página custa o mesmo que a primeira (sem OFFSET nem COUNT).
+    """
+
     model = LancamentoContabil
     template_name = "contabill/lancamentos/lista.html"
     paginate_by = 10
+    PARAMETROS_CURSOR = ("apos", "antes")
+
+    def get_queryset(self):
+        qs = LancamentoContabil.objects.select_related("filial", "usuario")
+        params = self.request.GET
+
+        # Ids inválidos são ignorados, como as datas abaixo.
+        ids = {}
+        for parametro in ("filial", "periodo"):
+            try:
+                ids[parametro] = int(params.get(parametro) or "")
+            except ValueError:
+                continue
+        if "filial" in ids:
+            qs = qs.filter(filial_id=ids["filial"])
+        for parametro, campo in (
+            ("origem", "origem"),
+            ("tipo_lancamento", "tipo_lancamento"),
+            ("documento", "numero_documento"),
+        ):
+            if params.get(parametro):
+                qs = qs.filter(**{campo: params[parametro]})
+        if params.get("status") in ("0", "1"):
+            qs = qs.filter(status=params["status"] == "1")
+
+        # Período e datas viram faixa de data_competencia (índice com a filial).
+        if "periodo" in ids:
+            periodo = Periodo.objects.filter(pk=ids["periodo"]).first()
+            if periodo:
+                qs = qs.filter(data_competencia__range=(periodo.data_inicio, periodo.data_fim))
+        for parametro, lookup in (("data_inicio", "gte"), ("data_fim", "lte")):
+            try:
+                data = date.fromisoformat(params.get(parametro) or "")
+            except ValueError:
+                continue
+            qs = qs.filter(**{f"data_competencia__{lookup}": data})
+
+        q = params.get("q")
+        if q:
+            qs = qs.filter(
+                Q(numero_documento__icontains=q)
+                | Q(descricao__icontains=q)
+                | Q(codigo_externo__icontains=q)
+            )
+
+        valor = DecimalField(max_digits=18, decimal_places=2)
+        return qs.annotate(
+            qtd_itens=_agregado_itens(Count("id"), IntegerField()),
+            total_debito=_agregado_itens(Sum("valor", filter=Q(tipo_dc="D"), default=0), valor),
+            total_credito=_agregado_itens(Sum("valor", filter=Q(tipo_dc="C"), default=0), valor),
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        antes = _ler_cursor(self.request.GET.get("antes"))
+        apos = _ler_cursor(self.request.GET.get("apos"))
+        if antes:
+            data, pk = antes
+            linhas = list(
+                queryset.filter(Q(data_competencia__gt=data) | Q(data_competencia=data, pk__gt=pk))
+                .order_by("data_competencia", "id")[: page_size + 1]
+            )
+            pagina = _PaginaCursor(
+                linhas[:page_size][::-1], has_previous=len(linhas) > page_size, has_next=True
+            )
+        else:
+            if apos:
+                data, pk = apos
+                queryset = queryset.filter(
+                    Q(data_competencia__lt=data) | Q(data_competencia=data, pk__lt=pk)
+                )
+            linhas = list(queryset.order_by("-data_competencia", "-id")[: page_size + 1])
+            pagina = _PaginaCursor(
+                linhas[:page_size], has_previous=bool(apos), has_next=len(linhas) > page_size
+            )
+        return None, pagina, pagina.object_list, pagina.has_previous or pagina.has_next
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["filiais"] = Filial.objects.filter(status=True).order_by("codigo")
+        ctx["periodos"] = Periodo.objects.filter(status="A").order_by("-data_inicio")
+        ctx["periodos_filtro"] = Periodo.objects.order_by("-data_inicio")
+        filtros = self.request.GET.copy()
+        for parametro in self.PARAMETROS_CURSOR:
+            filtros.pop(parametro, None)
+        ctx["filtros_url"] = filtros.urlencode()
+        ctx.update(_contexto_recalculos())
+        return ctx
+
+
+def _totais_itens(lancamento):
+    """Débito, crédito e diferença dos itens ativos, numa consulta agregada."""
+    totais = {"debito": Decimal("0.00"), "credito": Decimal("0.00")}
+    if lancamento.pk:
+        totais = LancamentoItem.objects.filter(lancamento=lancamento, status=True).aggregate(
+            debito=Sum("valor", filter=Q(tipo_dc="D"), default=Decimal("0.00")),
+            credito=Sum("valor", filter=Q(tipo_dc="C"), default=Decimal("0.00")),
+        )
+    totais["diferenca"] = totais["debito"] - totais["credito"]
+    return totais
 
 
 class LancamentoContabilCreateView(LoginRequiredMixin, CreateView):
@@ -36,6 +197,7 @@ class LancamentoContabilCreateView(LoginRequiredMixin, CreateView):
         base_instance = self.object if self.object else LancamentoContabil()
         ctx["itens_formset"] = LancamentoItemFormSet(instance=base_instance, prefix="itens")
         ctx["form_novo"] = LancamentoItemForm(prefix="novo", initial={"moeda": 1, "tipo_dc": "D"})
+        ctx["totais"] = _totais_itens(base_instance)
         return ctx
 
     def form_valid(self, form):
@@ -62,17 +224,98 @@ class LancamentoContabilDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy("contabill:lancamentos_lista")
 
 
+def _contexto_recalculos():
+    recalculos = list(
+        TarefaRecalculoSaldo.objects.select_related("filial", "periodo")[:5]
+    )
+    return {
+        "recalculos": recalculos,
+        "recalculos_ativos": any(t.status in ("P", "E") for t in recalculos),
+    }
+
+
+class AplicarModelosRateioView(LoginRequiredMixin, View):
+    """Rateia pelos modelos de rateio os itens do lançamento que ainda não têm rateio."""
+
+    def post(self, request, pk, *args, **kwargs):
+        lancamento = get_object_or_404(LancamentoContabil, pk=pk)
+        resultado = aplicar_modelos(
+            LancamentoItem.objects.filter(lancamento=lancamento),
+            substituir=request.POST.get("substituir") == "1",
+        )
+        if resultado["itens"]:
+            messages.success(
+                request,
+                f"Modelos de rateio aplicados a {resultado['itens']} item(ns): "
+                f"{resultado['cc']} rateio(s) de CC e {resultado['projeto']} de projeto.",
+            )
+        else:
+            messages.info(request, "Nenhum item sem rateio coberto por modelo de rateio.")
+        return redirect("contabill:lancamentos_editar", pk=lancamento.pk)
+
+
 class RecalcularSaldoView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         filial_id = request.POST.get("filial_id")
         periodo_id = request.POST.get("periodo_id")
-        recalcular_saldos_por_periodo(filial_id, periodo_id)
-        recalcular_rateios_cc_projeto(filial_id, periodo_id)
-        messages.success(request, "Saldos recalculados.")
+        if not (filial_id and periodo_id):
+            return HttpResponseBadRequest("filial_id/periodo_id ausente")
+        filial = get_object_or_404(Filial, pk=filial_id)
+        periodo = get_object_or_404(Periodo, pk=periodo_id)
+        _, criada = enfileirar_recalculo(filial.pk, periodo.pk, usuario=request.user)
+        if request.headers.get("HX-Request"):
+            return render(request, "contabill/lancamentos/_recalculos.html", _contexto_recalculos())
+        if criada:
+            messages.success(request, f"Recálculo de {filial} / {periodo} enviado para a fila.")
+        else:
+            messages.info(request, f"Já existe recálculo pendente de {filial} / {periodo}.")
         return redirect("contabill:lancamentos_lista")
 
 
+class RecalculosHX(LoginRequiredMixin, View):
+    """Fragmento com as últimas tarefas de recálculo (polling da lista)."""
+
+    def get(self, request, *args, **kwargs):
+        return render(request, "contabill/lancamentos/_recalculos.html", _contexto_recalculos())
+
+
+class RecalculoStatusView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        tarefa = get_object_or_404(TarefaRecalculoSaldo, pk=pk)
+        return JsonResponse(
+            {
+                "id": tarefa.pk,
+                "filial_id": tarefa.filial_id,
+                "periodo_id": tarefa.periodo_id,
+                "status": tarefa.status,
+                "status_display": tarefa.get_status_display(),
+                "solicitacoes": tarefa.solicitacoes,
+                "criado_em": tarefa.created_at,
+                "iniciado_em": tarefa.iniciado_em,
+                "concluido_em": tarefa.concluido_em,
+                "duracao": tarefa.duracao,
+                "erro": tarefa.erro,
+            }
+        )
+
+
+class EscolhasBuscaView(LoginRequiredMixin, View):
+    """Opções de conta/histórico/moeda que casam com ``?q=`` (autocomplete do item)."""
+
+    def get(self, request, fonte, *args, **kwargs):
+        if fonte not in FONTES:
+            raise Http404
+        resultados = buscar(fonte, request.GET.get("q", ""))
+        return JsonResponse({"resultados": [{"id": pk, "texto": texto} for pk, texto in resultados]})
+
+
 class LancamentoItemCreateHX(View):
+    """Inclusão rápida de item: devolve só a linha nova.
+
+    Junto vão, fora da banda (``hx-swap-oob``), a linha de inclusão limpa e os
+    totais. Com erro, só a linha de inclusão volta, no lugar da atual.
+    """
+
     @transaction.atomic
     def post(self, request, *args, **kwargs):
         lanc_id = request.POST.get("lancamento_id")
@@ -82,22 +325,29 @@ class LancamentoItemCreateHX(View):
 
         # form de inserção rápida usa prefixo "novo"
         form_novo = LancamentoItemForm(request.POST, prefix="novo")
-        if form_novo.is_valid():
-            item = form_novo.save(commit=False)
-            item.lancamento = lanc
-            item.filial = lanc.filial  # herdado do cabeçalho (não mostrar no detalhe)
-            item.save()
-            # (se houver validações de CC/Projeto nesta etapa, manter)
-
-            itens_formset = LancamentoItemFormSet(instance=lanc, prefix="itens")
-            form_novo = LancamentoItemForm(prefix="novo", initial={"moeda": 1, "tipo_dc": "D"})
-        else:
-            itens_formset = LancamentoItemFormSet(instance=lanc, prefix="itens")
+        if not form_novo.is_valid():
+            resposta = render(
+                request,
+                "contabill/lancamentos/_item_novo.html",
+                {"form_novo": form_novo, "lancamento_id": lanc.pk},
+            )
+            resposta["HX-Retarget"] = "#linha-nova"
+            resposta["HX-Reswap"] = "outerHTML"
+            return resposta
 
+        item = form_novo.save(commit=False)
+        item.lancamento = lanc
+        item.filial = lanc.filial  # herdado do cabeçalho (não mostrar no detalhe)
+        item.save()
         return render(
             request,
-            "contabill/lancamentos/_grid_itens.html",
-            {"formset": itens_formset, "form_novo": form_novo},
+            "contabill/lancamentos/_item_adicionado.html",
+            {
+                "item": item,
+                "form_novo": LancamentoItemForm(prefix="novo", initial={"moeda": 1, "tipo_dc": "D"}),
+                "lancamento_id": lanc.pk,
+                "totais": _totais_itens(lanc),
+            },
         )
 
 
@@ -0,0 +1,166 @@
+from itertools import islice
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.generic import TemplateView
+
+from ..forms.relatorios import BalanceteForm, DREForm, RazaoForm
+from ..services.balancete import (
+    TAMANHO_PAGINA,
+    balancete,
+    linhas_balancete,
+    periodos_do_intervalo,
+)
+from ..services.dre import dre_centro_custo, dre_projeto
+from ..services.exportacao import resposta_exportacao
+from ..services.razao import COLUNAS as COLUNAS_RAZAO, razao
+
+CABECALHO_BALANCETE = [
+    "Código",
+    "Descrição",
+    "Nível",
+    "Saldo inicial",
+    "Débito",
+    "Crédito",
+    "Saldo final",
+]
+
+CABECALHO_RAZAO = [
+    "Data",
+    "Lançamento",
+    "Documento",
+    "Filial",
+    "Conta",
+    "Histórico",
+    "Descrição",
+    "Débito",
+    "Crédito",
+    "Saldo",
+]
+
+LINHAS_RAZAO_TELA = 500
+
+
+class BalanceteView(LoginRequiredMixin, TemplateView):
+    """Balancete paginado por código (``?apos=``); ``?exportar=csv|xlsx`` baixa tudo."""
+
+    template_name = "contabill/relatorios/balancete.html"
+
+    def get(self, request, *args, **kwargs):
+        form = BalanceteForm(request.GET or None, initial={"nivel": 5, "ocultar_zeradas": True})
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form))
+
+        dados = form.cleaned_data
+        filtros = {
+            "empresa_id": dados["empresa"].id if dados["empresa"] else None,
+            "filial_id": dados["filial"].id if dados["filial"] else None,
+            "nivel": dados["nivel"],
+            "ocultar_zeradas": dados["ocultar_zeradas"],
+        }
+        periodos = periodos_do_intervalo(dados["periodo_inicial"], dados["periodo_final"])
+
+        formato = request.GET.get("exportar")
+        if formato in ("csv", "xlsx"):
+            linhas = (
+                [
+                    l["codigo"],
+                    l["descricao"],
+                    l["nivel"],
+                    l["saldo_inicial"],
+                    l["debito"],
+                    l["credito"],
+                    l["saldo_final"],
+                ]
+                for l in linhas_balancete(periodos, **filtros)
+            )
+            nome = f"balancete_{periodos[0].codigo}_{periodos[-1].codigo}"
+            return resposta_exportacao(formato, nome, CABECALHO_BALANCETE, linhas)
+
+        apos = request.GET.get("apos", "")
+        linhas = balancete(periodos, apos=apos, limite=TAMANHO_PAGINA + 1, **filtros)
+        proxima = None
+        if len(linhas) > TAMANHO_PAGINA:
+            linhas = linhas[:TAMANHO_PAGINA]
+            parametros = request.GET.copy()
+            parametros["apos"] = linhas[-1]["codigo"]
+            proxima = "?" + parametros.urlencode()
+        parametros = request.GET.copy()
+        parametros.pop("apos", None)
+        parametros.pop("exportar", None)
+        return self.render_to_response(
+            self.get_context_data(
+                form=form,
+                linhas=linhas,
+                periodos=periodos,
+                apos=apos,
+                proxima=proxima,
+                primeira="?" + parametros.urlencode(),
+                filtros_url=parametros.urlencode(),
+            )
+        )
+
+
+class RazaoView(LoginRequiredMixin, TemplateView):
+    """Razão da conta; na tela mostra as primeiras linhas, ``?exportar=csv|xlsx`` traz tudo."""
+
+    template_name = "contabill/relatorios/razao.html"
+
+    def get(self, request, *args, **kwargs):
+        form = RazaoForm(request.GET or None)
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form))
+
+        dados = form.cleaned_data
+        linhas = razao(
+            dados["conta"],
+            dados["data_inicio"],
+            dados["data_fim"],
+            filial_id=dados["filial"].id if dados["filial"] else None,
+            empresa_id=dados["empresa"].id if dados["empresa"] else None,
+        )
+
+        formato = request.GET.get("exportar")
+        if formato in ("csv", "xlsx"):
+            nome = f"razao_{dados['conta'].codigo}_{dados['data_inicio']:%Y%m%d}_{dados['data_fim']:%Y%m%d}"
+            valores = ([l[c] for c in COLUNAS_RAZAO] for l in linhas)
+            return resposta_exportacao(formato, nome, CABECALHO_RAZAO, valores)
+
+        try:
+            tela = list(islice(linhas, LINHAS_RAZAO_TELA + 1))
+        finally:
+            linhas.close()
+        parametros = request.GET.copy()
+        parametros.pop("exportar", None)
+        return self.render_to_response(
+            self.get_context_data(
+                form=form,
+                linhas=tela[:LINHAS_RAZAO_TELA],
+                truncado=len(tela) > LINHAS_RAZAO_TELA,
+                limite=LINHAS_RAZAO_TELA,
+                filtros_url=parametros.urlencode(),
+            )
+        )
+
+
+class DREView(LoginRequiredMixin, TemplateView):
+    """DRE por centro de custo (subárvore) ou por projeto, com um período por coluna."""
+
+    template_name = "contabill/relatorios/dre.html"
+
+    def get(self, request, *args, **kwargs):
+        form = DREForm(request.GET or None)
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form))
+
+        dados = form.cleaned_data
+        escopo = {
+            "filial_id": dados["filial"].id if dados["filial"] else None,
+            "empresa_id": dados["empresa"].id if dados["empresa"] else None,
+        }
+        if dados["por"] == "projeto":
+            dre = dre_projeto(dados["periodos"], dados["projetos"] or None, **escopo)
+        else:
+            dre = dre_centro_custo(dados["periodos"], dados["centro_custo"], **escopo)
+        return self.render_to_response(
+            self.get_context_data(form=form, dre=dre, periodos=dados["periodos"])
+        )
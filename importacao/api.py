@@ -0,0 +1,189 @@
+"""Importação a partir de layouts do tipo "api" (endpoint JSON paginado).
+
+O endpoint (``LayoutImportacao.url_api``) recebe ``page`` e ``page_size`` e
+responde com uma lista de registros ou com um objeto
+``{"results": [...], "count": n | "total_pages": n, "next": url}``:
+
+- com ``count``/``total_pages`` as páginas restantes são buscadas em
+  paralelo (``IMPORTACAO_API_THREADS`` conexões) e entregues em ordem;
+- sem total, segue o link ``next`` página a página.
+
+Todas as requisições usam uma ``requests.Session`` com pool de conexões.
+``LayoutImportacao.cursor_api`` guarda onde a leitura continua; ele avança
+a cada página gravada e volta a vazio quando a importação termina.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .lancamentos import importar_lancamentos
+from .leitores import normalizar_registro
+from .models import LayoutImportacao
+from .services import bulk_upsert, itens_depara
+
+PARAM_PAGINA = "page"
+PARAM_TAMANHO = "page_size"
+TIMEOUT = 30
+
+
+def _threads():
+    return getattr(settings, "IMPORTACAO_API_THREADS", 4)
+
+
+def criar_sessao(conexoes=None):
+    """Sessão com pool de conexões e novas tentativas para falhas transitórias."""
+    conexoes = conexoes or _threads()
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=conexoes,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=("GET",),
+        ),
+    )
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    sessao.headers["Accept"] = "application/json"
+    return sessao
+
+
+class LeitorApi:
+    def __init__(self, layout, sessao=None, threads=None):
+        if not layout.url_api:
+            raise ValueError(f"Layout {layout} sem URL de API.")
+        self.layout = layout
+        self.threads = threads or _threads()
+        self.sessao = sessao or criar_sessao(self.threads)
+        self.tamanho = layout.tamanho_pagina_api or 500
+
+    def _get(self, url, params=None):
+        cabecalhos = {}
+        if self.layout.token_api:
+            cabecalhos["Authorization"] = f"Bearer {self.layout.token_api}"
+        resposta = self.sessao.get(url, params=params, headers=cabecalhos, timeout=TIMEOUT)
+        resposta.raise_for_status()
+        return resposta.json()
+
+    def _pagina(self, numero):
+        return self._get(
+            self.layout.url_api, {PARAM_PAGINA: numero, PARAM_TAMANHO: self.tamanho}
+        )
+
+    @staticmethod
+    def _registros(corpo):
+        if isinstance(corpo, list):
+            return corpo
+        return corpo.get("results") or []
+
+    def _total_paginas(self, corpo):
+        if isinstance(corpo, list):
+            return None
+        if corpo.get("total_pages") is not None:
+            return int(corpo["total_pages"])
+        if corpo.get("count") is not None:
+            return max(1, -(-int(corpo["count"]) // self.tamanho))
+        return None
+
+    def paginas(self, cursor=""):
+        """Gera ``(registros, cursor)``; o cursor é de onde continuar depois da página."""
+        if cursor.startswith("http"):
+            yield from self._seguir(cursor)
+            return
+        numero = int(cursor.split(":", 1)[1]) if cursor.startswith("pagina:") else 1
+        corpo = self._pagina(numero)
+        total = self._total_paginas(corpo)
+        if total is not None:
+            yield self._registros(corpo), f"pagina:{numero + 1}" if numero < total else ""
+            yield from self._em_paralelo(numero + 1, total)
+        elif isinstance(corpo, dict) and corpo.get("next"):
+            yield self._registros(corpo), corpo["next"]
+            yield from self._seguir(corpo["next"])
+        else:
+            yield self._registros(corpo), ""
+
+    def _seguir(self, url):
+        while url:
+            corpo = self._get(url)
+            url = corpo.get("next") if isinstance(corpo, dict) else None
+            yield self._registros(corpo), url or ""
+
+    def _em_paralelo(self, inicio, total):
+        """Busca as páginas ``inicio..total`` com no máximo ``threads`` em voo."""
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            pendentes = deque()
+            proxima = inicio
+            while proxima <= total or pendentes:
+                while proxima <= total and len(pendentes) < self.threads:
+                    pendentes.append((proxima, pool.submit(self._pagina, proxima)))
+                    proxima += 1
+                numero, futuro = pendentes.popleft()
+                try:
+                    corpo = futuro.result()
+                except Exception:
+                    for _, outro in pendentes:
+                        outro.cancel()
+                    raise
+                yield self._registros(corpo), f"pagina:{numero + 1}" if numero < total else ""
+
+
+def _salvar_cursor(layout, cursor):
+    layout.cursor_api = cursor
+    LayoutImportacao.objects.filter(pk=layout.pk).update(cursor_api=cursor)
+
+
+def importar_depara_api(layout, model, reiniciar=False, leitor=None):
+    """Importa De/Para do endpoint do layout; retorna ``(criados, atualizados)``.
+
+    Cada página é gravada com ``bulk_upsert`` e o cursor avança em seguida,
+    então uma falha no meio retoma da primeira página não gravada.
+    """
+    leitor = leitor or LeitorApi(layout)
+    created = updated = 0
+    for registros, proximo in leitor.paginas("" if reiniciar else layout.cursor_api):
+        linhas = [normalizar_registro(r) for r in registros]
+        c, u = bulk_upsert(layout.pk, model, itens_depara(model, linhas))
+        created += c
+        updated += u
+        _salvar_cursor(layout, proximo)
+    return created, updated
+
+
+def importar_lancamentos_api(layout, usuario, reiniciar=False, leitor=None, **opcoes):
+    """Importa lançamentos do endpoint do layout (ver ``importar_lancamentos``).
+
+    Um documento pode atravessar páginas e os lotes não coincidem com elas:
+    a cada lote gravado o cursor avança até a última página cujas linhas
+    já foram todas processadas. Depois de um lote com falha ele não avança
+    mais, e a próxima execução retoma dali; a reimportação do que já entrou
+    é ignorada (documentos já importados).
+    """
+    leitor = leitor or LeitorApi(layout)
+    lidas = {"linhas": 0}
+    # (número da última linha da página, cursor depois dela), em ordem
+    fim_das_paginas = deque()
+
+    def linhas():
+        for registros, proximo in leitor.paginas("" if reiniciar else layout.cursor_api):
+            for registro in registros:
+                lidas["linhas"] += 1
+                yield normalizar_registro(registro)
+            fim_das_paginas.append((lidas["linhas"], proximo))
+
+    def gravado(ultima_linha):
+        cursor = None
+        while fim_das_paginas and fim_das_paginas[0][0] <= ultima_linha:
+            _, cursor = fim_das_paginas.popleft()
+        if cursor is not None:
+            _salvar_cursor(layout, cursor)
+
+    resultado = importar_lancamentos(layout, linhas(), usuario, ao_gravar=gravado, **opcoes)
+    if not resultado["lotes_com_falha"] and fim_das_paginas:
+        _salvar_cursor(layout, fim_das_paginas[-1][1])
+    return resultado
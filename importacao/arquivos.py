@@ -0,0 +1,127 @@
+"""Arquivos enviados ao wizard de De/Para, guardados em disco.
+
+O upload é copiado para ``IMPORTACAO_DIR`` e a sessão guarda apenas o
+caminho e um índice de posições (ver ``leitores.indexar_csv``); as páginas
+da prévia e a aplicação leem o arquivo em fluxo, com memória constante.
+Arquivos de wizards abandonados são apagados no próximo upload, passado
+``IMPORTACAO_VALIDADE`` (segundos).
+"""
+import os
+import tempfile
+import time
+import uuid
+from itertools import islice
+
+from django.conf import settings
+
+from .leitores import indexar_csv, ler_csv_de, ler_linhas
+
+LINHAS_POR_PAGINA = 50
+VALIDADE = 24 * 60 * 60
+
+
+def diretorio():
+    caminho = getattr(
+        settings, "IMPORTACAO_DIR", os.path.join(tempfile.gettempdir(), "contabill-importacao")
+    )
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+def limpar_antigos(validade=None):
+    """Apaga de ``IMPORTACAO_DIR`` os arquivos com mais de ``validade`` segundos."""
+    if validade is None:
+        validade = getattr(settings, "IMPORTACAO_VALIDADE", VALIDADE)
+    limite = time.time() - validade
+    removidos = 0
+    with os.scandir(diretorio()) as entradas:
+        for entrada in entradas:
+            try:
+                if entrada.is_file() and entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    removidos += 1
+            except FileNotFoundError:
+                # outro processo limpou antes
+                continue
+    return removidos
+
+
+class _Layout:
+    """O suficiente de um LayoutImportacao para ``ler_linhas``."""
+
+    def __init__(self, tipo_arquivo, delimitador, elemento_registro=""):
+        self.tipo_arquivo = tipo_arquivo
+        self.delimitador = delimitador
+        self.elemento_registro = elemento_registro
+
+
+def guardar_upload(arquivo, layout):
+    """Copia o upload para disco e indexa; devolve o dict guardado na sessão.
+
+    Levanta ``ValueError`` se o tipo do layout não tiver leitor.
+    """
+    limpar_antigos()
+    extensao = os.path.splitext(getattr(arquivo, "name", ""))[1].lower()
+    caminho = os.path.join(diretorio(), f"{uuid.uuid4().hex}{extensao}")
+    with open(caminho, "wb") as destino:
+        for parte in arquivo.chunks():
+            destino.write(parte)
+    info = {
+        "caminho": caminho,
+        "tipo_arquivo": layout.tipo_arquivo,
+        "delimitador": layout.delimitador,
+        "elemento_registro": layout.elemento_registro,
+        "passo": LINHAS_POR_PAGINA,
+        "posicoes": None,
+        "cabecalho": None,
+    }
+    try:
+        if layout.tipo_arquivo == "csv":
+            info["cabecalho"], info["total"], info["posicoes"] = indexar_csv(
+                caminho, layout.delimitador, LINHAS_POR_PAGINA
+            )
+        else:
+            info["total"] = sum(1 for _ in iterar(info))
+    except Exception:
+        remover(info)
+        raise
+    return info
+
+
+def iterar(info, inicio=0):
+    """Linhas do arquivo a partir do índice ``inicio`` (base 0)."""
+    if info["posicoes"] is not None:
+        bloco, resto = divmod(inicio, info["passo"])
+        if bloco >= len(info["posicoes"]):
+            return iter(())
+        linhas = ler_csv_de(
+            info["caminho"], info["posicoes"][bloco], info["cabecalho"], info["delimitador"]
+        )
+        return islice(linhas, resto, None)
+    arquivo = open(info["caminho"], "rb")
+    layout = _Layout(info["tipo_arquivo"], info["delimitador"], info.get("elemento_registro", ""))
+    linhas = ler_linhas(layout, arquivo)
+    return islice(_fechando(linhas, arquivo), inicio, None)
+
+
+def _fechando(linhas, arquivo):
+    with arquivo:
+        yield from linhas
+
+
+def pagina(info, numero):
+    """Lista de ``(indice, linha)`` da página ``numero`` (base 1)."""
+    inicio = (numero - 1) * info["passo"]
+    return list(enumerate(islice(iterar(info, inicio), info["passo"]), start=inicio))
+
+
+def total_paginas(info):
+    return max(1, -(-info["total"] // info["passo"]))
+
+
+def remover(info):
+    if info and info.get("caminho"):
+        try:
+            os.remove(info["caminho"])
+        except FileNotFoundError:
+            pass
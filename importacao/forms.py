@@ -14,6 +14,10 @@ class LayoutForm(forms.ModelForm):
             "descricao",
             "tipo_arquivo",
             "delimitador",
+            "elemento_registro",
+            "url_api",
+            "token_api",
+            "tamanho_pagina_api",
             "ativo",
         ]
         labels = {
@@ -22,6 +26,10 @@ class LayoutForm(forms.ModelForm):
             "descricao": "Descrição",
             "tipo_arquivo": "Tipo de arquivo",
             "delimitador": "Delimitador",
+            "elemento_registro": "Elemento do registro (xml)",
+            "url_api": "URL da API",
+            "token_api": "Token da API",
+            "tamanho_pagina_api": "Registros por página (API)",
             "ativo": "Ativo",
         }
         widgets = {
@@ -32,6 +40,12 @@ class LayoutForm(forms.ModelForm):
             "delimitador": forms.TextInput(
                 attrs={"class": "form-control", "maxlength": 5, "placeholder": ";"}
             ),
+            "elemento_registro": forms.TextInput(
+                attrs={"class": "form-control", "placeholder": "filhos da raiz"}
+            ),
+            "url_api": forms.URLInput(attrs={"class": "form-control"}),
+            "token_api": forms.PasswordInput(attrs={"class": "form-control", "autocomplete": "off"}),
+            "tamanho_pagina_api": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
             "ativo": forms.CheckboxInput(attrs={"class": "form-check-input"}),
         }
 
@@ -39,11 +53,26 @@ class LayoutForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if not self.instance.pk and not self.initial.get("delimitador"):
             self.initial["delimitador"] = ";"
+        if self.instance.token_api:
+            self.fields["token_api"].help_text = "Deixe em branco para manter o token atual."
+
+    def clean_token_api(self):
+        # o token não volta para a página: em branco, mantém o gravado
+        token = self.cleaned_data.get("token_api")
+        if not token and self.instance.pk:
+            return self.instance.token_api
+        return token
 
     def clean_delimitador(self):
         val = (self.cleaned_data.get("delimitador") or ";").strip()
         return val[:5] or ";"
 
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get("tipo_arquivo") == "api" and not cleaned.get("url_api"):
+            self.add_error("url_api", "Informe a URL para layouts do tipo api.")
+        return cleaned
+
 
 TARGET_CHOICES = [
     ("contas", "Conta Contábil"),
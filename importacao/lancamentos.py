@@ -0,0 +1,379 @@
+"""Importação em lote de lançamentos contábeis (origem "Importado").
+
+Cada linha do arquivo é um item; linhas consecutivas com o mesmo
+``documento`` formam um lançamento. Colunas reconhecidas:
+
+- cabeçalho (lidas da primeira linha do documento): ``documento``,
+  ``filial``, ``data_lancamento``, ``data_competencia`` (padrão: data do
+  lançamento), ``tipo_lancamento`` (padrão "0"), ``numero_documento``
+  (padrão: o próprio documento) e ``descricao``;
+- item: ``conta``, ``tipo_dc`` (D/C), ``valor``, ``moeda``, ``historico``,
+  ``codigo_item`` e, opcionalmente, ``centro_custo``/``projeto`` (rateio de
+  100% do item). Sem essas colunas, vale o modelo de rateio da conta/histórico
+  (``ModeloRateio``), se houver.
+
+Códigos de filial, conta, moeda, histórico, centro de custo e projeto são
+códigos externos traduzidos pelo De/Para do layout.
+
+Os documentos são gravados com ``bulk_create`` em lotes de
+``tamanho_lote`` itens, cada lote na sua transação. Um lote com falha é
+registrado com a faixa de linhas e não interrompe os demais; documentos já
+importados (mesma filial e ``codigo_externo``) são ignorados, de modo que
+basta reprocessar a partir da ``linha_inicial`` do lote que falhou. Quando
+as linhas informam o byte onde cada uma começa (``leitores.CsvPosicionado``),
+o lote com falha traz também a ``posicao``, e a retomada abre o arquivo ali.
+
+Documentos fora de sequência (linhas do mesmo documento separadas por
+outro) são rejeitados, no mesmo lote ou em lotes seguintes: a importação
+guarda os documentos já lidos e a repetição vira erro, em vez de cair na
+checagem de documentos já importados (o que descartaria as linhas dela).
+"""
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from contabill.models import (
+    CentroCusto,
+    ContaContabil,
+    Filial,
+    HistoricoPadrao,
+    LancamentoContabil,
+    LancamentoItem,
+    Moeda,
+    Projeto,
+    RateioLancamentoItemCentroCusto,
+    RateioLancamentoItemProjeto,
+)
+from contabill.services.rateio import ModelosRateio, ratear
+from contabill.services.saldo import incorporar_lancamentos
+
+from .services import resolver
+
+TAMANHO_LOTE = 1000
+
+TIPOS_LANCAMENTO = {codigo for codigo, _ in LancamentoContabil.TIPO_LANCAMENTO_CHOICES}
+
+
+class ErroImportacao(ValueError):
+    def __init__(self, linha, mensagem):
+        super().__init__(mensagem)
+        self.linha = linha
+        self.mensagem = mensagem
+
+
+def _data(valor, linha, campo):
+    valor = (valor or "").strip()
+    try:
+        if "/" in valor:
+            return datetime.strptime(valor, "%d/%m/%Y").date()
+        return date.fromisoformat(valor[:10])
+    except ValueError:
+        raise ErroImportacao(linha, f"{campo} inválida: {valor!r}.")
+
+
+def _valor(valor, linha):
+    texto = (valor or "").strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        numero = Decimal(texto).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ErroImportacao(linha, f"Valor inválido: {valor!r}.")
+    if numero <= 0:
+        raise ErroImportacao(linha, f"Valor deve ser positivo: {valor!r}.")
+    return numero
+
+
+def _documentos(linhas, a_partir_da_linha, primeira_linha=1):
+    """Agrupa linhas consecutivas do mesmo documento.
+
+    Gera ``(documento, [(numero_linha, linha), ...], posicao)``; as linhas de
+    dados são numeradas a partir de 1 (o cabeçalho não conta) e ``posicao`` é
+    o byte da primeira linha do documento, se ``linhas`` o informar.
+    """
+    atual, grupo, posicao = None, [], None
+    for numero, linha in enumerate(linhas, start=primeira_linha):
+        if numero < a_partir_da_linha:
+            continue
+        documento = linha.get("documento", "")
+        if grupo and documento != atual:
+            yield atual, grupo, posicao
+            grupo = []
+        if not grupo:
+            posicao = getattr(linhas, "posicao", None)
+        atual = documento
+        grupo.append((numero, linha))
+    if grupo:
+        yield atual, grupo, posicao
+
+
+class _Importacao:
+    def __init__(self, layout_id, usuario, moeda_padrao=None, historico_padrao=None):
+        self.layout_id = layout_id
+        self.usuario = usuario
+        self.moeda_padrao = moeda_padrao
+        self.historico_padrao = historico_padrao
+        self.contas = {}
+        self.modelos = ModelosRateio()
+
+    def resolver(self, model, codigo, linha, campo, obrigatorio=True):
+        codigo = (codigo or "").strip()
+        if not codigo:
+            if obrigatorio:
+                raise ErroImportacao(linha, f"{campo} não informado(a).")
+            return None
+        alvo = resolver(self.layout_id, model, codigo)
+        if alvo is None:
+            raise ErroImportacao(linha, f"{campo} {codigo!r} sem De/Para no layout.")
+        return alvo
+
+    def conta(self, codigo, linha):
+        conta_id = self.resolver(ContaContabil, codigo, linha, "Conta")
+        if conta_id not in self.contas:
+            self.contas[conta_id] = (
+                ContaContabil.objects.filter(pk=conta_id)
+                .values_list("tipo", "classificacao")
+                .first()
+            )
+        dados = self.contas[conta_id]
+        if dados is None:
+            raise ErroImportacao(linha, f"Conta {codigo!r} mapeada para conta inexistente.")
+        tipo, classificacao = dados
+        if tipo != "A":
+            raise ErroImportacao(linha, f"Conta {codigo!r} não é analítica.")
+        return conta_id, classificacao
+
+    def montar(self, documento, grupo):
+        """Valida e traduz um documento; levanta ``ErroImportacao``."""
+        numero, primeira = grupo[0]
+        if not documento:
+            raise ErroImportacao(numero, "Documento não informado.")
+        if len(documento) > 50:
+            raise ErroImportacao(numero, "Documento com mais de 50 caracteres.")
+        data_lancamento = _data(primeira.get("data_lancamento"), numero, "Data de lançamento")
+        competencia = primeira.get("data_competencia")
+        tipo_lancamento = primeira.get("tipo_lancamento") or "0"
+        if tipo_lancamento not in TIPOS_LANCAMENTO:
+            raise ErroImportacao(numero, f"Tipo de lançamento inválido: {tipo_lancamento!r}.")
+        cabecalho = {
+            "filial_id": self.resolver(Filial, primeira.get("filial"), numero, "Filial"),
+            "data_lancamento": data_lancamento,
+            "data_competencia": (
+                _data(competencia, numero, "Data de competência") if competencia else data_lancamento
+            ),
+            "tipo_lancamento": tipo_lancamento,
+            "numero_documento": (primeira.get("numero_documento") or documento)[:50],
+            "descricao": (primeira.get("descricao") or "")[:255],
+            "codigo_externo": documento,
+        }
+
+        itens = []
+        totais = {"D": Decimal("0.00"), "C": Decimal("0.00")}
+        for numero, linha in grupo:
+            tipo_dc = (linha.get("tipo_dc") or "").upper()
+            if tipo_dc not in totais:
+                raise ErroImportacao(numero, f"tipo_dc inválido: {linha.get('tipo_dc')!r}.")
+            conta_id, classificacao = self.conta(linha.get("conta"), numero)
+            valor = _valor(linha.get("valor"), numero)
+            moeda_id = (
+                self.resolver(Moeda, linha.get("moeda"), numero, "Moeda", obrigatorio=False)
+                or self.moeda_padrao
+            )
+            historico_id = (
+                self.resolver(
+                    HistoricoPadrao, linha.get("historico"), numero, "Histórico", obrigatorio=False
+                )
+                or self.historico_padrao
+            )
+            if moeda_id is None:
+                raise ErroImportacao(numero, "Moeda não informada.")
+            if historico_id is None:
+                raise ErroImportacao(numero, "Histórico não informado.")
+            cc_id = self.resolver(
+                CentroCusto, linha.get("centro_custo"), numero, "Centro de custo", obrigatorio=False
+            )
+            projeto_id = self.resolver(
+                Projeto, linha.get("projeto"), numero, "Projeto", obrigatorio=False
+            )
+            rateio_cc = (
+                [(cc_id, 100)] if cc_id else self.modelos.percentuais_cc(conta_id, historico_id)
+            )
+            if not rateio_cc and classificacao in {"R", "D", "C"}:
+                raise ErroImportacao(numero, "Rateio de centro de custo obrigatório.")
+            itens.append(
+                {
+                    "conta_contabil_id": conta_id,
+                    "moeda_id": moeda_id,
+                    "historico_id": historico_id,
+                    "valor": valor,
+                    "tipo_dc": tipo_dc,
+                    "codigo_externo": (linha.get("codigo_item") or "")[:50],
+                    "rateio_cc": rateio_cc,
+                    "rateio_projeto": (
+                        [(projeto_id, 100)]
+                        if projeto_id
+                        else self.modelos.percentuais_projeto(conta_id, historico_id)
+                    ),
+                }
+            )
+            totais[tipo_dc] += valor
+        if totais["D"] != totais["C"]:
+            raise ErroImportacao(
+                grupo[0][0],
+                f"Documento {documento} desbalanceado: débito {totais['D']} x crédito {totais['C']}.",
+            )
+        return {"cabecalho": cabecalho, "itens": itens}
+
+    def gravar(self, documentos):
+        """Grava um lote; retorna (lançamentos, itens, rateios, já importados)."""
+        with transaction.atomic():
+            chaves = {
+                (d["cabecalho"]["filial_id"], d["cabecalho"]["codigo_externo"]) for d in documentos
+            }
+            existentes = set(
+                LancamentoContabil.objects.filter(
+                    origem="2",
+                    filial_id__in={f for f, _ in chaves},
+                    codigo_externo__in={c for _, c in chaves},
+                ).values_list("filial_id", "codigo_externo")
+            )
+            novos = [
+                d
+                for d in documentos
+                if (d["cabecalho"]["filial_id"], d["cabecalho"]["codigo_externo"]) not in existentes
+            ]
+            lancamentos = LancamentoContabil.objects.bulk_create(
+                [
+                    LancamentoContabil(origem="2", usuario=self.usuario, **d["cabecalho"])
+                    for d in novos
+                ]
+            )
+            itens, dados_itens = [], []
+            for lancamento, documento in zip(lancamentos, novos):
+                for dados in documento["itens"]:
+                    itens.append(
+                        LancamentoItem(
+                            lancamento=lancamento,
+                            filial_id=lancamento.filial_id,
+                            conta_contabil_id=dados["conta_contabil_id"],
+                            moeda_id=dados["moeda_id"],
+                            historico_id=dados["historico_id"],
+                            valor=dados["valor"],
+                            tipo_dc=dados["tipo_dc"],
+                            codigo_externo=dados["codigo_externo"],
+                        )
+                    )
+                    dados_itens.append(dados)
+            LancamentoItem.objects.bulk_create(itens)
+            rateios_cc, rateios_proj = [], []
+            for item, dados in zip(itens, dados_itens):
+                if dados["rateio_cc"]:
+                    rateios_cc.extend(
+                        RateioLancamentoItemCentroCusto(
+                            lancamento_item=item, centro_custo_id=cc_id, valor=valor
+                        )
+                        for cc_id, valor in ratear(item.valor, dados["rateio_cc"])
+                    )
+                if dados["rateio_projeto"]:
+                    rateios_proj.extend(
+                        RateioLancamentoItemProjeto(
+                            lancamento_item=item, projeto_id=projeto_id, valor=valor
+                        )
+                        for projeto_id, valor in ratear(item.valor, dados["rateio_projeto"])
+                    )
+            RateioLancamentoItemCentroCusto.objects.bulk_create(rateios_cc)
+            RateioLancamentoItemProjeto.objects.bulk_create(rateios_proj)
+            incorporar_lancamentos([l.pk for l in lancamentos])
+        return (
+            len(lancamentos),
+            len(itens),
+            len(rateios_cc) + len(rateios_proj),
+            len(documentos) - len(novos),
+        )
+
+
+def importar_lancamentos(
+    layout,
+    linhas,
+    usuario,
+    tamanho_lote=TAMANHO_LOTE,
+    a_partir_da_linha=1,
+    moeda_padrao=None,
+    historico_padrao=None,
+    primeira_linha=1,
+    ao_gravar=None,
+):
+    """Importa lançamentos de um fluxo de linhas (ver ``importacao.leitores``).
+
+    ``moeda_padrao``/``historico_padrao`` são ids usados quando a coluna não
+    vem no arquivo; ``primeira_linha`` é o número da primeira linha de
+    ``linhas`` quando a leitura já começa no meio do arquivo. ``ao_gravar`` é
+    chamado com o número da última linha de cada lote gravado, enquanto
+    nenhum lote falhou: até ali, todas as linhas foram processadas. Retorna um dict
+    com os totais gravados, os documentos rejeitados (``erros``) e os lotes
+    que falharam (``lotes_com_falha``, com ``linha_inicial`` e ``posicao``
+    para reprocessamento).
+    """
+    layout_id = getattr(layout, "pk", layout)
+    importacao = _Importacao(layout_id, usuario, moeda_padrao, historico_padrao)
+    resultado = {
+        "lancamentos": 0,
+        "itens": 0,
+        "rateios": 0,
+        "ja_importados": 0,
+        "lotes": 0,
+        "erros": [],
+        "lotes_com_falha": [],
+    }
+    lote, linhas_lote, itens_lote = [], [], 0
+    # documentos já lidos nesta importação, para rejeitar os fora de sequência
+    vistos = set()
+    posicao_lote = None
+
+    def gravar():
+        resultado["lotes"] += 1
+        try:
+            lancamentos, itens, rateios, ja_importados = importacao.gravar(lote)
+        except Exception as exc:
+            resultado["lotes_com_falha"].append(
+                {
+                    "lote": resultado["lotes"],
+                    "linha_inicial": linhas_lote[0],
+                    "linha_final": linhas_lote[-1],
+                    "posicao": posicao_lote,
+                    "erro": str(exc),
+                }
+            )
+            return
+        resultado["lancamentos"] += lancamentos
+        resultado["itens"] += itens
+        resultado["rateios"] += rateios
+        resultado["ja_importados"] += ja_importados
+        if ao_gravar and not resultado["lotes_com_falha"]:
+            ao_gravar(linhas_lote[-1])
+
+    for documento, grupo, posicao in _documentos(linhas, a_partir_da_linha, primeira_linha):
+        try:
+            if documento in vistos:
+                raise ErroImportacao(
+                    grupo[0][0], "Linhas do documento fora de sequência (arquivo não ordenado)."
+                )
+            vistos.add(documento)
+            dados = importacao.montar(documento, grupo)
+        except ErroImportacao as exc:
+            resultado["erros"].append(
+                {"linha": exc.linha, "documento": documento, "mensagem": exc.mensagem}
+            )
+            continue
+        if not lote:
+            posicao_lote = posicao
+        lote.append(dados)
+        linhas_lote.extend((grupo[0][0], grupo[-1][0]))
+        itens_lote += len(dados["itens"])
+        if itens_lote >= tamanho_lote:
+            gravar()
+            lote, linhas_lote, itens_lote = [], [], 0
+    if lote:
+        gravar()
+    return resultado
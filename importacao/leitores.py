@@ -0,0 +1,239 @@
+"""Leitura em fluxo dos arquivos de importação.
+
+Todos os leitores devolvem um iterador de dicts ``{coluna: valor}`` com os
+nomes de coluna normalizados (minúsculos, sem espaços nas pontas) e valores
+como texto, lendo o arquivo aos poucos para manter a memória constante.
+"""
+import csv
+from datetime import date, datetime
+from io import TextIOWrapper
+from xml.etree.ElementTree import ParseError, iterparse
+
+
+def _normalizar_linha(cabecalho, valores):
+    linha = {}
+    for coluna, valor in zip(cabecalho, valores):
+        if not coluna:
+            continue
+        if valor is None:
+            valor = ""
+        elif isinstance(valor, datetime):
+            valor = valor.date().isoformat()
+        elif isinstance(valor, date):
+            valor = valor.isoformat()
+        linha[coluna] = str(valor).strip()
+    return linha
+
+
+def _normalizar_cabecalho(cabecalho):
+    return [str(c or "").strip().lower() for c in cabecalho]
+
+
+def normalizar_registro(registro):
+    """Dict vindo de outra fonte (ex.: JSON da api) no formato das linhas lidas."""
+    return _normalizar_linha(_normalizar_cabecalho(registro.keys()), registro.values())
+
+
+def _abrir_texto(arquivo, encoding):
+    if isinstance(arquivo, str):
+        return open(arquivo, encoding=encoding, newline="")
+    if hasattr(arquivo, "encoding"):  # já é texto
+        return arquivo
+    return TextIOWrapper(getattr(arquivo, "file", arquivo), encoding=encoding, newline="")
+
+
+def ler_csv(arquivo, delimitador=";", encoding="utf-8-sig"):
+    """Linhas de um CSV (caminho ou arquivo aberto, binário ou texto)."""
+    texto = _abrir_texto(arquivo, encoding)
+    leitor = csv.reader(texto, delimiter=delimitador or ";")
+    cabecalho = _normalizar_cabecalho(next(leitor, []))
+    for valores in leitor:
+        if not any(v.strip() for v in valores):
+            continue
+        yield _normalizar_linha(cabecalho, valores)
+
+
+class _LinhasComPosicao:
+    """Linhas de texto de um arquivo binário, sabendo o byte onde começa a próxima.
+
+    ``csv.reader`` só consome as linhas do registro que está montando, então
+    ``posicao`` antes de pedir um registro é exatamente onde ele começa.
+    """
+
+    def __init__(self, binario, encoding, posicao=0):
+        binario.seek(posicao)
+        self.binario = binario
+        self.encoding = encoding
+        self.posicao = posicao
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        bruto = self.binario.readline()
+        if not bruto:
+            raise StopIteration
+        self.posicao += len(bruto)
+        return bruto.decode(self.encoding)
+
+
+def indexar_csv(caminho, delimitador=";", passo=50, encoding="utf-8-sig"):
+    """Percorre o CSV uma vez e devolve ``(cabecalho, total, posicoes)``.
+
+    ``posicoes[k]`` é o byte onde começa a linha de dados ``k * passo``, para
+    que ``ler_csv_de`` leia qualquer página sem reler o arquivo desde o início.
+    """
+    with open(caminho, "rb") as binario:
+        linhas = _LinhasComPosicao(binario, encoding)
+        leitor = csv.reader(linhas, delimiter=delimitador or ";")
+        cabecalho = _normalizar_cabecalho(next(leitor, []))
+        total, posicoes = 0, []
+        while True:
+            inicio = linhas.posicao
+            valores = next(leitor, None)
+            if valores is None:
+                break
+            if not any(v.strip() for v in valores):
+                continue
+            if total % passo == 0:
+                posicoes.append(inicio)
+            total += 1
+    return cabecalho, total, posicoes
+
+
+def ler_csv_de(caminho, posicao, cabecalho, delimitador=";", encoding="utf-8-sig"):
+    """Linhas do CSV a partir do byte ``posicao`` (obtido de ``indexar_csv``)."""
+    with open(caminho, "rb") as binario:
+        leitor = csv.reader(
+            _LinhasComPosicao(binario, encoding, posicao), delimiter=delimitador or ";"
+        )
+        for valores in leitor:
+            if not any(v.strip() for v in valores):
+                continue
+            yield _normalizar_linha(cabecalho, valores)
+
+
+class CsvPosicionado:
+    """Linhas de um CSV em disco, a partir do byte ``posicao`` (ou do início).
+
+    Durante a iteração, ``posicao`` é o byte onde começa a última linha
+    entregue: guardado junto do número da linha, permite retomar a leitura
+    dali sem reler o que vem antes.
+    """
+
+    def __init__(self, caminho, delimitador=";", posicao=None, encoding="utf-8-sig"):
+        self.caminho = caminho
+        self.delimitador = delimitador or ";"
+        self.inicio = posicao
+        self.encoding = encoding
+        self.posicao = None
+
+    def __iter__(self):
+        with open(self.caminho, "rb") as binario:
+            linhas = _LinhasComPosicao(binario, self.encoding)
+            leitor = csv.reader(linhas, delimiter=self.delimitador)
+            cabecalho = _normalizar_cabecalho(next(leitor, []))
+            if self.inicio is not None:
+                linhas = _LinhasComPosicao(binario, self.encoding, self.inicio)
+                leitor = csv.reader(linhas, delimiter=self.delimitador)
+            while True:
+                inicio = linhas.posicao
+                valores = next(leitor, None)
+                if valores is None:
+                    return
+                if not any(v.strip() for v in valores):
+                    continue
+                self.posicao = inicio
+                yield _normalizar_linha(cabecalho, valores)
+
+
+def ler_xlsx(arquivo, planilha=None):
+    """Linhas da primeira planilha (ou de ``planilha``) de um xlsx.
+
+    Usa o modo ``read_only`` do openpyxl, que lê as células sob demanda.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ValueError("Leitura de xlsx requer o pacote openpyxl.") from exc
+
+    livro = load_workbook(getattr(arquivo, "file", arquivo), read_only=True, data_only=True)
+    try:
+        folha = livro[planilha] if planilha else livro.worksheets[0]
+        linhas = folha.iter_rows(values_only=True)
+        cabecalho = _normalizar_cabecalho(next(linhas, ()))
+        for valores in linhas:
+            if not any(v not in (None, "") for v in valores):
+                continue
+            yield _normalizar_linha(cabecalho, valores)
+    finally:
+        livro.close()
+
+
+def _sem_namespace(tag):
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def ler_xml(arquivo, elemento=None):
+    """Registros de um XML lidos com ``iterparse``.
+
+    Cada ocorrência de ``elemento`` (ou, sem ele, cada filho da raiz) vira
+    uma linha com os atributos e o texto dos filhos diretos. Fora dos
+    registros, cada elemento já fechado é retirado do pai, então a memória
+    não cresce com o tamanho do arquivo, em qualquer profundidade.
+    """
+    elemento = (elemento or "").strip().lower()
+    # elementos abertos, com a marca de registro de cada um
+    abertos = []
+    em_registro = 0
+    try:
+        for evento, elem in iterparse(getattr(arquivo, "file", arquivo), events=("start", "end")):
+            if evento == "start":
+                if elemento:
+                    registro = _sem_namespace(elem.tag) == elemento
+                else:
+                    registro = len(abertos) == 1
+                abertos.append((elem, registro))
+                em_registro += registro
+                continue
+            elem, registro = abertos.pop()
+            em_registro -= registro
+            if registro:
+                cabecalho, valores = [], []
+                for nome, valor in elem.attrib.items():
+                    cabecalho.append(_sem_namespace(nome))
+                    valores.append(valor)
+                for filho in elem:
+                    cabecalho.append(_sem_namespace(filho.tag))
+                    valores.append(filho.text)
+            if abertos and not em_registro:
+                # o parser lê adiante: só os irmãos até elem já fecharam
+                pai = abertos[-1][0]
+                while len(pai):
+                    primeiro = pai[0]
+                    del pai[0]
+                    if primeiro is elem:
+                        break
+            if registro and any(v not in (None, "") for v in valores):
+                yield _normalizar_linha(cabecalho, valores)
+    except ParseError as exc:
+        raise ValueError(f"XML inválido: {exc}") from exc
+
+
+LEITORES = {
+    "csv": ler_csv,
+    "xlsx": ler_xlsx,
+    "xml": ler_xml,
+}
+
+
+def ler_linhas(layout, arquivo):
+    """Linhas do arquivo conforme o ``tipo_arquivo`` do layout."""
+    if layout.tipo_arquivo == "csv":
+        return ler_csv(arquivo, delimitador=layout.delimitador)
+    if layout.tipo_arquivo == "xml":
+        return ler_xml(arquivo, getattr(layout, "elemento_registro", None))
+    leitor = LEITORES.get(layout.tipo_arquivo)
+    if leitor is None:
+        raise ValueError(f"Tipo de arquivo não suportado: {layout.tipo_arquivo}.")
+    return leitor(arquivo)
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from importacao.api import importar_depara_api, importar_lancamentos_api
+from importacao.forms import TARGET_CHOICES
+from importacao.models import LayoutImportacao
+from importacao.views import TARGET_MODEL_MAP
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa De/Para ou lançamentos do endpoint JSON de um layout do tipo api, "
+        "continuando do último cursor salvo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("layout", help="Nome ou ID do layout de importação")
+        destino = parser.add_mutually_exclusive_group(required=True)
+        destino.add_argument(
+            "--depara", choices=[chave for chave, _ in TARGET_CHOICES], help="Tipo de De/Para"
+        )
+        destino.add_argument("--lancamentos", action="store_true", help="Importa lançamentos")
+        parser.add_argument("--usuario", help="Usuário responsável (lançamentos)")
+        parser.add_argument(
+            "--reiniciar", action="store_true", help="Ignora o cursor salvo e lê desde o início"
+        )
+
+    def handle(self, *args, **options):
+        filtro = {"pk": options["layout"]} if options["layout"].isdigit() else {"nome": options["layout"]}
+        try:
+            layout = LayoutImportacao.objects.get(tipo_arquivo="api", **filtro)
+        except LayoutImportacao.DoesNotExist:
+            raise CommandError(f"Layout api {options['layout']} não encontrado.")
+        if layout.cursor_api and not options["reiniciar"]:
+            self.stdout.write(f"Retomando de {layout.cursor_api}.")
+
+        if options["depara"]:
+            created, updated = importar_depara_api(
+                layout, TARGET_MODEL_MAP[options["depara"]], reiniciar=options["reiniciar"]
+            )
+            self.stdout.write(self.style.SUCCESS(f"{created} criados, {updated} atualizados."))
+            return
+
+        if not options["usuario"]:
+            raise CommandError("--usuario é obrigatório para lançamentos.")
+        try:
+            usuario = get_user_model().objects.get(username=options["usuario"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Usuário {options['usuario']} não encontrado.")
+        resultado = importar_lancamentos_api(layout, usuario, reiniciar=options["reiniciar"])
+        for erro in resultado["erros"]:
+            self.stderr.write(f"Registro {erro['linha']} (documento {erro['documento']}): {erro['mensagem']}")
+        self.stdout.write(
+            f"{resultado['lancamentos']} lançamentos e {resultado['itens']} itens importados; "
+            f"{resultado['ja_importados']} já importados, {len(resultado['erros'])} rejeitados."
+        )
+        if resultado["lotes_com_falha"]:
+            raise CommandError(f"{len(resultado['lotes_com_falha'])} lote(s) com falha.")
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from contabill.models import HistoricoPadrao, Moeda
+from importacao.lancamentos import TAMANHO_LOTE, importar_lancamentos
+from importacao.leitores import CsvPosicionado, ler_linhas
+from importacao.models import LayoutImportacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa lançamentos contábeis de um arquivo (csv/xlsx), traduzindo "
+        "os códigos pelo De/Para do layout e gravando em lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("layout", help="Nome ou ID do layout de importação")
+        parser.add_argument("arquivo", help="Caminho do arquivo")
+        parser.add_argument("--usuario", required=True, help="Usuário responsável")
+        parser.add_argument(
+            "--lote", type=int, default=TAMANHO_LOTE, help="Itens por lote (padrão: %(default)s)"
+        )
+        parser.add_argument(
+            "--a-partir-da-linha",
+            type=int,
+            default=1,
+            help="Primeira linha de dados a processar (retomada de lote com falha)",
+        )
+        parser.add_argument(
+            "--a-partir-do-byte",
+            type=int,
+            help=(
+                "Byte onde começa a --a-partir-da-linha (informado no lote com falha); "
+                "a leitura do csv começa ali, sem reler o início"
+            ),
+        )
+        parser.add_argument("--moeda", help="Código da moeda padrão")
+        parser.add_argument("--historico", type=int, help="ID do histórico padrão")
+
+    def handle(self, *args, **options):
+        filtro = {"pk": options["layout"]} if options["layout"].isdigit() else {"nome": options["layout"]}
+        try:
+            layout = LayoutImportacao.objects.get(**filtro)
+        except LayoutImportacao.DoesNotExist:
+            raise CommandError(f"Layout {options['layout']} não encontrado.")
+        try:
+            usuario = get_user_model().objects.get(username=options["usuario"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Usuário {options['usuario']} não encontrado.")
+        moeda_id = None
+        if options["moeda"]:
+            moeda_id = Moeda.objects.filter(codigo=options["moeda"]).values_list("id", flat=True).first()
+            if moeda_id is None:
+                raise CommandError(f"Moeda {options['moeda']} não encontrada.")
+        if options["historico"] and not HistoricoPadrao.objects.filter(pk=options["historico"]).exists():
+            raise CommandError(f"Histórico {options['historico']} não encontrado.")
+
+        opcoes = {
+            "tamanho_lote": options["lote"],
+            "a_partir_da_linha": options["a_partir_da_linha"],
+            "moeda_padrao": moeda_id,
+            "historico_padrao": options["historico"],
+        }
+        byte = options["a_partir_do_byte"]
+        if byte is not None and layout.tipo_arquivo != "csv":
+            raise CommandError("--a-partir-do-byte só vale para arquivos csv.")
+        try:
+            if layout.tipo_arquivo == "csv":
+                linhas = CsvPosicionado(options["arquivo"], layout.delimitador, posicao=byte)
+                if byte is not None:
+                    opcoes["primeira_linha"] = options["a_partir_da_linha"]
+                resultado = importar_lancamentos(layout, linhas, usuario, **opcoes)
+            else:
+                with open(options["arquivo"], "rb") as arquivo:
+                    resultado = importar_lancamentos(
+                        layout, ler_linhas(layout, arquivo), usuario, **opcoes
+                    )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for erro in resultado["erros"]:
+            self.stderr.write(f"Linha {erro['linha']} (documento {erro['documento']}): {erro['mensagem']}")
+        for lote in resultado["lotes_com_falha"]:
+            retomada = f"--a-partir-da-linha {lote['linha_inicial']}"
+            if lote["posicao"] is not None:
+                retomada += f" --a-partir-do-byte {lote['posicao']}"
+            self.stderr.write(
+                f"Lote {lote['lote']} (linhas {lote['linha_inicial']}-{lote['linha_final']}) falhou: "
+                f"{lote['erro']}. Reprocesse com {retomada}."
+            )
+        self.stdout.write(
+            f"{resultado['lancamentos']} lançamentos, {resultado['itens']} itens e "
+            f"{resultado['rateios']} rateios importados em {resultado['lotes']} lote(s); "
+            f"{resultado['ja_importados']} já importados, {len(resultado['erros'])} rejeitados."
+        )
+        if resultado["lotes_com_falha"]:
+            raise CommandError(f"{len(resultado['lotes_com_falha'])} lote(s) com falha.")
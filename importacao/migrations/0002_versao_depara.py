@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importacao", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="layoutimportacao",
+            name="versao_depara",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
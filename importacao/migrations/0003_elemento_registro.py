@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importacao", "0002_versao_depara"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="layoutimportacao",
+            name="elemento_registro",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importacao", "0003_elemento_registro"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="layoutimportacao",
+            name="cursor_api",
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name="layoutimportacao",
+            name="tamanho_pagina_api",
+            field=models.PositiveIntegerField(default=500),
+        ),
+        migrations.AddField(
+            model_name="layoutimportacao",
+            name="token_api",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="layoutimportacao",
+            name="url_api",
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
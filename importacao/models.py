@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
@@ -16,7 +16,18 @@ class LayoutImportacao(models.Model):
     descricao = models.CharField(max_length=255)
     tipo_arquivo = models.CharField(max_length=20, choices=TIPO_ARQUIVO_CHOICES)
     delimitador = models.CharField(max_length=5, default=";")
+    # xml: nome do elemento que representa um registro (vazio = filhos da raiz)
+    elemento_registro = models.CharField(max_length=100, blank=True)
+    # api: endpoint JSON paginado (ver importacao.api)
+    url_api = models.URLField(max_length=500, blank=True)
+    token_api = models.CharField(max_length=255, blank=True)
+    tamanho_pagina_api = models.PositiveIntegerField(default=500)
+    # posição onde a próxima leitura da api continua (vazio = do início)
+    cursor_api = models.CharField(max_length=500, blank=True, editable=False)
     ativo = models.BooleanField(default=True)
+    # Incrementada a cada gravação de DePara do layout; invalida os mapas
+    # carregados em memória (ver services.mapa_depara).
+    versao_depara = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -27,6 +38,71 @@ class LayoutImportacao(models.Model):
         return self.nome
 
 
+def incrementar_versao_depara(layout_ids):
+    """Marca os mapas De/Para dos layouts como desatualizados.
+
+    O ``UPDATE`` em ``LayoutImportacao`` e o descarte dos mapas deste processo
+    só rodam depois do commit (como ``contabill.services.saldo.incrementar_versao_saldos``):
+    dentro da transação o ``UPDATE`` travaria a linha do layout, enfileirando
+    as demais gravações de De/Para, e um mapa recarregado antes do commit
+    ficaria com dados velhos sob a versão nova. Fora de transação roda na hora.
+    """
+    layout_ids = {layout_id for layout_id in layout_ids if layout_id is not None}
+    if not layout_ids:
+        return
+    pendentes = getattr(connection, "importacao_versoes_pendentes", None)
+    if pendentes is None:
+        pendentes = connection.importacao_versoes_pendentes = set()
+    pendentes.update(layout_ids)
+    transaction.on_commit(_gravar_versoes_depara)
+
+
+def _gravar_versoes_depara():
+    from .services import descartar_mapas
+
+    # o primeiro callback do commit leva tudo; o que sobrar de uma transação
+    # desfeita só gera, no próximo commit, um recarregamento a mais
+    layout_ids = getattr(connection, "importacao_versoes_pendentes", None)
+    if not layout_ids:
+        return
+    del connection.importacao_versoes_pendentes
+    LayoutImportacao.objects.filter(pk__in=layout_ids).update(
+        versao_depara=models.F("versao_depara") + 1
+    )
+    descartar_mapas(layout_ids)
+
+
+class DeParaQuerySet(models.QuerySet):
+    """Operações em massa também incrementam a versão dos layouts afetados."""
+
+    def _layouts(self):
+        return set(self.order_by().values_list("layout_id", flat=True).distinct())
+
+    def update(self, **kwargs):
+        layouts = self._layouts()
+        total = super().update(**kwargs)
+        novo = kwargs.get("layout_id", getattr(kwargs.get("layout"), "pk", None))
+        incrementar_versao_depara(layouts | {novo})
+        return total
+
+    def delete(self):
+        layouts = self._layouts()
+        resultado = super().delete()
+        incrementar_versao_depara(layouts)
+        return resultado
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        incrementar_versao_depara({obj.layout_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        total = super().bulk_update(objs, fields, *args, **kwargs)
+        incrementar_versao_depara({obj.layout_id for obj in objs})
+        return total
+
+
 class DePara(models.Model):
     layout = models.ForeignKey(LayoutImportacao, on_delete=models.CASCADE)
     target_ct = models.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -40,6 +116,8 @@ class DePara(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DeParaQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -56,12 +134,18 @@ class DePara(models.Model):
         if self.codigo_externo:
             self.codigo_externo = self.codigo_externo.strip().lower()
         super().save(*args, **kwargs)
+        incrementar_versao_depara({self.layout_id})
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        incrementar_versao_depara({self.layout_id})
+        return resultado
 
     def __str__(self) -> str:
         return self.codigo_externo
 
 
-class DeParaProxyManager(models.Manager):
+class DeParaProxyManager(models.Manager.from_queryset(DeParaQuerySet)):
     def __init__(self, target_model, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.target_model = target_model
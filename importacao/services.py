@@ -1,8 +1,13 @@
+import csv
+import io
+import time
 from functools import lru_cache
+from itertools import islice
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
 from django.utils import timezone
 
-from .models import DePara, LayoutImportacao
+from .models import DePara, LayoutImportacao, incrementar_versao_depara
 
 
 @lru_cache(maxsize=512)
@@ -14,18 +19,115 @@ def normalize(code: str) -> str:
     return (code or "").strip().lower()
 
 
-@lru_cache(maxsize=2048)
+# Intervalo (segundos) entre conferências da versão do layout no banco. Gravações
+# feitas no próprio processo descartam os mapas na hora; as de outros
+# processos são percebidas em no máximo esse intervalo.
+VALIDADE_MAPA = 5
+
+_mapas = {}
+
+
+class MapaDePara:
+    """codigo_externo -> target_id de um (layout, modelo), carregado numa consulta."""
+
+    __slots__ = ("layout_id", "target_ct_id", "versao", "alvos", "conferido_em")
+
+    def __init__(self, layout_id: int, ct):
+        self.layout_id = layout_id
+        self.target_ct_id = ct.id
+        # versão lida antes dos dados: uma gravação concorrente só pode
+        # deixar o mapa "mais novo" que a versão, nunca o contrário
+        self.versao = versao_depara(layout_id)
+        self.alvos = dict(
+            DePara.objects.filter(layout_id=layout_id, target_ct=ct, ativo=True)
+            .order_by()
+            .values_list("codigo_externo", "target_id")
+        )
+        self.conferido_em = time.monotonic()
+
+    def get(self, codigo_externo: str):
+        return self.alvos.get(normalize(codigo_externo))
+
+    def __len__(self):
+        return len(self.alvos)
+
+
+def versao_depara(layout_id: int):
+    return (
+        LayoutImportacao.objects.filter(pk=layout_id)
+        .values_list("versao_depara", flat=True)
+        .first()
+    )
+
+
+def mapa_depara(layout_id: int, model, validade: float = VALIDADE_MAPA) -> MapaDePara:
+    """Mapa De/Para completo do (layout, modelo), reaproveitado entre chamadas.
+
+    Recarrega quando a ``versao_depara`` do layout mudou; a versão é
+    conferida no banco no máximo a cada ``validade`` segundos (0 = sempre).
+    """
+    ct = get_ct_for_model(model)
+    chave = (layout_id, ct.id)
+    mapa = _mapas.get(chave)
+    if mapa is not None:
+        agora = time.monotonic()
+        if agora - mapa.conferido_em >= validade:
+            if versao_depara(layout_id) != mapa.versao:
+                mapa = None
+            else:
+                mapa.conferido_em = agora
+    if mapa is None:
+        mapa = _mapas[chave] = MapaDePara(layout_id, ct)
+    return mapa
+
+
+def descartar_mapas(layout_ids=None):
+    """Esquece os mapas carregados (de todos os layouts, se ``None``)."""
+    if layout_ids is None:
+        _mapas.clear()
+        return
+    for chave in [chave for chave in _mapas if chave[0] in layout_ids]:
+        del _mapas[chave]
+
+
 def resolver(layout_id: int, model, codigo_externo: str):
     """Retorna target_id (ou None) mapeado para (layout, model, codigo_externo)."""
-    ct = get_ct_for_model(model)
-    code = normalize(codigo_externo)
-    try:
-        dp = DePara.objects.only("target_id").get(
-            layout_id=layout_id, target_ct=ct, codigo_externo=code, ativo=True
+    return mapa_depara(layout_id, model).get(codigo_externo)
+
+
+def codigo_destino(row):
+    """Código interno de destino de uma linha de De/Para."""
+    return row.get("destino") or row.get("codigo_destino") or row.get("codigo_interno")
+
+
+def destinos_por_codigo(model, codigos):
+    """Resolve todos os códigos de destino com uma única consulta ``codigo__in``."""
+    codigos = {codigo for codigo in codigos if codigo}
+    if not codigos or not any(f.name == "codigo" for f in model._meta.get_fields()):
+        return {}
+    return {obj.codigo: obj for obj in model.objects.filter(codigo__in=codigos)}
+
+
+def itens_depara(model, linhas):
+    """Linhas (codigo_externo, descricao_externa, destino) -> itens do ``bulk_upsert``.
+
+    Linhas cujo destino não existe são descartadas.
+    """
+    linhas = list(linhas)
+    destinos = destinos_por_codigo(model, (codigo_destino(row) for row in linhas))
+    itens = []
+    for row in linhas:
+        target_obj = destinos.get(codigo_destino(row))
+        if target_obj is None:
+            continue
+        itens.append(
+            {
+                "codigo_externo": row.get("codigo_externo") or row.get("codigo") or "",
+                "descricao_externa": row.get("descricao_externa") or row.get("descricao") or "",
+                "target_id": target_obj.id,
+            }
         )
-        return dp.target_id
-    except DePara.DoesNotExist:
-        return None
+    return itens
 
 
 def bulk_upsert(layout_id: int, model, rows):
@@ -83,4 +185,99 @@ def bulk_upsert(layout_id: int, model, rows):
             to_update,
             ["target_id", "descricao_externa", "observacao", "ativo", "updated_at"],
         )
-    return len(to_create), len(to_update)
\ No newline at end of file
+    return len(to_create), len(to_update)
+
+
+# Linhas por lote do upsert via COPY (uma carga na tabela de staging + um merge)
+TAMANHO_LOTE_COPY = 10000
+
+_COLUNAS_STAGING = ("codigo_externo", "descricao_externa", "observacao", "target_id", "ativo")
+
+
+def bulk_upsert_copy(layout_id: int, model, rows, tamanho_lote: int = TAMANHO_LOTE_COPY):
+    """Variante de ``bulk_upsert`` para cargas muito grandes (PostgreSQL).
+
+    ``rows`` é consumido em lotes: cada lote vai por ``COPY`` para uma tabela
+    temporária e é mesclado em ``DePara`` com um único
+    ``INSERT ... ON CONFLICT DO UPDATE``. Nada é montado em memória além do
+    lote corrente e não há listas de parâmetros para estourar o limite do
+    banco. Dentro de um lote vale a última ocorrência de cada código; um
+    código repetido em lotes diferentes conta como criado e depois
+    atualizado. Retorna ``(criados, atualizados)``.
+    """
+    ct = get_ct_for_model(model)
+    tabela = DePara._meta.db_table
+    now = timezone.now()
+    created = updated = 0
+    linhas = iter(rows)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TEMP TABLE importacao_depara_staging (
+                seq bigserial,
+                codigo_externo varchar(50),
+                descricao_externa varchar(255),
+                observacao varchar(255),
+                target_id integer,
+                ativo boolean
+            )
+            """
+        )
+        while True:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            for row in lote:
+                code = normalize(row.get("codigo_externo"))
+                if not code:
+                    continue
+                escritor.writerow(
+                    [
+                        code,
+                        row.get("descricao_externa", "") or "",
+                        row.get("observacao", "") or "",
+                        row.get("target_id"),
+                        "t" if row.get("ativo", True) else "f",
+                    ]
+                )
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY importacao_depara_staging ({', '.join(_COLUNAS_STAGING)}) "
+                "FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (descricao_externa, observacao))",
+                buffer,
+            )
+            cursor.execute(
+                f"""
+                WITH mescla AS (
+                    INSERT INTO {tabela} AS d
+                           (layout_id, target_ct_id, target_id, codigo_externo,
+                            descricao_externa, observacao, ativo, created_at, updated_at)
+                    SELECT DISTINCT ON (s.codigo_externo)
+                           %s, %s, s.target_id, s.codigo_externo,
+                           s.descricao_externa, s.observacao, s.ativo, %s, %s
+                      FROM importacao_depara_staging s
+                     ORDER BY s.codigo_externo, s.seq DESC
+                    ON CONFLICT ON CONSTRAINT uq_depara_layout_target_codigo DO UPDATE
+                       SET target_id = EXCLUDED.target_id,
+                           descricao_externa = EXCLUDED.descricao_externa,
+                           observacao = EXCLUDED.observacao,
+                           ativo = EXCLUDED.ativo,
+                           updated_at = EXCLUDED.updated_at
+                    RETURNING (xmax = 0) AS inserido
+                )
+                SELECT count(*) FILTER (WHERE inserido), count(*) FILTER (WHERE NOT inserido)
+                  FROM mescla
+                """,
+                [layout_id, ct.id, now, now],
+            )
+            inseridos, atualizados = cursor.fetchone()
+            created += inseridos
+            updated += atualizados
+            cursor.execute("TRUNCATE importacao_depara_staging")
+        # em caso de erro o rollback do atomic desfaz também o CREATE
+        cursor.execute("DROP TABLE importacao_depara_staging")
+        if created or updated:
+            incrementar_versao_depara({layout_id})
+    return created, updated
@@ -1,12 +1,44 @@
+import functools
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from django.db import connection, models
+from django.db.models import F
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
 
 from .models import LayoutImportacao, DePara
-from .services import bulk_upsert, resolver, get_ct_for_model
-from .forms import depara_form_factory
-from contabill.models import ContaContabil, CentroCusto
+from .services import bulk_upsert, bulk_upsert_copy, resolver, get_ct_for_model, mapa_depara
+from .forms import LayoutForm, depara_form_factory
+from .api import LeitorApi, importar_depara_api, importar_lancamentos_api
+from .lancamentos import importar_lancamentos
+from .leitores import CsvPosicionado, ler_csv, ler_xlsx, ler_xml
+from contabill.models import (
+    ContaContabil,
+    CentroCusto,
+    Filial,
+    HistoricoPadrao,
+    LancamentoContabil,
+    LancamentoItem,
+    ModeloRateio,
+    RateioLancamentoItemCentroCusto,
+)
+from contabill.tests.test_saldo import SaldoFixturesMixin
 
 
 class DeParaServiceTests(TestCase):
@@ -61,6 +93,74 @@ class DeParaServiceTests(TestCase):
                 codigo_externo="dup",
             )
 
+    def test_mapa_carregado_uma_vez_e_invalidado_por_versao(self):
+        outra = ContaContabil.objects.create(
+            codigo="1.01.01.0002", descricao="Outra", tipo="A", natureza="D", ordem=2, nivel=5
+        )
+        bulk_upsert(
+            self.layout.id,
+            ContaContabil,
+            [{"codigo_externo": f"c{i}", "target_id": self.conta.id} for i in range(20)],
+        )
+        with self.assertNumQueries(2):  # versão e mapa
+            mapa = mapa_depara(self.layout.id, ContaContabil, validade=0)
+        self.assertEqual(len(mapa), 20)
+        with self.assertNumQueries(0):
+            for i in range(20):
+                self.assertEqual(resolver(self.layout.id, ContaContabil, f" C{i} "), self.conta.id)
+
+        # gravação no próprio processo: versão incrementada e mapa descartado no commit
+        versao = self.layout.versao_depara
+        with self.captureOnCommitCallbacks(execute=True):
+            DePara.objects.filter(codigo_externo="c1").update(target_id=outra.id)
+            self.assertEqual(resolver(self.layout.id, ContaContabil, "c1"), self.conta.id)
+            self.layout.refresh_from_db()
+            self.assertEqual(self.layout.versao_depara, versao)
+        self.layout.refresh_from_db()
+        self.assertGreater(self.layout.versao_depara, versao)
+        self.assertEqual(resolver(self.layout.id, ContaContabil, "c1"), outra.id)
+
+        # gravação de outro processo: só a versão no banco denuncia o mapa velho
+        models.QuerySet.update(DePara.objects.filter(codigo_externo="c2"), target_id=outra.id)
+        LayoutImportacao.objects.filter(pk=self.layout.pk).update(versao_depara=F("versao_depara") + 1)
+        self.assertEqual(resolver(self.layout.id, ContaContabil, "c2"), self.conta.id)
+        self.assertEqual(mapa_depara(self.layout.id, ContaContabil, validade=0).get("c2"), outra.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DePara.objects.get(codigo_externo="c3").delete()
+        self.assertIsNone(resolver(self.layout.id, ContaContabil, "c3"))
+
+    def test_bulk_upsert_copy(self):
+        bulk_upsert(
+            self.layout.id,
+            ContaContabil,
+            [{"codigo_externo": "e1", "target_id": self.conta.id, "descricao_externa": "velha"}],
+        )
+        linhas = (
+            {"codigo_externo": f" E{i} ", "target_id": self.conta.id, "descricao_externa": f"Conta, \"{i}\""}
+            for i in range(25)
+        )
+        mapa = mapa_depara(self.layout.id, ContaContabil)
+        with self.captureOnCommitCallbacks(execute=True):
+            created, updated = bulk_upsert_copy(self.layout.id, ContaContabil, linhas, tamanho_lote=10)
+        self.assertEqual((created, updated), (24, 1))
+        self.assertEqual(DePara.objects.count(), 25)
+        self.assertEqual(DePara.objects.get(codigo_externo="e1").descricao_externa, 'Conta, "1"')
+        self.assertIsNot(mapa_depara(self.layout.id, ContaContabil), mapa)
+
+        # código repetido no mesmo lote: vale a última ocorrência
+        created, updated = bulk_upsert_copy(
+            self.layout.id,
+            ContaContabil,
+            [
+                {"codigo_externo": "novo", "target_id": self.conta.id, "ativo": True},
+                {"codigo_externo": "NOVO", "target_id": self.conta.id, "ativo": False},
+                {"codigo_externo": "", "target_id": self.conta.id},
+            ],
+        )
+        self.assertEqual((created, updated), (1, 0))
+        self.assertFalse(DePara.objects.get(codigo_externo="novo").ativo)
+
     def test_manual_form_creation(self):
         form_class = depara_form_factory(ContaContabil)
         form = form_class(
@@ -78,6 +178,76 @@ class DeParaServiceTests(TestCase):
         self.assertEqual(obj.target_id, self.conta.id)
 
 
+class LeitoresTests(TestCase):
+    XML = (
+        b'<?xml version="1.0" encoding="utf-8"?>'
+        b'<exportacao xmlns="urn:erp"><cabecalho><gerado>2024-01-01</gerado></cabecalho>'
+        b'<contas>'
+        b'<conta ativo="S"><codigo>C1</codigo><descricao> Caixa </descricao></conta>'
+        b'<conta ativo="N"><codigo>C2</codigo><descricao/></conta>'
+        b"</contas></exportacao>"
+    )
+
+    def test_csv(self):
+        linhas = list(ler_csv(StringIO("Codigo;Descricao\nC1; Caixa \n;\nC2;Banco\n")))
+        self.assertEqual(linhas, [{"codigo": "C1", "descricao": "Caixa"}, {"codigo": "C2", "descricao": "Banco"}])
+
+    def test_xml_por_elemento(self):
+        linhas = list(ler_xml(BytesIO(self.XML), "conta"))
+        self.assertEqual(
+            linhas,
+            [
+                {"ativo": "S", "codigo": "C1", "descricao": "Caixa"},
+                {"ativo": "N", "codigo": "C2", "descricao": ""},
+            ],
+        )
+
+    def test_xml_filhos_da_raiz(self):
+        xml = b"<r><l><a>1</a></l><l><a>2</a></l></r>"
+        self.assertEqual([l["a"] for l in ler_xml(BytesIO(xml))], ["1", "2"])
+
+    def test_xml_libera_registros_processados(self):
+        corpo = b"".join(b"<l><a>%d</a></l>" % i for i in range(1000))
+        linhas = ler_xml(BytesIO(b"<r>" + corpo + b"</r>"))
+        for _ in range(500):
+            next(linhas)
+        raiz = linhas.gi_frame.f_locals["abertos"][0][0]
+        # só sobram os registros que o parser já leu adiante
+        self.assertTrue(all(int(l[0].text) >= 500 for l in raiz if len(l)))
+
+    def test_xml_libera_registros_aninhados(self):
+        corpo = b"".join(b"<conta><a>%d</a></conta>" % i for i in range(1000))
+        xml = b'<r versao="2"><cab><x>1</x></cab><lote>' + corpo + b"</lote></r>"
+        linhas = ler_xml(BytesIO(xml), "conta")
+        for _ in range(500):
+            next(linhas)
+        raiz, lote = (elem for elem, _ in linhas.gi_frame.f_locals["abertos"])
+        self.assertTrue(all(int(c[0].text) >= 500 for c in lote if len(c)))
+        self.assertEqual([e.tag for e in raiz], ["lote"])
+        self.assertEqual(raiz.get("versao"), "2")
+        self.assertEqual(len(list(linhas)), 500)
+
+    def test_xml_invalido(self):
+        with self.assertRaises(ValueError):
+            list(ler_xml(BytesIO(b"<r><l></r>")))
+
+    @skipUnless(importlib.util.find_spec("openpyxl"), "openpyxl não instalado")
+    def test_xlsx(self):
+        from openpyxl import Workbook
+
+        livro = Workbook(write_only=True)
+        folha = livro.create_sheet()
+        folha.append(["Codigo", "Data", "Valor"])
+        folha.append(["C1", date(2024, 1, 5), 10.5])
+        folha.append([None, None, None])
+        conteudo = BytesIO()
+        livro.save(conteudo)
+        conteudo.seek(0)
+        self.assertEqual(
+            list(ler_xlsx(conteudo)), [{"codigo": "C1", "data": "2024-01-05", "valor": "10.5"}]
+        )
+
+
 class WizardFlowTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user("user", "u@example.com", "pass")
@@ -117,6 +287,145 @@ class WizardFlowTests(TestCase):
         self.assertContains(resp, "Criados")
         self.assertEqual(DePara.objects.count(), 1)
 
+    def test_wizard_resolve_destinos_uma_vez(self):
+        self.layout.delimitador = ","
+        self.layout.save()
+        linhas = "".join(f"c{i},Conta {i},1.01.01.0001\n" for i in range(30))
+        csv_content = "codigo_externo,descricao_externa,destino\n" + linhas + "cx,Sem destino,9.99\n"
+        file = SimpleUploadedFile("contas.csv", csv_content.encode("utf-8"), content_type="text/csv")
+        self.client.post(
+            reverse("importacao:wizard"),
+            {"layout": self.layout.id, "target": "contas", "arquivo": file},
+        )
+        tabela = ContaContabil._meta.db_table
+
+        def consultas_destino(ctx):
+            return [q for q in ctx.captured_queries if f'FROM "{tabela}"' in q["sql"]]
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("importacao:wizard_preview"))
+        self.assertContains(resp, "Não encontrado", count=1)
+        self.assertEqual(len(consultas_destino(ctx)), 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(
+                reverse("importacao:wizard_preview"), {"linhas": [str(i) for i in range(30)]}
+            )
+            self.assertEqual(resp.status_code, 302)
+            resp = self.client.get(reverse("importacao:wizard_apply"))
+        # a aplicação resolve os destinos uma vez por lote de linhas
+        self.assertEqual(len(consultas_destino(ctx)), 1)
+        self.assertEqual(resp.context["created"], 30)
+
+    def test_wizard_arquivo_inteiro_paginado(self):
+        self.layout.delimitador = ","
+        self.layout.save()
+        linhas = "".join(f"c{i},\"Conta\n{i}\",1.01.01.0001\n" for i in range(120))
+        csv_content = "codigo_externo,descricao_externa,destino\n" + linhas
+        file = SimpleUploadedFile("contas.csv", csv_content.encode("utf-8"), content_type="text/csv")
+        with tempfile.TemporaryDirectory() as pasta, self.settings(IMPORTACAO_DIR=pasta):
+            self.client.post(
+                reverse("importacao:wizard"),
+                {"layout": self.layout.id, "target": "contas", "arquivo": file},
+            )
+            data = self.client.session["importacao_data"]
+            self.assertNotIn("rows", data)
+            self.assertEqual(data["arquivo"]["total"], 120)
+            self.assertEqual(len(data["arquivo"]["posicoes"]), 3)
+
+            resp = self.client.get(reverse("importacao:wizard_preview"), {"pagina": 3})
+            self.assertEqual([r["codigo_externo"] for r in resp.context["rows"]][:2], ["c100", "c101"])
+            self.assertEqual(resp.context["total_paginas"], 3)
+
+            # desmarca c100 e c101 na página 3 e navega para a página 2
+            resp = self.client.post(
+                reverse("importacao:wizard_preview"),
+                {"pagina": 3, "ir_para": 2, "linhas": [str(i) for i in range(102, 120)]},
+            )
+            self.assertRedirects(resp, reverse("importacao:wizard_preview") + "?pagina=2")
+            resp = self.client.get(reverse("importacao:wizard_preview"), {"pagina": 2})
+            self.assertTrue(all(r["marcada"] for r in resp.context["rows"]))
+            self.client.post(
+                reverse("importacao:wizard_preview"),
+                {"pagina": 2, "linhas": [str(i) for i in range(50, 100)]},
+            )
+            resp = self.client.get(reverse("importacao:wizard_apply"))
+            self.assertEqual((resp.context["created"], resp.context["ignored"]), (118, 2))
+            self.assertEqual(os.listdir(pasta), [])
+        self.assertFalse(DePara.objects.filter(codigo_externo__in=["c100", "c101"]).exists())
+        self.assertEqual(
+            DePara.objects.get(codigo_externo="c7").descricao_externa, "Conta\n7"
+        )
+
+    def test_wizard_xml(self):
+        self.layout.tipo_arquivo = "xml"
+        self.layout.elemento_registro = "item"
+        self.layout.save()
+        xml = (
+            "<dados>"
+            + "".join(f"<item><codigo_externo>x{i}</codigo_externo><destino>100</destino></item>" for i in range(3))
+            + "</dados>"
+        )
+        file = SimpleUploadedFile("centros.xml", xml.encode("utf-8"), content_type="text/xml")
+        self.client.post(
+            reverse("importacao:wizard"),
+            {"layout": self.layout.id, "target": "centros", "arquivo": file},
+        )
+        self.assertEqual(self.client.session["importacao_data"]["arquivo"]["total"], 3)
+        self.client.post(reverse("importacao:wizard_preview"), {"linhas": ["0", "1", "2"]})
+        resp = self.client.get(reverse("importacao:wizard_apply"))
+        self.assertEqual(resp.context["created"], 3)
+        self.assertEqual(resolver(self.layout.id, CentroCusto, "x2"), self.centro.id)
+
+    def test_wizard_conta_ignorados_com_codigo_repetido(self):
+        self.layout.delimitador = ","
+        self.layout.save()
+        csv_content = (
+            "codigo_externo,descricao_externa,destino\n"
+            "c1,Um,1.01.01.0001\nc1,Um de novo,1.01.01.0001\ncx,Sem destino,9.99\n"
+        )
+        file = SimpleUploadedFile("contas.csv", csv_content.encode("utf-8"), content_type="text/csv")
+        self.client.post(
+            reverse("importacao:wizard"),
+            {"layout": self.layout.id, "target": "contas", "arquivo": file},
+        )
+        resp = self.client.get(reverse("importacao:wizard_apply"))
+        # o c1 repetido é gravado (mesclado no lote), não ignorado
+        self.assertEqual(
+            (resp.context["created"], resp.context["updated"], resp.context["ignored"]), (1, 0, 1)
+        )
+
+        file = SimpleUploadedFile("contas.csv", csv_content.encode("utf-8"), content_type="text/csv")
+        self.client.post(
+            reverse("importacao:wizard"),
+            {"layout": self.layout.id, "target": "contas", "arquivo": file},
+        )
+        um_por_lote = functools.partial(bulk_upsert_copy, tamanho_lote=1)
+        with mock.patch("importacao.views.bulk_upsert_copy", um_por_lote):
+            resp = self.client.get(reverse("importacao:wizard_apply"))
+        self.assertEqual(
+            (resp.context["created"], resp.context["updated"], resp.context["ignored"]), (0, 2, 1)
+        )
+
+    def test_upload_apaga_arquivos_abandonados(self):
+        with tempfile.TemporaryDirectory() as pasta, self.settings(IMPORTACAO_DIR=pasta):
+            antigo = os.path.join(pasta, "abandonado.csv")
+            recente = os.path.join(pasta, "em_uso.csv")
+            for caminho in (antigo, recente):
+                with open(caminho, "w") as arquivo:
+                    arquivo.write("codigo_externo\n")
+            dois_dias = time.time() - 2 * 24 * 60 * 60
+            os.utime(antigo, (dois_dias, dois_dias))
+            file = SimpleUploadedFile("contas.csv", b"codigo_externo\nc1\n", content_type="text/csv")
+            self.client.post(
+                reverse("importacao:wizard"),
+                {"layout": self.layout.id, "target": "contas", "arquivo": file},
+            )
+            restantes = os.listdir(pasta)
+            self.assertNotIn("abandonado.csv", restantes)
+            self.assertIn("em_uso.csv", restantes)
+            self.assertEqual(len(restantes), 2)
+
     def test_search_endpoint(self):
         url = reverse("importacao:search", args=["contas"])
         resp = self.client.get(url, {"q": "1.01"})
@@ -135,4 +444,347 @@ class WizardFlowTests(TestCase):
                 }
             ],
         )
-        self.assertEqual(created, 1)
\ No newline at end of file
+        self.assertEqual(created, 1)
+
+class ImportacaoLancamentosTests(SaldoFixturesMixin, TestCase):
+    CABECALHO = "documento;filial;data_lancamento;conta;tipo_dc;valor;historico;centro_custo\n"
+
+    def setUp(self):
+        super().setUp()
+        self.layout = LayoutImportacao.objects.create(
+            nome="ERP", origem_sistema="ERP", descricao="Lançamentos", tipo_arquivo="csv"
+        )
+        for model, codigo, target_id in (
+            (Filial, "f1", self.filial.id),
+            (ContaContabil, "caixa", self.conta_d.id),
+            (ContaContabil, "banco", self.conta_c.id),
+            (ContaContabil, "sintetica", self.n4.id),
+            (HistoricoPadrao, "h1", self.historico.id),
+            (CentroCusto, "adm", self.cc.id),
+        ):
+            bulk_upsert(self.layout.id, model, [{"codigo_externo": codigo, "target_id": target_id}])
+
+    def importar(self, conteudo, **kwargs):
+        linhas = ler_csv(StringIO(self.CABECALHO + conteudo))
+        kwargs.setdefault("moeda_padrao", self.moeda.id)
+        return importar_lancamentos(self.layout, linhas, self.user, **kwargs)
+
+    def test_importa_em_lotes_e_atualiza_saldos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = self.importar(
+                "D1;F1;2024-01-05;caixa;D;100,50;h1;adm\n"
+                "D1;F1;2024-01-05;banco;C;100,50;h1;adm\n"
+                "D2;F1;05/01/2024;caixa;D;10;h1;adm\n"
+                "D2;F1;05/01/2024;banco;C;10;h1;adm\n",
+                tamanho_lote=2,
+            )
+        self.assertEqual(
+            (resultado["lancamentos"], resultado["itens"], resultado["rateios"], resultado["lotes"]),
+            (2, 4, 4, 2),
+        )
+        self.assertEqual(resultado["erros"], [])
+        lanc = LancamentoContabil.objects.get(codigo_externo="D1")
+        self.assertEqual((lanc.origem, lanc.numero_documento), ("2", "D1"))
+        lanc.validar()
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("110.50"))
+        self.assertEqual(self.saldo(self.n1).debito, Decimal("110.50"))
+
+        repetido = self.importar("D1;F1;2024-01-05;caixa;D;100,50;h1;adm\nD1;F1;2024-01-05;banco;C;100,50;h1;adm\n")
+        self.assertEqual((repetido["lancamentos"], repetido["ja_importados"]), (0, 1))
+
+    def test_documentos_invalidos_sao_rejeitados(self):
+        resultado = self.importar(
+            "D1;F1;2024-01-05;caixa;D;100;h1;adm\n"
+            "D1;F1;2024-01-05;banco;C;90;h1;adm\n"
+            "D2;F1;2024-01-05;sintetica;D;5;h1;adm\n"
+            "D3;F1;2024-01-05;xpto;D;5;h1;adm\n"
+            "D4;F1;2024-01-05;caixa;D;5;h1;\n"
+            "D5;F1;2024-01-05;caixa;D;5;h1;adm\n"
+            "D5;F1;2024-01-05;banco;C;5;h1;adm\n"
+        )
+        self.assertEqual([e["documento"] for e in resultado["erros"]], ["D1", "D2", "D3", "D4"])
+        self.assertIn("desbalanceado", resultado["erros"][0]["mensagem"])
+        self.assertEqual(resultado["erros"][3]["linha"], 5)
+        self.assertEqual(resultado["lancamentos"], 1)
+
+    def test_sem_centro_de_custo_usa_modelo_de_rateio(self):
+        cc2 = CentroCusto.objects.create(codigo="CC2", descricao="CC 2", tipo="O")
+        modelo = ModeloRateio.objects.create(descricao="Caixa", conta_contabil=self.conta_d)
+        modelo.centros_custo.create(centro_custo=self.cc, percentual=Decimal("66.6667"))
+        modelo.centros_custo.create(centro_custo=cc2, percentual=Decimal("33.3333"))
+
+        resultado = self.importar(
+            "D1;F1;2024-01-05;caixa;D;100;h1;\n"
+            "D1;F1;2024-01-05;banco;C;100;h1;adm\n"
+        )
+        self.assertEqual(resultado["erros"], [])
+        self.assertEqual(resultado["rateios"], 3)
+        item = LancamentoItem.objects.get(conta_contabil=self.conta_d)
+        self.assertEqual(
+            sorted(
+                RateioLancamentoItemCentroCusto.objects.filter(lancamento_item=item)
+                .values_list("centro_custo__codigo", "valor")
+            ),
+            [("CC1", Decimal("66.67")), ("CC2", Decimal("33.33"))],
+        )
+        LancamentoContabil.objects.get(codigo_externo="D1").validar()
+
+    def test_lote_com_falha_nao_interrompe_os_demais(self):
+        original = LancamentoItem.objects.bulk_create
+        chamadas = []
+
+        def falhar_primeiro(objs, *args, **kwargs):
+            chamadas.append(len(objs))
+            if len(chamadas) == 1:
+                raise RuntimeError("boom")
+            return original(objs, *args, **kwargs)
+
+        conteudo = (
+            "D1;F1;2024-01-05;caixa;D;1;h1;adm\nD1;F1;2024-01-05;banco;C;1;h1;adm\n"
+            "D2;F1;2024-01-05;caixa;D;2;h1;adm\nD2;F1;2024-01-05;banco;C;2;h1;adm\n"
+        )
+        with mock.patch.object(LancamentoItem.objects, "bulk_create", falhar_primeiro):
+            resultado = self.importar(conteudo, tamanho_lote=2)
+        self.assertEqual(resultado["lancamentos"], 1)
+        self.assertEqual(
+            resultado["lotes_com_falha"],
+            [{"lote": 1, "linha_inicial": 1, "linha_final": 2, "posicao": None, "erro": "boom"}],
+        )
+        self.assertFalse(LancamentoContabil.objects.filter(codigo_externo="D1").exists())
+
+        retomada = self.importar(conteudo, tamanho_lote=2, a_partir_da_linha=1)
+        self.assertEqual((retomada["lancamentos"], retomada["ja_importados"]), (1, 1))
+
+    def test_retomada_pelo_byte_do_lote_com_falha(self):
+        original = LancamentoItem.objects.bulk_create
+        chamadas = []
+
+        def falhar_segundo(objs, *args, **kwargs):
+            chamadas.append(len(objs))
+            if len(chamadas) == 2:
+                raise RuntimeError("boom")
+            return original(objs, *args, **kwargs)
+
+        conteudo = self.CABECALHO + (
+            "D1;F1;2024-01-05;caixa;D;1;h1;adm\nD1;F1;2024-01-05;banco;C;1;h1;adm\n"
+            "D2;F1;2024-01-05;caixa;D;2;h1;adm\nD2;F1;2024-01-05;banco;C;2;h1;adm\n"
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as arquivo:
+            arquivo.write(conteudo)
+        self.addCleanup(os.remove, arquivo.name)
+        opcoes = {"tamanho_lote": 2, "moeda_padrao": self.moeda.id}
+        with mock.patch.object(LancamentoItem.objects, "bulk_create", falhar_segundo):
+            resultado = importar_lancamentos(
+                self.layout, CsvPosicionado(arquivo.name), self.user, **opcoes
+            )
+        falha = resultado["lotes_com_falha"][0]
+        self.assertEqual((falha["linha_inicial"], falha["posicao"]), (3, conteudo.index("D2")))
+
+        # a partir do byte, o início do arquivo não é relido
+        with mock.patch("importacao.lancamentos.resolver", wraps=resolver) as resolucoes:
+            retomada = importar_lancamentos(
+                self.layout,
+                CsvPosicionado(arquivo.name, posicao=falha["posicao"]),
+                self.user,
+                a_partir_da_linha=falha["linha_inicial"],
+                primeira_linha=falha["linha_inicial"],
+                **opcoes,
+            )
+        self.assertEqual((retomada["lancamentos"], retomada["ja_importados"]), (1, 0))
+        self.assertEqual(
+            [c.args[2] for c in resolucoes.call_args_list if c.args[1] is Filial], ["F1"]
+        )
+        self.assertEqual(
+            LancamentoContabil.objects.get(codigo_externo="D2").itens.count(), 2
+        )
+
+    def test_documento_fora_de_sequencia(self):
+        resultado = self.importar(
+            "D1;F1;2024-01-05;caixa;D;1;h1;adm\nD1;F1;2024-01-05;banco;C;1;h1;adm\n"
+            "D2;F1;2024-01-05;caixa;D;2;h1;adm\nD2;F1;2024-01-05;banco;C;2;h1;adm\n"
+            "D1;F1;2024-01-05;caixa;D;3;h1;adm\nD1;F1;2024-01-05;banco;C;3;h1;adm\n",
+            tamanho_lote=10,
+        )
+        self.assertEqual(resultado["lancamentos"], 2)
+        self.assertEqual([(e["linha"], e["documento"]) for e in resultado["erros"]], [(5, "D1")])
+
+        # entre lotes, a repetição também é erro, não documento já importado
+        resultado = self.importar(
+            "D3;F1;2024-01-05;caixa;D;1;h1;adm\nD3;F1;2024-01-05;banco;C;1;h1;adm\n"
+            "D4;F1;2024-01-05;caixa;D;2;h1;adm\nD4;F1;2024-01-05;banco;C;2;h1;adm\n"
+            "D3;F1;2024-01-05;caixa;D;3;h1;adm\nD3;F1;2024-01-05;banco;C;3;h1;adm\n",
+            tamanho_lote=2,
+        )
+        self.assertEqual((resultado["lancamentos"], resultado["ja_importados"]), (2, 0))
+        self.assertEqual([(e["linha"], e["documento"]) for e in resultado["erros"]], [(5, "D3")])
+        self.assertEqual(LancamentoContabil.objects.get(codigo_externo="D3").itens.count(), 2)
+
+
+class _StubApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.requisicoes.append((url.path, params, self.client_address[1]))
+        status, corpo = self.server.responder(url.path, params)
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImportacaoApiTests(SaldoFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), _StubApiHandler)
+        self.servidor.requisicoes = []
+        self.base = f"http://127.0.0.1:{self.servidor.server_port}"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.layout = LayoutImportacao.objects.create(
+            nome="API",
+            origem_sistema="ERP",
+            descricao="api",
+            tipo_arquivo="api",
+            url_api=f"{self.base}/contas",
+            token_api="segredo",
+            tamanho_pagina_api=10,
+        )
+
+    def test_depara_paginas_em_paralelo_e_retomada(self):
+        registros = [
+            {"codigo_externo": f"e{i}", "descricao_externa": f"Ext {i}", "destino": self.conta_d.codigo}
+            for i in range(95)
+        ]
+        falhar = {"pagina": 7}
+
+        def responder(caminho, params):
+            pagina = int(params["page"])
+            if pagina == falhar["pagina"]:
+                falhar["pagina"] = None
+                return 500, {"detail": "erro"}
+            inicio = (pagina - 1) * 10
+            return 200, {"count": len(registros), "results": registros[inicio : inicio + 10]}
+
+        self.servidor.responder = responder
+        leitor = LeitorApi(self.layout, threads=2)
+        with self.assertRaises(requests.HTTPError):
+            importar_depara_api(self.layout, ContaContabil, leitor=leitor)
+        self.layout.refresh_from_db()
+        self.assertEqual(self.layout.cursor_api, "pagina:7")
+        self.assertEqual(DePara.objects.count(), 60)
+        portas = {porta for _, _, porta in self.servidor.requisicoes}
+        self.assertLessEqual(len(portas), 2)
+
+        self.servidor.requisicoes.clear()
+        criados, atualizados = importar_depara_api(self.layout, ContaContabil)
+        self.assertEqual((criados, atualizados), (35, 0))
+        self.assertEqual(
+            sorted(int(p["page"]) for _, p, _ in self.servidor.requisicoes), [7, 8, 9, 10]
+        )
+        self.layout.refresh_from_db()
+        self.assertEqual(self.layout.cursor_api, "")
+        self.assertEqual(resolver(self.layout.id, ContaContabil, "e94"), self.conta_d.id)
+
+    def test_lancamentos_seguindo_next(self):
+        for model, codigo, target_id in (
+            (Filial, "f1", self.filial.id),
+            (ContaContabil, "caixa", self.conta_d.id),
+            (ContaContabil, "banco", self.conta_c.id),
+            (HistoricoPadrao, "h1", self.historico.id),
+            (CentroCusto, "adm", self.cc.id),
+        ):
+            bulk_upsert(self.layout.id, model, [{"codigo_externo": codigo, "target_id": target_id}])
+        base = {"filial": "f1", "data_lancamento": "2024-01-05", "historico": "h1", "centro_custo": "adm"}
+        paginas = {
+            "1": [dict(base, documento="D1", conta="caixa", tipo_dc="D", valor=50)],
+            "2": [dict(base, documento="D1", conta="banco", tipo_dc="C", valor=50)],
+        }
+
+        def responder(caminho, params):
+            pagina = params.get("cursor") or params["page"]
+            proxima = f"{self.base}/contas?cursor=2" if pagina == "1" else None
+            return 200, {"results": paginas[pagina], "next": proxima}
+
+        self.servidor.responder = responder
+        resultado = importar_lancamentos_api(self.layout, self.user, moeda_padrao=self.moeda.id)
+        self.assertEqual((resultado["lancamentos"], resultado["itens"]), (1, 2))
+        self.assertEqual(self.saldo(self.conta_d).debito, Decimal("50"))
+        self.assertEqual([p for _, p, _ in self.servidor.requisicoes][1], {"cursor": "2"})
+
+    def test_form_nao_exibe_o_token(self):
+        form = LayoutForm(instance=self.layout)
+        self.assertNotIn("segredo", str(form["token_api"]))
+        dados = {
+            "nome": "API",
+            "origem_sistema": "ERP",
+            "descricao": "api",
+            "tipo_arquivo": "api",
+            "delimitador": ";",
+            "url_api": self.layout.url_api,
+            "token_api": "",
+            "tamanho_pagina_api": 10,
+            "ativo": "on",
+        }
+        form = LayoutForm(dados, instance=self.layout)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().token_api, "segredo")
+        form = LayoutForm(dict(dados, token_api="novo"), instance=self.layout)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().token_api, "novo")
+
+    def test_lancamentos_retomam_da_pagina_do_lote_com_falha(self):
+        for model, codigo, target_id in (
+            (Filial, "f1", self.filial.id),
+            (ContaContabil, "caixa", self.conta_d.id),
+            (ContaContabil, "banco", self.conta_c.id),
+            (HistoricoPadrao, "h1", self.historico.id),
+            (CentroCusto, "adm", self.cc.id),
+        ):
+            bulk_upsert(self.layout.id, model, [{"codigo_externo": codigo, "target_id": target_id}])
+        base = {"filial": "f1", "data_lancamento": "2024-01-05", "historico": "h1", "centro_custo": "adm"}
+
+        def documento(numero):
+            return [
+                dict(base, documento=f"D{numero}", conta="caixa", tipo_dc="D", valor=numero),
+                dict(base, documento=f"D{numero}", conta="banco", tipo_dc="C", valor=numero),
+            ]
+
+        def responder(caminho, params):
+            pagina = int(params.get("cursor") or params["page"])
+            proxima = f"{self.base}/contas?cursor={pagina + 1}" if pagina < 3 else None
+            return 200, {"results": documento(pagina), "next": proxima}
+
+        self.servidor.responder = responder
+        original = LancamentoItem.objects.bulk_create
+        chamadas = []
+
+        def falhar_segundo(objs, *args, **kwargs):
+            chamadas.append(len(objs))
+            if len(chamadas) == 2:
+                raise RuntimeError("boom")
+            return original(objs, *args, **kwargs)
+
+        opcoes = {"moeda_padrao": self.moeda.id, "tamanho_lote": 2}
+        with mock.patch.object(LancamentoItem.objects, "bulk_create", falhar_segundo):
+            resultado = importar_lancamentos_api(self.layout, self.user, **opcoes)
+        self.assertEqual(resultado["lancamentos"], 2)
+        self.assertEqual(len(resultado["lotes_com_falha"]), 1)
+        # a página 1 foi toda gravada; a 2 tem o lote que falhou
+        self.layout.refresh_from_db()
+        self.assertEqual(self.layout.cursor_api, f"{self.base}/contas?cursor=2")
+
+        self.servidor.requisicoes.clear()
+        retomada = importar_lancamentos_api(self.layout, self.user, **opcoes)
+        self.assertEqual((retomada["lancamentos"], retomada["ja_importados"]), (1, 1))
+        self.assertEqual([p for _, p, _ in self.servidor.requisicoes], [{"cursor": "2"}, {"cursor": "3"}])
+        self.layout.refresh_from_db()
+        self.assertEqual(self.layout.cursor_api, "")
+        self.assertTrue(LancamentoContabil.objects.filter(codigo_externo="D2").exists())
@@ -1,6 +1,5 @@
 import csv
-from io import TextIOWrapper
-from typing import Dict, List
+from itertools import islice
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -23,8 +22,15 @@ from .forms import (
     TARGET_CHOICES,
     depara_form_factory,
 )
+from . import arquivos
 from .models import LayoutImportacao, DePara
-from .services import bulk_upsert
+from .services import (
+    bulk_upsert_copy,
+    codigo_destino,
+    destinos_por_codigo,
+    itens_depara,
+    normalize,
+)
 
 from contabill.models import (
     ContaContabil,
@@ -35,6 +41,7 @@ from contabill.models import (
     HistoricoPadrao,
 )
 from cadastros.models import Empresa, Parceiro
+from velzon.paginacao import PaginadorEstimado
 
 
 # ------------------------------------------
@@ -60,6 +67,7 @@ class LayoutListView(LoginRequiredMixin, ListView):
     template_name = "importacao/layout_list.html"
     context_object_name = "layouts"
     paginate_by = 20
+    paginator_class = PaginadorEstimado
 
 
 class LayoutCreateView(LoginRequiredMixin, CreateView):
@@ -84,6 +92,64 @@ class LayoutUpdateView(LoginRequiredMixin, UpdateView):
         return super().form_valid(form)
 
 
+# ------------------------------------------
+# Wizard - análise das linhas (compartilhada entre os passos)
+# ------------------------------------------
+# Linhas por lote na aplicação (uma consulta de destinos por lote)
+LINHAS_POR_LOTE = 1000
+
+
+def _analisar(model, linhas):
+    """``[(indice, row)]`` -> linhas da prévia com o destino resolvido."""
+    destinos = destinos_por_codigo(model, (codigo_destino(row) for _, row in linhas))
+    parsed = []
+    for indice, row in linhas:
+        target_obj = destinos.get(codigo_destino(row))
+        parsed.append(
+            {
+                "indice": indice,
+                "codigo_externo": row.get("codigo_externo") or row.get("codigo") or "",
+                "descricao_externa": row.get("descricao_externa") or row.get("descricao") or "",
+                "destino": str(target_obj) if target_obj else "",
+                "target_id": target_obj.id if target_obj else None,
+            }
+        )
+    return parsed
+
+
+def _pagina_atual(request):
+    try:
+        return max(1, int(request.POST.get("pagina") or request.GET.get("pagina") or 1))
+    except ValueError:
+        return 1
+
+
+def _linhas_analisadas(request, numero=1):
+    """Linhas da página ``numero`` da prévia com o destino resolvido.
+
+    A análise da página fica na sessão do wizard; os vários acessos da mesma
+    página (GET, ``get_form``, POST) reaproveitam o resultado.
+    """
+    data = request.session.get("importacao_data")
+    if not data:
+        return [], []
+
+    numero = min(numero, arquivos.total_paginas(data["arquivo"]))
+    analise = data.get("analise")
+    if not analise or analise["pagina"] != numero:
+        model = TARGET_MODEL_MAP[data["target"]]
+        analise = {
+            "pagina": numero,
+            "rows": _analisar(model, arquivos.pagina(data["arquivo"], numero)),
+        }
+        data["analise"] = analise
+        request.session["importacao_data"] = data
+
+    parsed = analise["rows"]
+    indices = [str(row["indice"]) for row in parsed if row["target_id"]]
+    return parsed, indices
+
+
 # ------------------------------------------
 # Wizard - Passo 1 (seleção de layout/arquivo)
 # ------------------------------------------
@@ -102,24 +168,22 @@ class LayoutSelectView(LoginRequiredMixin, FormView):
         target = form.cleaned_data["target"]
         arquivo = form.cleaned_data["arquivo"]
 
-        rows: List[Dict] = []
-
-        if layout.tipo_arquivo == "csv":
-            # Leitura CSV
-            data = TextIOWrapper(arquivo.file, encoding="utf-8")
-            reader = csv.DictReader(data, delimiter=layout.delimitador)
-            for i, row in enumerate(reader):
-                if i >= 50:  # limita prévia a 50 linhas
-                    break
-                rows.append(row)
-        else:
-            messages.error(self.request, "Tipo de arquivo não suportado neste exemplo.")
+        anterior = self.request.session.pop("importacao_data", None)
+        if anterior:
+            arquivos.remover(anterior.get("arquivo"))
+
+        # O arquivo vai para disco; a sessão guarda só o caminho e o índice.
+        try:
+            info = arquivos.guardar_upload(arquivo, layout)
+        except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+            messages.error(self.request, f"Não foi possível ler o arquivo: {exc}")
             return redirect("importacao:wizard")
 
         self.request.session["importacao_data"] = {
             "layout_id": layout.id,
             "target": target,
-            "rows": rows,
+            "arquivo": info,
+            "excluidas": [],
         }
         return super().form_valid(form)
 
@@ -134,47 +198,11 @@ class PreviewMapView(LoginRequiredMixin, FormView):
 
     def _parse_rows_and_choices(self):
         """
-        Constrói as linhas da prévia e retorna (rows_parsed, indices_validos)
-        onde indices_validos são strings dos índices que possuem target_id.
+        Constrói as linhas da página atual da prévia e retorna
+        (rows_parsed, indices_validos) onde indices_validos são strings dos
+        índices (no arquivo) que possuem target_id.
         """
-        data = self.request.session.get("importacao_data")
-        if not data:
-            return [], []
-
-        target_key = data["target"]
-        model = TARGET_MODEL_MAP[target_key]
-        rows = data["rows"]
-
-        parsed, indices = [], []
-        for i, row in enumerate(rows):
-            code_ext = row.get("codigo_externo") or row.get("codigo") or ""
-            desc_ext = row.get("descricao_externa") or row.get("descricao") or ""
-            dest_code = (
-                row.get("destino")
-                or row.get("codigo_destino")
-                or row.get("codigo_interno")
-            )
-
-            target_obj = None
-            if dest_code:
-                try:
-                    target_obj = model.objects.get(codigo=dest_code)
-                except Exception:
-                    target_obj = None
-
-            target_id = target_obj.id if target_obj else None
-            parsed.append(
-                {
-                    "codigo_externo": code_ext,
-                    "descricao_externa": desc_ext,
-                    "destino": target_obj,
-                    "target_id": target_id,
-                }
-            )
-            if target_id:
-                indices.append(str(i))
-
-        return parsed, indices
+        return _linhas_analisadas(self.request, _pagina_atual(self.request))
 
     # Garanta que as choices do campo "linhas" existam ANTES da validação do POST
     def get_form(self, form_class=None):
@@ -193,8 +221,16 @@ class PreviewMapView(LoginRequiredMixin, FormView):
             return ctx
 
         rows, indices = self._parse_rows_and_choices()
+        excluidas = set(data.get("excluidas", []))
+        for row in rows:
+            row["marcada"] = row["target_id"] and row["indice"] not in excluidas
+        info = data["arquivo"]
+        pagina = min(_pagina_atual(self.request), arquivos.total_paginas(info))
         ctx["rows"] = rows
-        ctx["tem_candidatos"] = bool(indices)
+        ctx["tem_candidatos"] = info["total"] > 0
+        ctx["pagina"] = pagina
+        ctx["total_paginas"] = arquivos.total_paginas(info)
+        ctx["total_linhas"] = info["total"]
         ctx["layout"] = LayoutImportacao.objects.get(id=data["layout_id"])
         ctx["target_label"] = dict(TARGET_CHOICES)[data["target"]]
         ctx["target"] = data["target"]
@@ -206,12 +242,18 @@ class PreviewMapView(LoginRequiredMixin, FormView):
             messages.error(self.request, "Sessão expirada.")
             return redirect("importacao:wizard")
 
-        selected = [int(i) for i in (form.cleaned_data.get("linhas") or [])]
-        data["selected"] = selected
+        # As marcações valem para a página enviada; as demais páginas mantêm
+        # as suas (por padrão, todas as linhas com destino são aplicadas).
+        _, indices = self._parse_rows_and_choices()
+        da_pagina = {int(i) for i in indices}
+        selected = {int(i) for i in (form.cleaned_data.get("linhas") or [])}
+        excluidas = (set(data.get("excluidas", [])) - da_pagina) | (da_pagina - selected)
+        data["excluidas"] = sorted(excluidas)
         self.request.session["importacao_data"] = data
 
-        if not selected:
-            messages.info(self.request, "Nenhuma linha selecionada. Nada a aplicar.")
+        ir_para = self.request.POST.get("ir_para")
+        if ir_para:
+            return redirect(f"{reverse('importacao:wizard_preview')}?pagina={ir_para}")
         return super().form_valid(form)
 
 
@@ -232,37 +274,37 @@ class ApplyView(LoginRequiredMixin, TemplateView):
         layout_id = data["layout_id"]
         target_key = data["target"]
         model = TARGET_MODEL_MAP[target_key]
-        rows = data["rows"]
-        selected = data.get("selected", [])
-
-        # Constrói itens a aplicar
-        items = []
-        for i in selected:
-            row = rows[i]
-            code_ext = row.get("codigo_externo") or row.get("codigo") or ""
-            desc_ext = row.get("descricao_externa") or row.get("descricao") or ""
-            dest_code = (
-                row.get("destino")
-                or row.get("codigo_destino")
-                or row.get("codigo_interno")
-            )
-            try:
-                target_obj = model.objects.get(codigo=dest_code)
-            except Exception:
-                continue
-
-            items.append(
-                {
-                    "codigo_externo": code_ext,
-                    "descricao_externa": desc_ext,
-                    "target_id": target_obj.id,
-                }
-            )
-
-        created, updated = bulk_upsert(layout_id, model, items)
+        excluidas = set(data.get("excluidas", []))
+        info = data["arquivo"]
+
+        # Percorre o arquivo inteiro em lotes (uma consulta de destinos por
+        # lote) e grava tudo via COPY + merge, sem carregar o arquivo em memória.
+        # As linhas descartadas (desmarcadas, sem destino ou sem código) são
+        # contadas aqui: códigos repetidos são mesclados no mesmo lote e contam
+        # de novo em lotes diferentes, então o total menos os gravados não serve.
+        ignored = 0
+
+        def itens():
+            nonlocal ignored
+            linhas = enumerate(arquivos.iterar(info))
+            while True:
+                bloco = list(islice(linhas, LINHAS_POR_LOTE))
+                if not bloco:
+                    return
+                lote = [
+                    item
+                    for item in itens_depara(model, [row for i, row in bloco if i not in excluidas])
+                    if normalize(item["codigo_externo"])
+                ]
+                ignored += len(bloco) - len(lote)
+                yield from lote
+
+        created, updated = bulk_upsert_copy(layout_id, model, itens())
+
+        arquivos.remover(info)
         ctx["created"] = created
         ctx["updated"] = updated
-        ctx["ignored"] = len(selected) - created - updated
+        ctx["ignored"] = ignored
         ctx["layout"] = LayoutImportacao.objects.get(id=layout_id)
         ctx["target_label"] = dict(TARGET_CHOICES)[target_key]
         ctx["target"] = target_key
@@ -281,6 +323,7 @@ class DeParaListView(LoginRequiredMixin, ListView):
     template_name = "importacao/depara_list.html"
     context_object_name = "itens"
     paginate_by = 50
+    paginator_class = PaginadorEstimado
 
     def get_queryset(self):
         target = self.kwargs["target"]
@@ -0,0 +1,74 @@
+(function(){
+  // Campos gerados por contabill.forms.widgets.AutocompleteWidget. Os eventos
+  // são delegados ao document, então linhas trocadas pelo HTMX já funcionam.
+  var ATRASO = 250;
+  var temporizador = null;
+
+  function opcoes(caixa){
+    return caixa.querySelector('[data-autocomplete-opcoes]');
+  }
+  function fechar(caixa){
+    opcoes(caixa).innerHTML = '';
+  }
+  function fecharTodos(exceto){
+    document.querySelectorAll('[data-autocomplete]').forEach(function(caixa){
+      if(caixa !== exceto) fechar(caixa);
+    });
+  }
+  function mostrar(caixa, resultados){
+    var lista = opcoes(caixa);
+    lista.innerHTML = '';
+    if(!resultados.length){
+      var vazio = document.createElement('div');
+      vazio.className = 'list-group-item py-1 text-muted';
+      vazio.textContent = 'Nenhum resultado.';
+      lista.appendChild(vazio);
+      return;
+    }
+    resultados.forEach(function(op){
+      var botao = document.createElement('button');
+      botao.type = 'button';
+      botao.className = 'list-group-item list-group-item-action py-1';
+      botao.textContent = op.texto;
+      botao.setAttribute('data-id', op.id);
+      lista.appendChild(botao);
+    });
+  }
+  function pesquisar(caixa, termo){
+    var url = caixa.getAttribute('data-autocomplete') + '?q=' + encodeURIComponent(termo);
+    fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}, credentials: 'same-origin'})
+      .then(function(resposta){ return resposta.json(); })
+      .then(function(dados){
+        var busca = caixa.querySelector('[data-autocomplete-busca]');
+        if(busca.value.trim() === termo) mostrar(caixa, dados.resultados);
+      });
+  }
+
+  document.addEventListener('input', function(evt){
+    var busca = evt.target.closest('[data-autocomplete-busca]');
+    if(!busca) return;
+    var caixa = busca.closest('[data-autocomplete]');
+    // texto alterado à mão invalida a escolha anterior
+    caixa.querySelector('input[type=hidden]').value = '';
+    clearTimeout(temporizador);
+    var termo = busca.value.trim();
+    if(!termo){ fechar(caixa); return; }
+    temporizador = setTimeout(function(){ pesquisar(caixa, termo); }, ATRASO);
+  });
+
+  document.addEventListener('click', function(evt){
+    var opcao = evt.target.closest('[data-autocomplete-opcoes] button');
+    var caixa = evt.target.closest('[data-autocomplete]');
+    fecharTodos(caixa);
+    if(!opcao) return;
+    caixa.querySelector('input[type=hidden]').value = opcao.getAttribute('data-id');
+    caixa.querySelector('[data-autocomplete-busca]').value = opcao.textContent;
+    fechar(caixa);
+  });
+
+  document.addEventListener('keydown', function(evt){
+    if(evt.key === 'Escape' && evt.target.closest('[data-autocomplete]')){
+      fechar(evt.target.closest('[data-autocomplete]'));
+    }
+  });
+})();
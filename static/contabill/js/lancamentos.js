@@ -1,48 +1,29 @@
 (function(){
-  function parseValor(v){
-    if(!v) return 0;
-    if(typeof v === 'string'){
-      v = v.replace(/\./g,'').replace(',', '.');
-    }
-    var n = parseFloat(v);
-    return isNaN(n) ? 0 : n;
-  }
-  function format(v){
-    return v.toLocaleString('pt-BR', {minimumFractionDigits:2, maximumFractionDigits:2});
-  }
-  function recalc(){
-    var totalD=0, totalC=0;
-    document.querySelectorAll('#itens-body tr[data-item-id]').forEach(function(row){
-      var tipo = row.getAttribute('data-tipo');
-      var val = parseValor(row.getAttribute('data-valor'));
-      if(tipo === 'D') totalD += val; else if(tipo === 'C') totalC += val;
-    });
-    var dif = totalD - totalC;
-    document.getElementById('total-debito').textContent = format(totalD);
-    document.getElementById('total-credito').textContent = format(totalC);
-    document.getElementById('total-diferenca').textContent = format(dif);
+  // Os totais vêm do servidor (linha #itens-totais, trocada fora da banda a
+  // cada item incluído); aqui só se habilita o Salvar conforme a diferença.
+  function atualizarSalvar(){
+    var totais = document.getElementById('itens-totais');
     var btn = document.getElementById('btn-salvar');
-    if(btn){ btn.disabled = Math.abs(dif) > 0.0001; }
+    if(!totais || !btn) return;
+    var dif = parseFloat(totais.getAttribute('data-diferenca'));
+    btn.disabled = isNaN(dif) || Math.abs(dif) > 0.0001;
   }
-  function bindRows(){
-    document.querySelectorAll('#itens-body tr[data-item-id]').forEach(function(row){
-      row.addEventListener('click', function(){
-        document.querySelectorAll('#itens-body tr').forEach(function(r){r.classList.remove('table-active');});
-        row.classList.add('table-active');
-        var id = row.getAttribute('data-item-id');
-        var grid = document.getElementById('grid-itens');
-        var urlCC = grid.getAttribute('data-url-cc') + '?item=' + id;
-        var urlProj = grid.getAttribute('data-url-projeto') + '?item=' + id;
-        htmx.ajax('GET', urlCC, {target:'#grid-cc', swap:'outerHTML'});
-        htmx.ajax('GET', urlProj, {target:'#grid-projeto', swap:'outerHTML'});
-      });
-    });
-  }
-  window.recalcLancamentos = function(){
-    bindRows();
-    recalc();
-  };
+  // delegado ao document: vale também para as linhas incluídas pelo HTMX
+  document.addEventListener('click', function(evt){
+    var row = evt.target.closest('#itens-body tr[data-item-id]');
+    if(!row) return;
+    document.querySelectorAll('#itens-body tr').forEach(function(r){r.classList.remove('table-active');});
+    row.classList.add('table-active');
+    var id = row.getAttribute('data-item-id');
+    var grid = document.getElementById('grid-itens');
+    var urlCC = grid.getAttribute('data-url-cc') + '?item=' + id;
+    var urlProj = grid.getAttribute('data-url-projeto') + '?item=' + id;
+    htmx.ajax('GET', urlCC, {target:'#grid-cc', swap:'outerHTML'});
+    htmx.ajax('GET', urlProj, {target:'#grid-projeto', swap:'outerHTML'});
+  });
+  window.recalcLancamentos = atualizarSalvar;
   document.addEventListener('DOMContentLoaded', function(){
-    window.recalcLancamentos();
+    atualizarSalvar();
+    document.body.addEventListener('htmx:afterSettle', atualizarSalvar);
   });
 })();
@@ -0,0 +1,98 @@
+"""Paginador com contagem estimada para listas grandes (PostgreSQL).
+
+O ``Paginator`` do Django faz ``COUNT(*)`` a cada página, o que nas tabelas
+grandes custa mais que a própria página. ``PaginadorEstimado`` pergunta
+antes ao planejador quantas linhas espera (``pg_class.reltuples`` sem
+filtros, ``EXPLAIN`` com filtros) e só conta de fato quando a estimativa fica
+abaixo de ``PAGINACAO_LIMIAR_ESTIMATIVA`` (padrão 10000).
+"""
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+LIMIAR_PADRAO = 10000
+
+
+def _limiar():
+    return getattr(settings, "PAGINACAO_LIMIAR_ESTIMATIVA", LIMIAR_PADRAO)
+
+
+def estimar_linhas(queryset):
+    """Número de linhas que o PostgreSQL espera para o queryset (``None`` se não souber)."""
+    conexao = connections[queryset.db]
+    if conexao.vendor != "postgresql":
+        return None
+    with conexao.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+            # -1: tabela ainda não analisada
+            if linha and linha[0] >= 0:
+                return linha[0]
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]["Plan"]["Plan Rows"])
+
+
+class PaginadorEstimado(Paginator):
+    """``Paginator`` que usa a estimativa do planejador acima do limiar.
+
+    ``estimado`` indica se ``count`` é aproximado. Nesse modo cada página
+    busca uma linha a mais para saber se há próxima: uma página incompleta é
+    a última e fixa o ``count`` exato; uma completa garante ao menos mais uma.
+    """
+
+    limiar = None
+
+    def __init__(self, *args, limiar=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if limiar is not None:
+            self.limiar = limiar
+        self.estimado = False
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            estimativa = estimar_linhas(self.object_list)
+            limiar = self.limiar if self.limiar is not None else _limiar()
+            if estimativa is not None and estimativa >= limiar:
+                self.estimado = True
+                return estimativa
+        return super().count
+
+    def _fixar_count(self, valor):
+        self.__dict__["count"] = valor
+        self.__dict__.pop("num_pages", None)
+
+    def page(self, number):
+        self.count
+        if not self.estimado:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(_("That page number is less than 1"))
+        inicio = (number - 1) * self.per_page
+        itens = list(self.object_list[inicio : inicio + self.per_page + 1])
+        if len(itens) > self.per_page:
+            itens = itens[: self.per_page]
+            self._fixar_count(max(self.count, inicio + self.per_page + 1))
+        else:
+            if not itens and number > 1:
+                raise EmptyPage(_("That page contains no results"))
+            self._fixar_count(inicio + len(itens))
+            self.estimado = False
+        return self._get_page(itens, number, self)